@@ -4,12 +4,13 @@ from connect.eaas.core.decorators import guest
 from fastapi import Depends, Request
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
-from starlette_context import context as g
 
 from cbcext.models.fulfillment_models import TierConfigRequest
 from cbcext.services.client.apsconnectclient.response import PublicApiError
+from cbcext.services.client.oaclient import OA
 from cbcext.services.fulfillment import ValidateDraftRequest
 from cbcext.services.fulfillment.request_tracker_utils import get_product_parameters
+from cbcext.services.hub.discovery import refresh_discoveries
 from cbcext.services.hub.services import fetch_hub_uuid_from_oa
 from cbcext.services.tier_configurations import (
     get_last_requests_by_type,
@@ -17,6 +18,7 @@ from cbcext.services.tier_configurations import (
     TierConfigurationRequest,
 )
 from cbcext.services.utils import get_action_link, get_tier_config_by_id
+from cbcext.utils.context import g
 from cbcext.utils.dependencies import convert_request
 from cbcext.utils.generic import property_parser
 from cbcext.utils.security import authentication_required
@@ -115,6 +117,8 @@ def delete_tenant(app_id, tenant_id):
 @guest()
 @app_auth_router.post('/app/{app_id}/upgrade')
 def upgrade_application(app_id):
+    OA.invalidate_schemas()
+    refresh_discoveries(app_id)
     return JSONResponse(
         content={},
         status_code=200,
@@ -221,7 +225,7 @@ def create_tier_config_request(
 
 @guest()
 @app_auth_router.post('/app/{app_id}/validate')
-def validate_draft_request_app(
+async def validate_draft_request_app(
     app_id,
     request: Request = Depends(convert_request),
 ):
@@ -232,7 +236,7 @@ def validate_draft_request_app(
         if customer is not None:
             customer = customer.split(",")
             customer = customer[-1]
-    return ValidateDraftRequest(
+    return await ValidateDraftRequest(
         app_id=app_id,
         data=request.json,
         customer=customer,
@@ -244,13 +248,13 @@ def validate_draft_request_app(
 def get_product_paramters_via_app(
     app_id,
 ):
-    activation, fulfillment, tier = get_product_parameters(g.product_id)
+    product_parameters = get_product_parameters(g.product_id)
 
     return JSONResponse(
         content={
-            "activationParameters": activation,
-            "fulfillmentParameters": fulfillment,
-            "tier1Parameters": tier,
+            "activationParameters": product_parameters.activation,
+            "fulfillmentParameters": product_parameters.fulfillment,
+            "tier1Parameters": product_parameters.tier,
         },
         status_code=200,
     )
@@ -4,11 +4,12 @@ from connect.eaas.core.decorators import guest
 from fastapi import Depends, Request
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
-from starlette_context import context as g
 
 from cbcext.services.db_services import remove_aps_global_config
+from cbcext.services.event_subscriptions import start_event_subscriptions_verification
 from cbcext.services.hub.account_data_change import AccountDataChange
 from cbcext.services.hub.aps_package_download import download_hub_aps_package
+from cbcext.services.hub.discovery import refresh_discoveries
 from cbcext.services.hub.globals import (
     get_account_products,
     get_available_operations,
@@ -20,6 +21,7 @@ from cbcext.services.hub.globals import (
 from cbcext.services.hub.hub_tier_configurations import handle_tier_configs_from_aps
 from cbcext.services.hub.process_chunk_files import ProcessUsageChunkFiles
 from cbcext.services.hub.product_lifecycle import InitTask
+from cbcext.utils.context import g
 from cbcext.utils.dependencies import convert_request
 from cbcext.utils.security import authentication_required
 
@@ -63,12 +65,15 @@ def upgrade_hub_instance(
         app_id,
         request: Request = Depends(convert_request),
 ):
+    refresh_discoveries()
     return HubGlobals().handle_upgrade(request)
 
 
 @guest()
 @hub_auth_router.get('/globals/{app_id}/healthCheck')
 def hub_healthcheck(app_id):
+    refresh_discoveries()
+    start_event_subscriptions_verification()
     return HubGlobals().hub_healthcheck(app_id)
 
 
@@ -2,6 +2,7 @@ from connect.eaas.core.decorators import guest
 from fastapi import Depends, Request
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
+from starlette.concurrency import run_in_threadpool
 
 from cbcext.services.asset_actions import handle_actions
 from cbcext.services.client.apsconnectclient.response import MissingAssetError
@@ -22,6 +23,7 @@ from cbcext.services.last_request_status import handle_last_request_status
 from cbcext.services.locales import LOCALES
 from cbcext.services.usage import build_usage
 from cbcext.services.utils import not_supported_schedule, template_by_tenant
+from cbcext.utils.concurrency import DeadlineExceeded
 from cbcext.utils.dependencies import convert_request
 from cbcext.utils.security import authentication_required
 
@@ -43,9 +45,52 @@ def get_tenant():
     )
 
 
+def _purchase(tenant_data):
+    try:
+        return PurchaseRequest(tenant_data=tenant_data).create
+    except InvalidPhoneException as e:
+        return JSONResponse(
+            content={"message": str(e)},
+            status_code=409,
+        )
+    except DeadlineExceeded:
+        return JSONResponse(
+            content={
+                "error": "APSControllerFailure",
+                "message": (
+                    "Timeout while collecting data needed to place the request, "
+                    "please retry later"
+                ),
+            },
+            status_code=409,
+        )
+
+
+def _change(tenant_data, planned_date):
+    change_request = ChangeRequest(
+        tenant_data=tenant_data,
+        planned_date=planned_date,
+    )
+    # Let's check that package supports scheduled changes, otherwise let's refuse since
+    # tracking on events coming from CBC will be impossible due no relation between orders
+    # and requests
+
+    if planned_date and change_request.tenant.legacy_planned_date_not_supported:
+        return JSONResponse(
+            content={
+                "error": "NotSupported",
+                "message": "Scheduled actions are not supported by installed product, "
+                           "please contact support to upgrade it",
+            },
+            status_code=400,
+        )
+    else:
+        return change_request.create
+
+
 @guest()
 @tenant_auth_router.post('/tenant')
-def post_tenant(
+async def post_tenant(
     request: Request = Depends(convert_request),
 ):
     # Scheduled actions not supported by CBC yet, even that supported in connect
@@ -54,55 +99,34 @@ def post_tenant(
         return not_supported_schedule()
     phase = request.headers.get(phase_header, "sync")
     if phase == "sync":
-        try:
-            return PurchaseRequest(tenant_data=request.json).create
-        except InvalidPhoneException as e:
-            return JSONResponse(
-                content={"message": str(e)},
-                status_code=409,
-            )
-    return RequestTracker(tenant_data=request.json).track("purchase")
+        # Request placement is done once per order, it keeps using blocking clients
+        return await run_in_threadpool(_purchase, request.json)
+    tracker = await RequestTracker.from_tenant_data(request.json)
+    return await tracker.track("purchase")
 
 
 @guest()
 @tenant_auth_router.get('/tenant/{tenant_id}')
-def get_tenant_usage(tenant_id):
-    return build_usage(tenant_id)
+async def get_tenant_usage(tenant_id):
+    return await build_usage(tenant_id)
 
 
 @guest()
 @tenant_auth_router.put('/tenant/{tenant_id}')
-def update_tenant(
+async def update_tenant(
     tenant_id,
     request: Request = Depends(convert_request),
 ):
     phase = request.headers.get(phase_header, "sync")
     planned_date = request.headers.get(scheduled_header, None)
     if phase == "sync":
-        change_request = ChangeRequest(
-            tenant_data=request.json,
-            planned_date=planned_date,
-        )
-        # Let's check that package supports scheduled changes, otherwise let's refuse since
-        # tracking on events coming from CBC will be impossible due no relation between orders
-        # and requests
+        return await run_in_threadpool(_change, request.json, planned_date)
 
-        if planned_date and change_request.tenant.legacy_planned_date_not_supported:
-            return JSONResponse(
-                content={
-                    "error": "NotSupported",
-                    "message": "Scheduled actions are not supported by installed product, "
-                               "please contact support to upgrade it",
-                },
-                status_code=400,
-            )
-        else:
-            return change_request.create
-
-    return RequestTracker(
-        tenant_data=request.json,
+    tracker = await RequestTracker.from_tenant_data(
+        request.json,
         planned_date=planned_date,
-    ).track("change")
+    )
+    return await tracker.track("change")
 
 
 @guest()
@@ -203,11 +227,11 @@ def execute_action_on_tenant(
 
 @guest()
 @tenant_auth_router.get('/tenant/{tenant_id}/lastRequestStatus')
-def get_tenant_last_request_status(
+async def get_tenant_last_request_status(
     tenant_id,
     request: Request = Depends(convert_request),
 ):
-    return handle_last_request_status(tenant_id=tenant_id, request=request)
+    return await handle_last_request_status(tenant_id=tenant_id, request=request)
 
 
 @guest()
@@ -240,12 +264,12 @@ def account_relink(
 
 @guest()
 @tenant_auth_router.post('/tenant/{tenant_id}/validate')
-def validate_change_operation_existing_tenant(
+async def validate_change_operation_existing_tenant(
     tenant_id,
     request: Request = Depends(convert_request),
 ):
     customer = request.headers.get('X-OSA-End-Customer', None)
-    return ValidateDraftRequest(
+    return await ValidateDraftRequest(
         tenant_id=tenant_id,
         data=request.json,
         customer=customer,
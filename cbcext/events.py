@@ -2,11 +2,15 @@ from connect.eaas.core.decorators import event, schedulable, variables
 from connect.eaas.core.extension import EventsApplicationBase
 from connect.eaas.core.responses import BackgroundResponse, ScheduledExecutionResponse
 
+from cbcext.services.db_services import save_asset_request
 from cbcext.services.eaas_events.utils import (
     add_installation_hubs,
     add_product_connections,
     get_db_for_events,
 )
+from cbcext.services.eaas_events.tenant_updates import push_request_to_tenant
+from cbcext.services.eaas_events.usage_snapshots import close_reported_usage, snapshot_usage_file
+from cbcext.services.utils import statuses_to_track
 
 from sqlalchemy.exc import DBAPIError
 from connect.client import ClientError
@@ -24,6 +28,18 @@ from connect.client import ClientError
             "initial_value": "redis://redis:6379/0",
             "secure": True,
         },
+        {
+            "name": "OA_POOL_MAXSIZE",
+            "initial_value": "10",
+        },
+        {
+            "name": "PURCHASE_CONTEXT_TIMEOUT",
+            "initial_value": "120",
+        },
+        {
+            "name": "CHUNK_FILES_TIME_BUDGET",
+            "initial_value": "180",
+        },
     ],
 )
 class CbcEventsApplication(EventsApplicationBase):
@@ -53,6 +69,63 @@ class CbcEventsApplication(EventsApplicationBase):
 
         return BackgroundResponse.done()
 
+    @event('asset_purchase_request_processing', statuses=statuses_to_track)
+    def on_purchase_request(self, request):
+        return self._store_request(request)
+
+    @event('asset_change_request_processing', statuses=statuses_to_track)
+    def on_change_request(self, request):
+        return self._store_request(request)
+
+    @event('asset_suspend_request_processing', statuses=statuses_to_track)
+    def on_suspend_request(self, request):
+        return self._store_request(request)
+
+    @event('asset_resume_request_processing', statuses=statuses_to_track)
+    def on_resume_request(self, request):
+        return self._store_request(request)
+
+    @event('asset_cancel_request_processing', statuses=statuses_to_track)
+    def on_cancel_request(self, request):
+        return self._store_request(request)
+
+    @event('asset_adjustment_request_processing', statuses=statuses_to_track)
+    def on_adjustment_request(self, request):
+        return self._store_request(request)
+
+    @event('usage_file_request_processing', statuses=['accepted'])
+    def on_usage_file_accepted(self, request):
+        # Usage reported to CBC on billing is answered from snapshots of accepted usage
+        try:
+            with get_db_for_events(self.config) as db:
+                snapshot_usage_file(
+                    db,
+                    self.installation_client or self.client,
+                    request,
+                    self.installation['id'] if self.installation else None,
+                )
+        except (ClientError, DBAPIError):
+            return BackgroundResponse.reschedule()
+        return BackgroundResponse.done()
+
+    def _store_request(self, request):
+        # Latest requests are kept to answer CBC polls without querying Connect
+        if not request['asset'].get('external_uid'):
+            return BackgroundResponse.done()
+        try:
+            with get_db_for_events(self.config) as db:
+                save_asset_request(db, request)
+                push_request_to_tenant(
+                    db,
+                    self.installation_client or self.client,
+                    self.config,
+                    self.logger,
+                    request,
+                )
+        except DBAPIError:
+            return BackgroundResponse.reschedule()
+        return BackgroundResponse.done()
+
     @schedulable(
         'Update Authentication',
         'Periodic discovery of new hub and product connections',
@@ -82,3 +155,20 @@ class CbcEventsApplication(EventsApplicationBase):
             except (ClientError, DBAPIError):
                 return ScheduledExecutionResponse.reschedule()
         return ScheduledExecutionResponse.done()
+
+    @schedulable(
+        'Close reported usage',
+        'Closes usage records of usage reported to CloudBlue Commerce',
+    )
+    def close_reported_usage_records(self, schedule):
+        try:
+            with get_db_for_events(self.config) as db:
+                close_reported_usage(db, self._get_installation_client)
+        except (ClientError, DBAPIError):
+            return ScheduledExecutionResponse.reschedule()
+        return ScheduledExecutionResponse.done()
+
+    def _get_installation_client(self, installation_id):
+        if installation_id is None:
+            return self.client
+        return self.get_installation_admin_client(installation_id=installation_id)
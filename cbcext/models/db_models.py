@@ -1,6 +1,7 @@
 from datetime import datetime
 
 import sqlalchemy as db
+from sqlalchemy.dialects.postgresql import JSONB
 
 from cbcext.db import Model
 
@@ -47,3 +48,155 @@ class HubInstances(Model):
         db.TIMESTAMP(),
         default=datetime.utcnow,
     )
+
+
+class ProductConnection(Model):
+    __tablename__ = 'product_connections'
+    """
+    Connect connections of products to OA hubs, indexed by product and Hub UUID (APS Root
+    Resource ID in OA), that way connection used by requests is resolved without calling Connect.
+
+    Kept up to date by periodic discovery of events application, and on misses.
+    """
+
+    product_id = db.Column(db.String(100), primary_key=True)
+    hub_uuid = db.Column(db.String(100), primary_key=True)
+    hub_id = db.Column(db.String(100))
+    connection_id = db.Column(db.String(100), nullable=False)
+    installation_id = db.Column(db.String(100), nullable=True)
+    updated = db.Column(
+        db.TIMESTAMP(),
+        default=datetime.utcnow,
+    )
+
+
+class AssetRequest(Model):
+    __tablename__ = 'asset_requests'
+    """
+    Latest Connect request of each type per asset, fed by request processing events, that way
+    polls done by CBC on async phase are answered without querying Connect.
+
+    Requests not in a final status are only trusted for a while after being synced, in case
+    that an event was lost they are refreshed from Connect.
+    """
+
+    asset_external_uid = db.Column(db.String(100), primary_key=True)
+    request_type = db.Column(db.String(20), primary_key=True)
+    request_id = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    updated = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    request = db.Column(JSONB, nullable=False)
+    synced = db.Column(db.TIMESTAMP(), nullable=True)
+
+
+class RequestSubmission(Model):
+    __tablename__ = 'request_submissions'
+    """
+    Requests placed on sync phase of tenant creation and modification, keyed by tenant, request
+    type and hash of the payload sent to Connect. Retries done by CBC of same operation are
+    answered from here instead of placing the request again.
+    """
+
+    tenant_id = db.Column(db.String(100), primary_key=True)
+    operation = db.Column(db.String(20), primary_key=True)
+    payload_hash = db.Column(db.String(64), primary_key=True)
+    request_id = db.Column(db.String(100), nullable=False)
+    response = db.Column(JSONB, nullable=False)
+    created = db.Column(
+        db.TIMESTAMP(),
+        default=datetime.utcnow,
+    )
+
+
+class TenantAsset(Model):
+    __tablename__ = 'tenant_assets'
+    """
+    Connect asset of each OA tenant, keyed by tenant APS ID (external_uid of the asset), that
+    way tenant operations resolve the asset without searching it in Connect.
+
+    Written when requests of the asset are stored, and on lookups not found here.
+    """
+
+    tenant_id = db.Column(db.String(100), primary_key=True)
+    asset_id = db.Column(db.String(100), nullable=False)
+    product_id = db.Column(db.String(100), nullable=False)
+    marketplace_id = db.Column(db.String(100), nullable=True)
+    updated = db.Column(
+        db.TIMESTAMP(),
+        default=datetime.utcnow,
+    )
+
+
+class TenantEventSubscription(Model):
+    __tablename__ = 'tenant_event_subscriptions'
+    """
+    APS event subscriptions done on tenants, like renewals and scheduled changes, that way
+    tracking of requests does not check them on OA every time.
+
+    Records are periodically verified against OA by hub healthchecks, missing subscriptions
+    are done again.
+    """
+
+    tenant_id = db.Column(db.String(100), primary_key=True)
+    event_type = db.Column(db.String(200), primary_key=True)
+    handler = db.Column(db.String(100), nullable=False)
+    source_type = db.Column(db.String(200), nullable=False)
+    controller_uri = db.Column(db.String(400), nullable=False, index=True)
+    verified = db.Column(
+        db.TIMESTAMP(),
+        default=datetime.utcnow,
+    )
+
+
+class UsageSnapshot(Model):
+    __tablename__ = 'usage_snapshots'
+    """
+    Usage aggregates of each asset, keyed by tenant APS ID, computed by events application when
+    usage files are accepted, that way usage reported to CBC is answered without querying
+    Connect.
+
+    Records of reported usage are closed later on by a scheduled task, the ones pending to be
+    closed are those reported after last closing. Aggregates are computed again once records
+    are closed.
+    """
+
+    tenant_id = db.Column(db.String(100), primary_key=True)
+    asset_id = db.Column(db.String(100), nullable=False)
+    installation_id = db.Column(db.String(100), nullable=True)
+    aggregates = db.Column(JSONB, nullable=False)
+    computed = db.Column(db.TIMESTAMP(), nullable=False)
+    reported = db.Column(db.TIMESTAMP(), nullable=True, index=True)
+    reported_items = db.Column(JSONB, nullable=True)
+    closed = db.Column(db.TIMESTAMP(), nullable=True)
+
+
+class UsageSnapshotFile(Model):
+    __tablename__ = 'usage_snapshot_files'
+    """
+    Usage files whose records are counted by the usage snapshot of a tenant. Files are flagged
+    as reported when usage of the snapshot is reported to CBC, only records of reported files
+    are closed, records of files accepted after last report are kept open.
+    """
+
+    tenant_id = db.Column(db.String(100), primary_key=True)
+    usage_file_id = db.Column(db.String(100), primary_key=True)
+    reported = db.Column(db.TIMESTAMP(), nullable=True)
+
+
+class UsageChunkCheckpoint(Model):
+    __tablename__ = 'usage_chunk_checkpoints'
+    """
+    Usage chunk files already handled by current pass of the periodic usage chunks task of a
+    hub, that way a run stopped by its time budget is resumed by next one.
+
+    Once all ready chunk files of the hub are handled, checkpoints are removed and a new pass
+    starts.
+    """
+
+    app_id = db.Column(db.String(100), primary_key=True)
+    chunk_id = db.Column(db.String(100), primary_key=True)
+    processed = db.Column(
+        db.TIMESTAMP(),
+        default=datetime.utcnow,
+    )
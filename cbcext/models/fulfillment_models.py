@@ -5,7 +5,10 @@ from attr.validators import optional
 from phonenumbers import parse as phone_parse
 
 from cbcext.services.client.apsconnectclient import request_types
-from cbcext.services.client.oaclient import OA, OACommunicationException
+from cbcext.services.client.oaclient import AsyncOA, OA, OACommunicationException
+from cbcext.services.client.oaclient.capabilities import TenantCapabilities
+from cbcext.services.event_subscriptions import async_ensure_subscribed, event_subscription
+from cbcext.services.hub.discovery import discover
 from cbcext.services.utils import get_actions
 from cbcext.utils.generic import property_parser
 from cbcext.utils.parameters import extract_activation_params
@@ -127,9 +130,6 @@ class Tenant(object):
     RENEW_EVENT_TYPE = "http://parallels.com/aps/events/pa/subscription/renewed"
     RENEW_HANDLER = "renewSubscription"
     SUBSCRIPTION_SOURCE_TYPE = "http://parallels.com/aps/types/pa/subscription/1.0"
-    VENDOR_SUBSCRIPTION_TYPE = "http://aps-standard.org/types/core/external/identifiers/1"
-    EXTERNAL_IDENTIFIERS_TYPE = "http://aps-standard.org/types/core/external/identifiers/1.1"
-    SYNC_ACTIVATION_DATE_TYPE = "http://aps-standard.org/types/core/external/identifiers/1.2"
     DELAYED_ACTIVATION_TYPE = "http://parallels.com/aps/events/pa/subscription/activate/changes"
     DELAYED_CANCEL_TYPE = "http://parallels.com/aps/events/pa/subscription/cancel/changes"
     DELAYED_ACTIVATION_HANDLER = "onActivateScheduledChanges"
@@ -162,7 +162,7 @@ class Tenant(object):
     legacy_marketplace_id = None
     legacy_planned_date_not_supported = None
 
-    def __init__(self, tenant):
+    def __init__(self, tenant, capabilities: TenantCapabilities = None):
         parse = property_parser(tenant, desc="tenant")
         self.aps_id = parse("aps.id", required=True)
         self.sub_id = parse("aps.subscription", required=True)
@@ -190,58 +190,57 @@ class Tenant(object):
         self.parameters, self.params = extract_activation_params(parameters)
 
         self.account_info = parse("accountInfo", required=True)
-        self.resources = {}
-
-        oa_schema = OA.get_tenant_schema(self.aps_type)
-        props = oa_schema.get("properties", {})
-        implements = oa_schema.get("implements", [])
-        counters = [
-            name for name, value in props.items() if "Counter" in value.get("type", "")
-        ]
-
-        self.legacy_params_form_url = "paramsFormUrl" not in props
-        self.legacy_asset_id = "assetId" not in props
-        self.legacy_vendor_subscription_id = not any(
-            self.VENDOR_SUBSCRIPTION_TYPE in x for x in implements
+
+        self.capabilities = capabilities or OA.get_tenant_capabilities(self.aps_type)
+        self.legacy_params_form_url = self.capabilities.legacy_params_form_url
+        self.legacy_asset_id = self.capabilities.legacy_asset_id
+        self.legacy_vendor_subscription_id = self.capabilities.legacy_vendor_subscription_id
+        self.legacy_external_identifiers = self.capabilities.legacy_external_identifiers
+        self.legacy_sync_activation_date = self.capabilities.legacy_sync_activation_date
+        self.legacy_marketplace_id = self.capabilities.legacy_marketplace_id
+        self.legacy_planned_date_not_supported = (
+            self.capabilities.legacy_planned_date_not_supported
         )
-        self.legacy_external_identifiers = self._legacy_external_identifiers(implements)
-        self.legacy_sync_activation_date = self.SYNC_ACTIVATION_DATE_TYPE not in implements
-        self.legacy_marketplace_id = "marketPlaceId" not in props
 
-        self.resources = {item: tenant[item]["limit"] for item in counters if item in tenant}
+        self.resources = {
+            item: tenant[item]["limit"] for item in self.capabilities.counters if item in tenant
+        }
         self.items = [{"id": key, "quantity": val} for key, val in self.resources.items()]
         self.draft_request_id = parse('draftRequestId')
-        self.legacy_planned_date_not_supported = "last_planned_request" not in props
-
-    def _legacy_external_identifiers(self, implements):
-        if self.EXTERNAL_IDENTIFIERS_TYPE in implements:
-            return False
-        if self.SYNC_ACTIVATION_DATE_TYPE in implements:
-            return False
-        return True
 
     @staticmethod
     def from_aps_id(aps_id):
         try:
-            tenant = OA.get_resource(aps_id)
+            tenant = OA.get_resource(aps_id, memoized=True)
         except OACommunicationException as e:
             if "Transaction not found by" in str(e):
-                tenant = OA.get_resource(aps_id, transaction=False)
+                tenant = OA.get_resource(aps_id, transaction=False, memoized=True)
             else:
                 raise e
         return Tenant(tenant)
 
+    @staticmethod
+    async def async_from_data(tenant):
+        """
+        Builds tenant loading capabilities of it's APS type with async OA client
+        """
+        parse = property_parser(tenant, desc="tenant")
+        capabilities = await AsyncOA.get_tenant_capabilities(
+            parse("aps.type", required=True),
+        )
+        return Tenant(tenant, capabilities=capabilities)
+
     def make_account(self):
         try:
             account = (
-                OA.get_resource(self.account_id)
+                OA.get_resource(self.account_id, memoized=True)
             )
         except OACommunicationException as e:
             # In some circumstances like daily billing, getting account using
             # transaction don't works, but it shall
             if "Transaction not found by" in str(e):
                 account = (
-                    OA.get_resource(self.account_id, transaction=False)
+                    OA.get_resource(self.account_id, transaction=False, memoized=True)
                 )
             else:
                 raise e
@@ -259,34 +258,34 @@ class Tenant(object):
 
         return Account(account)
 
-    def subscribe_for_renew(self):
-        OA.subscribe_on(
+    async def subscribe_for_renew(self):
+        await async_ensure_subscribed(
             self.aps_id,
-            Tenant.RENEW_EVENT_TYPE,
-            Tenant.RENEW_HANDLER,
-            "",
-            Tenant.SUBSCRIPTION_SOURCE_TYPE,
+            [
+                event_subscription(
+                    Tenant.RENEW_EVENT_TYPE,
+                    Tenant.RENEW_HANDLER,
+                    Tenant.SUBSCRIPTION_SOURCE_TYPE,
+                ),
+            ],
         )
 
-    def subscribe_for_delayed_actions(self):
-        if not OA.check_resource_subscribed_to(
-            aps_resource=self.aps_id,
-            event_type=Tenant.DELAYED_ACTIVATION_TYPE,
-        ):
-            OA.subscribe_on(
-                self.aps_id,
-                Tenant.DELAYED_ACTIVATION_TYPE,
-                Tenant.DELAYED_ACTIVATION_HANDLER,
-                "",
-                Tenant.SUBSCRIPTION_SOURCE_TYPE,
-            )
-            OA.subscribe_on(
-                self.aps_id,
-                Tenant.DELAYED_CANCEL_TYPE,
-                Tenant.DELAYED_CANCEL_HANDLER,
-                "",
-                Tenant.SUBSCRIPTION_SOURCE_TYPE,
-            )
+    async def subscribe_for_delayed_actions(self):
+        await async_ensure_subscribed(
+            self.aps_id,
+            [
+                event_subscription(
+                    Tenant.DELAYED_ACTIVATION_TYPE,
+                    Tenant.DELAYED_ACTIVATION_HANDLER,
+                    Tenant.SUBSCRIPTION_SOURCE_TYPE,
+                ),
+                event_subscription(
+                    Tenant.DELAYED_CANCEL_TYPE,
+                    Tenant.DELAYED_CANCEL_HANDLER,
+                    Tenant.SUBSCRIPTION_SOURCE_TYPE,
+                ),
+            ],
+        )
 
 
 class Account(object):
@@ -363,12 +362,19 @@ class Account(object):
 
     @staticmethod
     def from_aps_id(aps_id):
-        account = OA.get_resource(aps_id)
+        account = OA.get_resource(aps_id, memoized=True)
         return Account(account)
 
     @staticmethod
     def from_external_scope(aps_id, impersonate_as):
-        account = OA.get_resource(aps_id, impersonate_as=impersonate_as)
+        account = OA.get_resource(aps_id, impersonate_as=impersonate_as, memoized=True)
+        return Account(account)
+
+    @staticmethod
+    async def async_from_external_scope(aps_id, impersonate_as):
+        account = await AsyncOA.get_resource(
+            aps_id, impersonate_as=impersonate_as, memoized=True,
+        )
         return Account(account)
 
     @staticmethod
@@ -400,7 +406,7 @@ class Subscription(object):
 
     @staticmethod
     def from_aps_id(aps_id):
-        subscription = OA.get_resource(aps_id)
+        subscription = OA.get_resource(aps_id, memoized=True)
         return Subscription(subscription)
 
     @staticmethod
@@ -429,7 +435,10 @@ class Provider(OAAccountBase):
 
     @staticmethod
     def from_app_id(app_id):
+        return Provider(discover(app_id, 'provider', lambda: Provider._find(app_id)))
 
+    @staticmethod
+    def _find(app_id):
         account = Reseller.from_app_id(app_id)
         app = OA.get_resources(
             f"/aps/2/resources/?implementing({Provider.CORE_TYPE})",
@@ -437,7 +446,7 @@ class Provider(OAAccountBase):
         )[0]
         aps_id = app["aps"]["id"]
 
-        return Provider({"aps_id": aps_id, "name": account.name})
+        return {"aps_id": aps_id, "name": account.name}
 
     @staticmethod
     def dummy():
@@ -448,6 +457,10 @@ class Reseller(OAAccountBase):
 
     @staticmethod
     def from_app_id(app_id):
+        return Reseller(discover(app_id, 'reseller', lambda: Reseller._find(app_id)))
+
+    @staticmethod
+    def _find(app_id):
         account = OA.get_resources(
             f"/aps/2/resources/?implementing({Provider.ACCOUNT_TYPE}),eq(id,1)",
             impersonate_as=app_id,
@@ -455,7 +468,7 @@ class Reseller(OAAccountBase):
         name = account["companyName"]
         reseller_uuid = account["aps"]["id"]
 
-        return Reseller({"name": name, "aps_id": reseller_uuid})
+        return {"name": name, "aps_id": reseller_uuid}
 
     @staticmethod
     def get_oss_uid(initiator_id, resource_id):
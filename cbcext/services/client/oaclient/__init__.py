@@ -3,14 +3,61 @@ import os
 from collections import namedtuple
 from urllib.parse import urljoin
 
-import redis
-from requests import Request, Session
+import httpx
+from requests import Request
 from requests.exceptions import Timeout
-from starlette_context import context as g
 
-from cbcext.utils.logging_utils import send_and_log
+from cbcext.services.client.oaclient.capabilities import TenantCapabilities
+from cbcext.services.client.oaclient.sessions import OA_POOL_MAXSIZE, oa_sessions
+from cbcext.utils.cache import MISSING, SharedCache, TTLCache
+from cbcext.utils.context import g
+from cbcext.utils.identity_map import async_memoize, forget_lookups, memoize
+from cbcext.utils.logging_utils import async_send_and_log, send_and_log
 
 ErrorResponse = namedtuple("ErrorResponse", "status_code text request")
+RequestInfo = namedtuple("RequestInfo", "url headers body")
+
+REDIS_PREFIX = 'CBC-EXTENSION'
+# Schemas are stored by APS type, type id contains version, hence a new version means new key
+TENANT_SCHEMA_TTL = 24 * 3600
+TENANT_SCHEMA_LOCAL_TTL = 600
+# Tenant type in use by each APS controller, changes on application upgrade
+TENANT_TYPE_TTL = 600
+APPLICATION_SCHEMA_TTL = 600
+TENANT_CAPABILITIES_TTL = 600
+
+_application_schemas = TTLCache('application_schemas', ttl=APPLICATION_SCHEMA_TTL, maxsize=256)
+_tenant_capabilities = TTLCache('tenant_capabilities', ttl=TENANT_CAPABILITIES_TTL, maxsize=256)
+
+_tenant_schemas = SharedCache(
+    'tenant_schemas',
+    prefix=f'{REDIS_PREFIX}:tenant-schema:v3',
+    ttl=TENANT_SCHEMA_TTL,
+    local_ttl=TENANT_SCHEMA_LOCAL_TTL,
+)
+
+
+class _OtherTenantType(Exception):
+    """
+    Schema of installed application is not of requested tenant type, it must not be cached
+    under that type
+    """
+
+    def __init__(self, schema):
+        super().__init__(schema.get('id'))
+        self.schema = schema
+
+
+async def _as_coroutine(value):
+    return value
+
+
+_tenant_types = SharedCache(
+    'tenant_types',
+    prefix=f'{REDIS_PREFIX}:tenant-type:v2',
+    ttl=TENANT_TYPE_TTL,
+    local_ttl=TENANT_TYPE_TTL,
+)
 
 OA_TASKS = {
     'Connect healthcheck': {
@@ -65,13 +112,17 @@ class OA(object):
         rql_request = "aps/2/resources/{resource}/aps/subscriptions".format(resource=resource_id)
         return OA.send_request("post", rql_request, subscription)
 
+    @staticmethod
+    def get_event_subscriptions(aps_resource):
+        rql_request = f"aps/2/resources/{aps_resource}/aps/subscriptions"
+        return OA.send_request("GET", rql_request)
+
     @staticmethod
     def check_resource_subscribed_to(
         aps_resource,
         event_type,
     ):
-        rql_request = f"aps/2/resources/{aps_resource}/aps/subscriptions"
-        event_subscriptions = OA.send_request("GET", rql_request)
+        event_subscriptions = OA.get_event_subscriptions(aps_resource)
         for subscription in event_subscriptions:
             if event_type == subscription.get('event'):
                 return True
@@ -109,7 +160,9 @@ class OA(object):
         )
 
     @staticmethod
-    def get_resource(resource_id, impersonate_as=None, transaction=True, retry_num=10):
+    def get_resource(
+        resource_id, impersonate_as=None, transaction=True, retry_num=10, memoized=False,
+    ):
         rql_request = "aps/2/resources/{resource_id}".format(resource_id=resource_id)
         return OA.send_request(
             "get",
@@ -117,6 +170,7 @@ class OA(object):
             impersonate_as=impersonate_as,
             transaction=transaction,
             retry_num=retry_num,
+            memoized=memoized,
         )
 
     @staticmethod
@@ -192,6 +246,43 @@ class OA(object):
             binary=False,
             auth=None,
             timeout=None,
+            memoized=False,
+    ):
+        """
+        Sends request to OA. Memoized plain GETs are served once per incoming request, meant for
+        lookups of same resource done by different steps, like tenant or account reads. Any
+        method other than GET clears lookups done so far.
+        """
+        def send():
+            return OA._send_request(
+                method, path, body, transaction, impersonate_as, retry_num, headers, binary, auth,
+                timeout,
+            )
+
+        if memoized and OA._is_lookup(method, headers, binary, auth):
+            return memoize(OA._lookup_key(path, impersonate_as, transaction), send)
+        try:
+            return send()
+        finally:
+            if OA._is_write(method):
+                forget_lookups()
+
+    @staticmethod
+    def _is_lookup(method, headers, binary, auth):
+        return method.lower() == 'get' and not (headers or binary or auth)
+
+    @staticmethod
+    def _is_write(method):
+        return method.lower() != 'get'
+
+    @staticmethod
+    def _lookup_key(path, impersonate_as, transaction):
+        return 'oa', OA.controller_uri(), path.lstrip('/'), impersonate_as, transaction
+
+    @staticmethod
+    def _send_request(
+            method, path, body, transaction, impersonate_as, retry_num, headers, binary, auth,
+            timeout,
     ):
         oa_uri = g.source_request.headers.get("aps-controller-uri")
         url = urljoin(oa_uri, path)
@@ -202,41 +293,60 @@ class OA(object):
         retry_num = retry_num if retry_num > 0 else 1
 
         timeout = timeout if timeout else 300
-        with Session() as s:
-            auth = OA.make_prepared_auth(auth)
-            prepared = OA.make_prepared_request(method, url, data, headers, auth)
-            while retry_num > 0:
-                retry_num -= 1
-                try:
-                    resp = send_and_log(
-                        s,
-                        prepared,
-                        timeout=timeout,
-                        verify=False,
-                        binary=binary,
-                    )
-                except Timeout:
-                    err = ErrorResponse(
-                        None,
-                        "Request to OA timed out. "
-                        "Timeout: {timeout}".format(timeout=timeout),
-                        prepared,
-                    )
-                    raise OACommunicationException(err)
-                except Exception as e:
-                    err = ErrorResponse(None, str(e), prepared)
-                    raise OACommunicationException(err)
-
-                if resp.status_code == 200:
-                    return resp if binary else resp.json()
-                elif resp.status_code != 400:
-                    raise OACommunicationException(resp)
-
-            raise OACommunicationException(resp)
+        session = oa_sessions.get_session(oa_uri, pool_maxsize=OA._pool_maxsize())
+        auth = OA.make_prepared_auth(auth)
+        prepared = OA.make_prepared_request(method, url, data, headers, auth)
+        while retry_num > 0:
+            retry_num -= 1
+            try:
+                resp = send_and_log(
+                    session,
+                    prepared,
+                    timeout=timeout,
+                    verify=False,
+                    binary=binary,
+                )
+            except Timeout:
+                err = ErrorResponse(
+                    None,
+                    "Request to OA timed out. "
+                    "Timeout: {timeout}".format(timeout=timeout),
+                    prepared,
+                )
+                raise OACommunicationException(err)
+            except Exception as e:
+                err = ErrorResponse(None, str(e), prepared)
+                raise OACommunicationException(err)
+
+            if resp.status_code == 200:
+                return resp if binary else resp.json()
+            elif resp.status_code != 400:
+                raise OACommunicationException(resp)
+
+        raise OACommunicationException(resp)
+
+    @staticmethod
+    def _pool_maxsize():
+        return int(
+            g.extension_config.get(
+                'OA_POOL_MAXSIZE',
+                os.getenv('OA_POOL_MAXSIZE', OA_POOL_MAXSIZE),
+            ),
+        )
+
+    @staticmethod
+    def controller_uri():
+        return g.source_request.headers.get("aps-controller-uri")
 
     @staticmethod
     def get_application_schema():
-        return OA.send_request("get", "aps/2/application", transaction=False)
+        """
+        Returns APS application schema of current hub, cached per APS controller
+        """
+        return _application_schemas.get_or_set(
+            OA.controller_uri(),
+            lambda: OA.send_request("get", "aps/2/application", transaction=False),
+        )
 
     @staticmethod
     def is_application_support_users():
@@ -251,32 +361,64 @@ class OA(object):
         return user_schema
 
     @staticmethod
-    def get_tenant_schema(tenant_type=None):
-        redis_prefix = 'CBC-EXTENSION'
-        r = redis.from_url(
-            g.extension_config.get(
-                'REDIS_LOCATION',
-                os.getenv('REDIS_LOCATION', 'redis://redis:6379/0'),
-            ),
+    def redis_location():
+        return g.extension_config.get(
+            'REDIS_LOCATION',
+            os.getenv('REDIS_LOCATION', 'redis://redis:6379/0'),
         )
-        if tenant_type:
-            try:
-                schema = r.get(f'{redis_prefix}:{tenant_type}')
-                if schema:
-                    return json.loads(schema)
-            except Exception:
-                pass
+
+    @staticmethod
+    def get_tenant_schema(tenant_type=None):
+        """
+        Returns tenant schema of given APS type, or the one of installed application if no type
+        is passed. Schemas are cached in process and in redis.
+        """
+        location = OA.redis_location()
+        fetched = {}
+
+        def load_tenant_type():
+            fetched['schema'] = OA._fetch_tenant_schema()
+            return fetched['schema'].get('id')
+
+        if not tenant_type:
+            tenant_type = _tenant_types.get_or_set(
+                location, OA.controller_uri(), load_tenant_type,
+            )
+            if not tenant_type:
+                return {}
+
+        def load_tenant_schema():
+            schema = fetched.get('schema') or OA._fetch_tenant_schema()
+            if schema.get('id') != tenant_type:
+                raise _OtherTenantType(schema)
+            return schema
+
+        try:
+            return _tenant_schemas.get_or_set(location, tenant_type, load_tenant_schema)
+        except _OtherTenantType as e:
+            # Tenants of older versions are described by schema of installed application
+            schema = e.schema
+        if schema.get('id'):
+            _tenant_schemas.get_or_set(location, schema['id'], lambda: schema)
+        return schema
+
+    @staticmethod
+    def _fetch_tenant_schema():
         tenant_schema = {}
         tenant_schema_uri = OA.get_application_schema().get("tenant", {}).get("schema")
         if tenant_schema_uri:
             tenant_schema = OA.send_request("get", tenant_schema_uri, transaction=False)
-            tenant_type = tenant_schema['id']
-            try:
-                r.set(f'{redis_prefix}:{tenant_type}', json.dumps(tenant_schema), nx=True)
-            except Exception:
-                pass
         return tenant_schema
 
+    @staticmethod
+    def invalidate_schemas():
+        """
+        Forgets application schema and tenant type used by APS controller of current request,
+        to be used when application gets upgraded
+        """
+        _application_schemas.invalidate(OA.controller_uri())
+        _tenant_types.invalidate(OA.redis_location(), OA.controller_uri())
+
     @staticmethod
     def get_user_resources():
         return (
@@ -286,10 +428,227 @@ class OA(object):
             .get("enum", [])
         )
 
+    @staticmethod
+    def get_tenant_capabilities(tenant_type):
+        """
+        Returns features supported by given tenant APS type, cached per APS controller.
+        """
+        return _tenant_capabilities.get_or_set(
+            (OA.controller_uri(), tenant_type),
+            lambda: TenantCapabilities(
+                OA.get_tenant_schema(tenant_type),
+                OA.get_application_schema(),
+            ),
+        )
+
     @staticmethod
     def get_counters():
-        props = OA.get_tenant_schema().get("properties", {})
-        counters = [
-            name for name, value in props.items() if "Counter" in value.get("type", "")
-        ]
-        return counters
+        tenant_type = OA.get_tenant_schema().get("id")
+        return OA.get_tenant_capabilities(tenant_type).counters if tenant_type else []
+
+
+class AsyncOA(object):
+    """
+    asyncio flavour of OA client, used by endpoints implemented as coroutines.
+    Requests are signed and sent same way than OA does, using one async client per
+    APS controller.
+    """
+
+    @staticmethod
+    async def subscribe_on(
+        resource_id="", event_type="", handler="", relation="", source_type="",
+    ):
+        subscription = {
+            "event": event_type,
+            "source": {"type": source_type},
+            "relation": relation,
+            "handler": handler,
+        }
+        rql_request = "aps/2/resources/{resource}/aps/subscriptions".format(resource=resource_id)
+        return await AsyncOA.send_request("post", rql_request, subscription)
+
+    @staticmethod
+    async def get_event_subscriptions(aps_resource):
+        rql_request = f"aps/2/resources/{aps_resource}/aps/subscriptions"
+        return await AsyncOA.send_request("GET", rql_request)
+
+    @staticmethod
+    async def check_resource_subscribed_to(aps_resource, event_type):
+        event_subscriptions = await AsyncOA.get_event_subscriptions(aps_resource)
+        for subscription in event_subscriptions:
+            if event_type == subscription.get('event'):
+                return True
+        return False
+
+    @staticmethod
+    async def get_resource(
+        resource_id, impersonate_as=None, transaction=True, retry_num=10, memoized=False,
+    ):
+        rql_request = "aps/2/resources/{resource_id}".format(resource_id=resource_id)
+        return await AsyncOA.send_request(
+            "get",
+            rql_request,
+            impersonate_as=impersonate_as,
+            transaction=transaction,
+            retry_num=retry_num,
+            memoized=memoized,
+        )
+
+    @staticmethod
+    async def get_resources(rql_request, transaction=True, impersonate_as=None, retry_num=10):
+        return await AsyncOA.send_request(
+            "get",
+            rql_request,
+            transaction=transaction,
+            impersonate_as=impersonate_as,
+            retry_num=retry_num,
+        )
+
+    @staticmethod
+    def _sign(method, url, headers, auth):
+        if 'APS-Token' in headers:
+            return headers
+        # Same as OAuth1 does for requests, json bodies are not part of the signature
+        _, signed_headers, _ = OA.make_prepared_auth(auth).client.sign(
+            url, method.upper(), None, headers,
+        )
+        return signed_headers
+
+    @staticmethod
+    async def send_request(
+            method,
+            path,
+            body=None,
+            transaction=True,
+            impersonate_as=None,
+            retry_num=10,
+            headers=None,
+            auth=None,
+            timeout=None,
+            memoized=False,
+    ):
+        """
+        asyncio flavour of OA.send_request, lookups are shared with it
+        """
+        def send():
+            return AsyncOA._send_request(
+                method, path, body, transaction, impersonate_as, retry_num, headers, auth, timeout,
+            )
+
+        if memoized and OA._is_lookup(method, headers, False, auth):
+            return await async_memoize(OA._lookup_key(path, impersonate_as, transaction), send)
+        try:
+            return await send()
+        finally:
+            if OA._is_write(method):
+                forget_lookups()
+
+    @staticmethod
+    async def _send_request(
+            method, path, body, transaction, impersonate_as, retry_num, headers, auth, timeout,
+    ):
+        oa_uri = g.source_request.headers.get("aps-controller-uri")
+        url = urljoin(oa_uri, path)
+        headers = OA._create_headers(g.source_request, headers, impersonate_as, transaction)
+
+        data = OA._prepare_body(body, False)
+
+        retry_num = retry_num if retry_num > 0 else 1
+
+        timeout = timeout if timeout else 300
+        client = oa_sessions.get_async_client(oa_uri, pool_maxsize=OA._pool_maxsize())
+        headers = AsyncOA._sign(method, url, headers, auth)
+        request = client.build_request(
+            method.upper(), url, content=data, headers=headers, timeout=timeout,
+        )
+        request_info = RequestInfo(url, headers, data)
+        while retry_num > 0:
+            retry_num -= 1
+            try:
+                resp = await async_send_and_log(client, request)
+            except httpx.TimeoutException:
+                err = ErrorResponse(
+                    None,
+                    "Request to OA timed out. "
+                    "Timeout: {timeout}".format(timeout=timeout),
+                    request_info,
+                )
+                raise OACommunicationException(err)
+            except Exception as e:
+                err = ErrorResponse(None, str(e), request_info)
+                raise OACommunicationException(err)
+
+            if resp.status_code == 200:
+                return resp.json()
+            elif resp.status_code != 400:
+                raise OACommunicationException(
+                    ErrorResponse(resp.status_code, resp.text, request_info),
+                )
+
+        raise OACommunicationException(ErrorResponse(resp.status_code, resp.text, request_info))
+
+    @staticmethod
+    async def get_application_schema():
+        controller_uri = OA.controller_uri()
+        schema = _application_schemas.get(controller_uri)
+        if schema is MISSING:
+            schema = await AsyncOA.send_request("get", "aps/2/application", transaction=False)
+            _application_schemas.set(controller_uri, schema)
+        return schema
+
+    @staticmethod
+    async def get_tenant_schema(tenant_type=None):
+        location = OA.redis_location()
+        fetched = {}
+
+        async def load_tenant_type():
+            fetched['schema'] = await AsyncOA._fetch_tenant_schema()
+            return fetched['schema'].get('id')
+
+        async def load_tenant_schema():
+            schema = fetched.get('schema') or await AsyncOA._fetch_tenant_schema()
+            if schema.get('id') != tenant_type:
+                raise _OtherTenantType(schema)
+            return schema
+
+        if not tenant_type:
+            tenant_type = await _tenant_types.async_get_or_set(
+                location, OA.controller_uri(), load_tenant_type,
+            )
+            if not tenant_type:
+                return {}
+        try:
+            return await _tenant_schemas.async_get_or_set(
+                location, tenant_type, load_tenant_schema,
+            )
+        except _OtherTenantType as e:
+            # Tenants of older versions are described by schema of installed application
+            schema = e.schema
+        if schema.get('id'):
+            await _tenant_schemas.async_get_or_set(
+                location, schema['id'], lambda: _as_coroutine(schema),
+            )
+        return schema
+
+    @staticmethod
+    async def get_tenant_capabilities(tenant_type):
+        key = (OA.controller_uri(), tenant_type)
+        capabilities = _tenant_capabilities.get(key)
+        if capabilities is MISSING:
+            capabilities = TenantCapabilities(
+                await AsyncOA.get_tenant_schema(tenant_type),
+                await AsyncOA.get_application_schema(),
+            )
+            _tenant_capabilities.set(key, capabilities)
+        return capabilities
+
+    @staticmethod
+    async def _fetch_tenant_schema():
+        tenant_schema = {}
+        application_schema = await AsyncOA.get_application_schema()
+        tenant_schema_uri = application_schema.get("tenant", {}).get("schema")
+        if tenant_schema_uri:
+            tenant_schema = await AsyncOA.send_request(
+                "get", tenant_schema_uri, transaction=False,
+            )
+        return tenant_schema
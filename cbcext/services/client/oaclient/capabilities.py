@@ -0,0 +1,33 @@
+class TenantCapabilities(object):
+    """
+    Features supported by tenant APS type of the application installed in a hub, derived
+    from tenant and application schemas. Instances are cached per APS controller and tenant
+    type, use OA.get_tenant_capabilities or AsyncOA.get_tenant_capabilities to get them.
+    """
+    VENDOR_SUBSCRIPTION_TYPE = "http://aps-standard.org/types/core/external/identifiers/1"
+    EXTERNAL_IDENTIFIERS_TYPE = "http://aps-standard.org/types/core/external/identifiers/1.1"
+    SYNC_ACTIVATION_DATE_TYPE = "http://aps-standard.org/types/core/external/identifiers/1.2"
+
+    def __init__(self, tenant_schema: dict, application_schema: dict):
+        props = tenant_schema.get("properties", {})
+        implements = tenant_schema.get("implements", [])
+        self.counters = [
+            name for name, value in props.items() if "Counter" in value.get("type", "")
+        ]
+        self.legacy_params_form_url = "paramsFormUrl" not in props
+        self.legacy_asset_id = "assetId" not in props
+        self.legacy_vendor_subscription_id = not any(
+            self.VENDOR_SUBSCRIPTION_TYPE in x for x in implements
+        )
+        self.legacy_external_identifiers = self._legacy_external_identifiers(implements)
+        self.legacy_sync_activation_date = self.SYNC_ACTIVATION_DATE_TYPE not in implements
+        self.legacy_marketplace_id = "marketPlaceId" not in props
+        self.legacy_planned_date_not_supported = "last_planned_request" not in props
+        self.support_users = True if application_schema.get("user") else False
+
+    def _legacy_external_identifiers(self, implements):
+        if self.EXTERNAL_IDENTIFIERS_TYPE in implements:
+            return False
+        if self.SYNC_ACTIVATION_DATE_TYPE in implements:
+            return False
+        return True
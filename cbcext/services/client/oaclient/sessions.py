@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+OA_POOL_MAXSIZE = 10
+# Must be bigger than max timeout of a request to OA, otherwise a session in use may be closed
+OA_SESSION_IDLE_TIMEOUT = 600
+
+
+class _PooledSession:
+
+    def __init__(self, pool_maxsize):
+        # In case that proxy is not working, let's retry up to 3 times and with a backoff
+        retries = Retry(total=3, connect=3, backoff_factor=1)
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=retries,
+        )
+        self.session = Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.last_used = time.monotonic()
+
+    def counters(self):
+        requests, connections = 0, 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                requests += pool.num_requests
+                connections += pool.num_connections
+        return requests, connections
+
+    def close(self):
+        self.session.close()
+
+
+class _PooledAsyncClient:
+
+    def __init__(self, pool_maxsize):
+        # Same as sync sessions, connection failures are retried, up to 3 times
+        transport = httpx.AsyncHTTPTransport(
+            verify=False,
+            retries=3,
+            limits=httpx.Limits(
+                max_connections=pool_maxsize,
+                max_keepalive_connections=pool_maxsize,
+            ),
+        )
+        self.client = httpx.AsyncClient(transport=transport, verify=False)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            asyncio.get_running_loop().create_task(self.client.aclose())
+        except RuntimeError:
+            # No loop running, connections will be dropped with the client
+            pass
+
+
+class OASessionRegistry:
+    """
+    Process wide registry of HTTP sessions, one per APS controller URI.
+    Sessions keep connection pools alive, that way sequential calls done to same hub
+    reuse TCP and TLS connections. Sessions not used for a while are closed.
+    Async clients used by coroutine endpoints are kept the same way.
+    """
+
+    def __init__(self, idle_timeout=OA_SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._async_clients = {}
+        self._lock = threading.Lock()
+        self._evicted_requests = 0
+        self._evicted_connections = 0
+
+    def get_session(self, controller_uri, pool_maxsize=OA_POOL_MAXSIZE) -> Session:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            pooled = self._sessions.get(controller_uri)
+            if pooled is None:
+                pooled = self._sessions[controller_uri] = _PooledSession(pool_maxsize)
+            pooled.last_used = now
+            return pooled.session
+
+    def get_async_client(self, controller_uri, pool_maxsize=OA_POOL_MAXSIZE) -> httpx.AsyncClient:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            pooled = self._async_clients.get(controller_uri)
+            if pooled is None:
+                pooled = self._async_clients[controller_uri] = _PooledAsyncClient(pool_maxsize)
+            pooled.last_used = now
+            return pooled.client
+
+    def _evict_idle(self, now):
+        for uri, pooled in list(self._sessions.items()):
+            if now - pooled.last_used > self.idle_timeout:
+                requests, connections = pooled.counters()
+                self._evicted_requests += requests
+                self._evicted_connections += connections
+                pooled.close()
+                del self._sessions[uri]
+        for uri, pooled in list(self._async_clients.items()):
+            if now - pooled.last_used > self.idle_timeout:
+                pooled.close()
+                del self._async_clients[uri]
+
+    def close_all(self):
+        with self._lock:
+            self._evict_idle(float('inf'))
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            requests, connections = self._evicted_requests, self._evicted_connections
+            for pooled in self._sessions.values():
+                pooled_requests, pooled_connections = pooled.counters()
+                requests += pooled_requests
+                connections += pooled_connections
+            return {
+                'sessions': len(self._sessions),
+                'async_clients': len(self._async_clients),
+                'requests': requests,
+                'connections': connections,
+                'reused_connections': max(requests - connections, 0),
+            }
+
+
+oa_sessions = OASessionRegistry()
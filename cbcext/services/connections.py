@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from cbcext.db import SessionLocal
+from cbcext.services.db_services import fetch_product_connection, save_product_connection
+from cbcext.utils.context import g
+
+
+@contextmanager
+def _session():
+    # Lookups may run concurrently in fan-out threads, request session can't be shared by them
+    db = SessionLocal(bind=g.db.get_bind())
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _connections_filter(hub_uuid):
+    return f'eq(hub.instance.id,{hub_uuid})'
+
+
+def get_connection_id(product_id, hub_uuid):
+    """
+    Returns id of the connection of product to hub. It's resolved from the product connections
+    index, Connect is only queried in case that it's not indexed yet.
+    :param product_id: str
+    :param hub_uuid: str, APS Root Resource ID in OA
+    :return: str or None
+    """
+    indexed = _fetch_indexed_connection_id(product_id, hub_uuid)
+    if indexed:
+        return indexed
+    connection = g.client.products[product_id].connections.filter(
+        _connections_filter(hub_uuid),
+    ).first()
+    if not connection:
+        return None
+    index_connection(product_id, connection)
+    return connection['id']
+
+
+async def async_get_connection_id(product_id, hub_uuid):
+    """
+    asyncio flavour of get_connection_id
+    """
+    indexed = await run_in_threadpool(_fetch_indexed_connection_id, product_id, hub_uuid)
+    if indexed:
+        return indexed
+    connection = await g.async_client.products[product_id].connections.filter(
+        _connections_filter(hub_uuid),
+    ).first()
+    if not connection:
+        return None
+    await run_in_threadpool(index_connection, product_id, connection)
+    return connection['id']
+
+
+def _fetch_indexed_connection_id(product_id, hub_uuid):
+    with _session() as db:
+        indexed = fetch_product_connection(db, product_id=product_id, hub_uuid=hub_uuid)
+        return indexed.connection_id if indexed else None
+
+
+def index_connection(product_id, connection):
+    """
+    Stores connection found in Connect on the product connections index
+    :param product_id: str
+    :param connection: dict
+    """
+    with _session() as db:
+        save_product_connection(db, product_id, connection, g.installation_id)
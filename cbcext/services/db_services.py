@@ -1,9 +1,37 @@
-from datetime import datetime
+from collections import namedtuple
+from copy import deepcopy
+from datetime import datetime, timedelta
 
+from dateutil.parser import isoparse
 from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
-from cbcext.models.db_models import Configuration, GlobalAppConfiguration, HubInstances
+from cbcext.models.db_models import (
+    AssetRequest,
+    Configuration,
+    GlobalAppConfiguration,
+    HubInstances,
+    ProductConnection,
+    RequestSubmission,
+    TenantAsset,
+    TenantEventSubscription,
+    UsageChunkCheckpoint,
+    UsageSnapshot,
+    UsageSnapshotFile,
+)
+from cbcext.utils.cache import MISSING, TTLCache
+
+CONFIGURATION_TTL = 300
+CONFIGURATION_NEGATIVE_TTL = 30
+
+ConfigurationData = namedtuple(
+    "ConfigurationData",
+    "oauth_key oauth_secret instance_id installation_id",
+)
+
+_configuration_cache = TTLCache('configuration', ttl=CONFIGURATION_TTL)
 
 
 def fetch_configuration(db: Session, **filter_kw):
@@ -19,6 +47,44 @@ def fetch_configuration(db: Session, **filter_kw):
     return db.query(Configuration).filter_by(**filter_kw).first()
 
 
+def fetch_cached_configuration(db: Session, oauth_key):
+    """
+    Same as fetch_configuration by oauth_key but served from in-process cache when possible.
+    Unknown keys are cached as well for a shorter period to avoid hitting DB on each
+    request signed with wrong credentials.
+
+    :param str oauth_key:
+
+    :rtype: ConfigurationData
+    :return: detached copy of the configuration or None.
+    """
+    configuration = _configuration_cache.get(oauth_key)
+    if configuration is not MISSING:
+        return configuration
+
+    configuration = fetch_configuration(db, oauth_key=oauth_key)
+    if not configuration:
+        _configuration_cache.set(oauth_key, None, ttl=CONFIGURATION_NEGATIVE_TTL)
+        return None
+
+    # ORM instance is bound to request session, we keep a plain copy instead
+    configuration = ConfigurationData(
+        oauth_key=configuration.oauth_key,
+        oauth_secret=configuration.oauth_secret,
+        instance_id=configuration.instance_id,
+        installation_id=configuration.installation_id,
+    )
+    _configuration_cache.set(oauth_key, configuration)
+    return configuration
+
+
+def invalidate_cached_configuration(oauth_key):
+    """
+    Drops cached configuration (or cached miss) for given oauth_key.
+    """
+    _configuration_cache.invalidate(oauth_key)
+
+
 def fetch_hub_uuid_by_app_id(db: Session, app_id):
     """
     Look ups for app-hub binding in GlobalAppConfiguration.
@@ -78,3 +144,467 @@ def remove_aps_global_config(db: Session, app_id, impersonator_hub_uuid):
 
         app2hub.query.delete()
         db.session.commit()
+
+
+def fetch_product_connection(db: Session, **filter_kw):
+    """
+    Selects indexed connection of a product to a hub.
+
+    :keyword str product_id:
+    :keyword str hub_uuid: APS Root Resource ID in OA
+    :keyword str hub_id: Connect hub id
+
+    :rtype: ProductConnection
+    """
+    return db.query(ProductConnection).filter_by(**filter_kw).first()
+
+
+def save_product_connection(db: Session, product_id, connection, installation_id=None):
+    """
+    Creates or updates index entry of a product connection.
+
+    :param str product_id:
+    :param dict connection: Connect Public API representation of the connection.
+    :param str installation_id:
+    """
+    values = {
+        'product_id': product_id,
+        'hub_uuid': connection['hub']['instance']['id'],
+        'hub_id': connection['hub']['id'],
+        'connection_id': connection['id'],
+        'installation_id': installation_id,
+        'updated': datetime.utcnow(),
+    }
+    db.execute(
+        insert(ProductConnection).values(**values).on_conflict_do_update(
+            index_elements=['product_id', 'hub_uuid'],
+            set_=values,
+        ),
+    )
+    db.commit()
+
+
+def remove_product_connections(db: Session, product_id, installation_id, keep):
+    """
+    Removes index entries of product connections of an installation that are not in keep.
+
+    :param list keep: connection ids still present in Connect
+    """
+    db.query(ProductConnection).filter(
+        ProductConnection.product_id == product_id,
+        ProductConnection.installation_id == installation_id,
+        ProductConnection.connection_id.notin_(keep),
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def fetch_last_asset_request(
+    db: Session, asset_external_uid, request_type=None, final_statuses=(), max_age=None,
+):
+    """
+    Returns last stored request of an asset, optionally of a given type.
+
+    :param str asset_external_uid: APS ID of the tenant
+    :param str request_type:
+    :param tuple final_statuses: statuses that don't change anymore, always trusted
+    :param int max_age: seconds, requests in other statuses synced before are not returned
+
+    :rtype: dict
+    :return: request as returned by Connect Public API or None.
+    """
+    query = db.query(AssetRequest).filter_by(asset_external_uid=asset_external_uid)
+    if request_type:
+        query = query.filter_by(request_type=request_type)
+    last = query.order_by(AssetRequest.created.desc()).first()
+    if not last:
+        return None
+    if max_age is not None and last.status not in final_statuses and (
+        last.synced is None or last.synced < datetime.utcnow() - timedelta(seconds=max_age)
+    ):
+        return None
+    return last.request
+
+
+def save_asset_request(db: Session, request):
+    """
+    Stores request as latest one of its type for the asset. Older requests, or older states of
+    same request, are ignored since events may be delivered out of order.
+
+    :param dict request: Connect Public API representation of the request.
+    """
+    request = deepcopy(request)
+    request['asset'].pop('configuration', None)
+    values = {
+        'asset_external_uid': request['asset']['external_uid'],
+        'request_type': request['type'],
+        'request_id': request['id'],
+        'status': request['status'],
+        'created': isoparse(request['created']),
+        'updated': isoparse(request['updated']),
+        'request': request,
+        'synced': datetime.utcnow(),
+    }
+    _save_tenant_asset(db, request['asset'], replace=request['type'] == 'purchase')
+    statement = insert(AssetRequest).values(**values)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=['asset_external_uid', 'request_type'],
+            set_=values,
+            where=or_(
+                AssetRequest.created < statement.excluded.created,
+                and_(
+                    AssetRequest.request_id == statement.excluded.request_id,
+                    AssetRequest.updated <= statement.excluded.updated,
+                ),
+            ),
+        ),
+    )
+    db.commit()
+
+
+def fetch_tenant_asset(db: Session, tenant_id):
+    """
+    Selects asset mapped to a tenant.
+
+    :param str tenant_id: APS ID of the tenant
+
+    :rtype: TenantAsset
+    """
+    return db.query(TenantAsset).filter_by(tenant_id=tenant_id).first()
+
+
+def save_tenant_asset(db: Session, asset, replace=False):
+    """
+    Maps asset to its tenant.
+
+    :param dict asset: Connect Public API representation of the asset.
+    :param bool replace: whether an existing mapping is replaced, tenant only gets a new asset
+        when it's purchased again, f.e. after a failed purchase.
+    """
+    _save_tenant_asset(db, asset, replace)
+    db.commit()
+
+
+def _save_tenant_asset(db: Session, asset, replace):
+    values = {
+        'tenant_id': asset['external_uid'],
+        'asset_id': asset['id'],
+        'product_id': asset['product']['id'],
+        'marketplace_id': (asset.get('marketplace') or {}).get('id'),
+        'updated': datetime.utcnow(),
+    }
+    statement = insert(TenantAsset).values(**values)
+    if replace:
+        statement = statement.on_conflict_do_update(index_elements=['tenant_id'], set_=values)
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=['tenant_id'])
+    db.execute(statement)
+
+
+def fetch_request_submission(db: Session, tenant_id, operation, payload_hash, max_age):
+    """
+    Selects submission of a request placed for the tenant with same payload.
+
+    :param str tenant_id: APS ID of the tenant
+    :param str operation: request type
+    :param str payload_hash:
+    :param int max_age: seconds, older submissions are ignored
+
+    :rtype: RequestSubmission
+    :return: submission with placed request id and response given, or None.
+    """
+    return db.query(RequestSubmission).filter(
+        RequestSubmission.tenant_id == tenant_id,
+        RequestSubmission.operation == operation,
+        RequestSubmission.payload_hash == payload_hash,
+        RequestSubmission.created >= datetime.utcnow() - timedelta(seconds=max_age),
+    ).first()
+
+
+def save_request_submission(db: Session, tenant_id, operation, payload_hash, request_id, response):
+    """
+    Stores response given to a placed request. Only last submission of each operation is kept
+    per tenant, since going back to a previous payload is a new operation, f.e. limits changed
+    from A to B and back to A.
+
+    :param str request_id: Connect id of the placed request
+    :param dict response: JSON serializable response
+    """
+    values = {
+        'tenant_id': tenant_id,
+        'operation': operation,
+        'payload_hash': payload_hash,
+        'request_id': request_id,
+        'response': response,
+        'created': datetime.utcnow(),
+    }
+    db.query(RequestSubmission).filter(
+        RequestSubmission.tenant_id == tenant_id,
+        RequestSubmission.operation == operation,
+    ).delete(synchronize_session=False)
+    db.execute(
+        insert(RequestSubmission).values(**values).on_conflict_do_update(
+            index_elements=['tenant_id', 'operation', 'payload_hash'],
+            set_=values,
+        ),
+    )
+    db.commit()
+
+
+def remove_request_submission(db: Session, tenant_id, operation, payload_hash):
+    """
+    Removes submission of a request, retries with same payload are placed again.
+    """
+    db.query(RequestSubmission).filter(
+        RequestSubmission.tenant_id == tenant_id,
+        RequestSubmission.operation == operation,
+        RequestSubmission.payload_hash == payload_hash,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def fetch_tenant_event_subscriptions(db: Session, tenant_id):
+    """
+    Returns event types that tenant is known to be subscribed to.
+
+    :param str tenant_id: APS ID of the tenant
+
+    :rtype: set
+    """
+    return {
+        event_type for event_type, in db.query(TenantEventSubscription.event_type).filter_by(
+            tenant_id=tenant_id,
+        )
+    }
+
+
+def fetch_unverified_event_subscriptions(db: Session, controller_uri, max_age, limit):
+    """
+    Selects subscriptions done on tenants of a hub, which were not verified during max_age,
+    least recently verified first.
+
+    :param str controller_uri: APS controller URI of the hub
+    :param int max_age: seconds
+    :param int limit:
+
+    :rtype: list of TenantEventSubscription
+    """
+    return db.query(TenantEventSubscription).filter(
+        TenantEventSubscription.controller_uri == controller_uri,
+        TenantEventSubscription.verified < datetime.utcnow() - timedelta(seconds=max_age),
+    ).order_by(TenantEventSubscription.verified).limit(limit).all()
+
+
+def save_tenant_event_subscriptions(db: Session, tenant_id, subscriptions, controller_uri):
+    """
+    Records tenant as subscribed to events, as verified now.
+
+    :param str tenant_id: APS ID of the tenant
+    :param list subscriptions: dicts with event_type, handler and source_type
+    :param str controller_uri: APS controller URI of the hub
+    """
+    for subscription in subscriptions:
+        values = dict(
+            subscription,
+            tenant_id=tenant_id,
+            controller_uri=controller_uri,
+            verified=datetime.utcnow(),
+        )
+        db.execute(
+            insert(TenantEventSubscription).values(**values).on_conflict_do_update(
+                index_elements=['tenant_id', 'event_type'],
+                set_=values,
+            ),
+        )
+    db.commit()
+
+
+def postpone_event_subscriptions_verification(db: Session, tenant_id, max_age, delay):
+    """
+    Records that subscriptions of a tenant could not be verified, they are selected again
+    as unverified once delay is elapsed.
+
+    :param str tenant_id: APS ID of the tenant
+    :param int max_age: seconds, as used to select unverified subscriptions
+    :param int delay: seconds
+    """
+    db.query(TenantEventSubscription).filter_by(tenant_id=tenant_id).update(
+        {'verified': datetime.utcnow() - timedelta(seconds=max_age - delay)},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def remove_tenant_event_subscriptions(db: Session, tenant_id):
+    """
+    Removes recorded subscriptions of a tenant, f.e. once tenant is gone.
+
+    :param str tenant_id: APS ID of the tenant
+    """
+    db.query(TenantEventSubscription).filter_by(tenant_id=tenant_id).delete(
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def fetch_usage_snapshot(db: Session, tenant_id):
+    """
+    Selects usage snapshot of a tenant.
+
+    :param str tenant_id: APS ID of the tenant
+
+    :rtype: UsageSnapshot
+    """
+    return db.query(UsageSnapshot).filter_by(tenant_id=tenant_id).first()
+
+
+def save_usage_snapshot(
+    db: Session,
+    tenant_id,
+    asset_id,
+    aggregates,
+    installation_id=None,
+    usage_file_id=None,
+):
+    """
+    Creates or updates usage snapshot of a tenant, report and closing state is kept.
+
+    :param str tenant_id: APS ID of the tenant
+    :param str asset_id:
+    :param list aggregates: Connect Public API representation of usage aggregates of the asset.
+    :param str installation_id:
+    :param str usage_file_id: accepted usage file counted by the aggregates
+    """
+    values = {
+        'tenant_id': tenant_id,
+        'asset_id': asset_id,
+        'installation_id': installation_id,
+        'aggregates': aggregates,
+        'computed': datetime.utcnow(),
+    }
+    db.execute(
+        insert(UsageSnapshot).values(**values).on_conflict_do_update(
+            index_elements=['tenant_id'],
+            set_=values,
+        ),
+    )
+    if usage_file_id:
+        db.execute(
+            insert(UsageSnapshotFile).values(
+                tenant_id=tenant_id,
+                usage_file_id=usage_file_id,
+            ).on_conflict_do_nothing(index_elements=['tenant_id', 'usage_file_id']),
+        )
+    db.commit()
+
+
+def mark_usage_snapshot_reported(db: Session, tenant_id, reported_items):
+    """
+    Records that usage of snapshot was reported to CBC, records of its usage files are pending
+    to be closed.
+
+    :param list reported_items: local ids of reported items
+    """
+    reported = datetime.utcnow()
+    db.query(UsageSnapshot).filter_by(tenant_id=tenant_id).update(
+        {'reported': reported, 'reported_items': reported_items},
+        synchronize_session=False,
+    )
+    db.query(UsageSnapshotFile).filter_by(tenant_id=tenant_id, reported=None).update(
+        {'reported': reported},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def fetch_usage_snapshots_to_close(db: Session, limit):
+    """
+    Selects snapshots reported after their records were last closed, oldest report first.
+
+    :rtype: list of UsageSnapshot
+    """
+    return db.query(UsageSnapshot).filter(
+        UsageSnapshot.reported.isnot(None),
+        or_(UsageSnapshot.closed.is_(None), UsageSnapshot.closed < UsageSnapshot.reported),
+    ).order_by(UsageSnapshot.reported).limit(limit).all()
+
+
+def fetch_reported_usage_files(db: Session, tenant_id):
+    """
+    Returns ids of usage files whose usage was reported to CBC and records are not closed yet.
+
+    :rtype: list
+    """
+    return [
+        usage_file_id for usage_file_id, in db.query(UsageSnapshotFile.usage_file_id).filter(
+            UsageSnapshotFile.tenant_id == tenant_id,
+            UsageSnapshotFile.reported.isnot(None),
+        ).order_by(UsageSnapshotFile.usage_file_id)
+    ]
+
+
+def mark_usage_snapshot_closed(db: Session, tenant_id, reported, computed, usage_file_ids,
+                               aggregates=None):
+    """
+    Records that records of usage reported at given time were closed. Aggregates computed
+    after closing, if any, replace the snapshot ones unless snapshot was computed again
+    meanwhile.
+
+    :param datetime reported: report time of closed usage
+    :param datetime computed: computation time of snapshot when closing started
+    :param list usage_file_ids: usage files whose records were closed
+    :param list aggregates: Connect Public API representation of usage aggregates of the asset.
+    """
+    db.query(UsageSnapshot).filter_by(tenant_id=tenant_id).update(
+        {'closed': reported},
+        synchronize_session=False,
+    )
+    if aggregates is not None:
+        db.query(UsageSnapshot).filter_by(tenant_id=tenant_id, computed=computed).update(
+            {'aggregates': aggregates, 'computed': datetime.utcnow()},
+            synchronize_session=False,
+        )
+    if usage_file_ids:
+        db.query(UsageSnapshotFile).filter(
+            UsageSnapshotFile.tenant_id == tenant_id,
+            UsageSnapshotFile.usage_file_id.in_(usage_file_ids),
+        ).delete(synchronize_session=False)
+    db.commit()
+
+
+def fetch_usage_chunk_checkpoints(db: Session, app_id):
+    """
+    Returns ids of usage chunk files handled by current pass of a hub.
+
+    :param str app_id: APS ID of Connect APS Global application instance
+
+    :rtype: set
+    """
+    return {
+        chunk_id for chunk_id, in db.query(UsageChunkCheckpoint.chunk_id).filter_by(
+            app_id=app_id,
+        )
+    }
+
+
+def save_usage_chunk_checkpoints(db: Session, app_id, chunk_ids):
+    """
+    Records usage chunk files as handled by current pass of a hub.
+    """
+    for chunk_id in chunk_ids:
+        db.execute(
+            insert(UsageChunkCheckpoint).values(
+                app_id=app_id,
+                chunk_id=chunk_id,
+                processed=datetime.utcnow(),
+            ).on_conflict_do_nothing(index_elements=['app_id', 'chunk_id']),
+        )
+    db.commit()
+
+
+def reset_usage_chunk_checkpoints(db: Session, app_id):
+    """
+    Removes checkpoints of a hub, a new pass over its usage chunk files starts.
+    """
+    db.query(UsageChunkCheckpoint).filter_by(app_id=app_id).delete(synchronize_session=False)
+    db.commit()
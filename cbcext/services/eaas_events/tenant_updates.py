@@ -0,0 +1,82 @@
+from requests_oauthlib import OAuth1
+from sqlalchemy.orm import Session
+from starlette_context import request_cycle_context
+
+from cbcext.models.db_models import HubInstances
+from cbcext.services.fulfillment.request_tracker_utils import update_tenant_with_request
+from cbcext.utils.cache import TTLCache
+from cbcext.utils.context import g
+from cbcext.utils.dependencies import Request
+from cbcext.utils.identity_map import IdentityMap
+
+# Requests which outcome changes tenant data stored in CBC, like parameters and activation key
+PUSHED_REQUEST_TYPES = ('purchase', 'change', 'adjustment')
+PUSHED_REQUEST_STATUSES = ('approved',)
+CONNECTION_CREDENTIALS_TTL = 600
+# Pushing is best effort, CBC keeps polling, event processing must not be hold by a slow hub
+TENANT_PUSH_TIMEOUT = 5
+
+_connection_credentials = TTLCache('connection_credentials', ttl=CONNECTION_CREDENTIALS_TTL)
+
+
+def push_request_to_tenant(db: Session, client, config, logger, request):
+    """
+    Updates the tenant of request's asset in CBC through the APS bus of its hub, that way
+    outcome of the request is reflected without waiting for CBC to poll us.
+
+    Hub is reached using the controller URI tracked by healthchecks, signed with credentials of
+    the connection used by the request. Failures are logged only, CBC gets the outcome on its
+    next poll anyway.
+
+    :return: bool, True if tenant was updated
+    """
+    if request['type'] not in PUSHED_REQUEST_TYPES or request['status'] not in (
+        PUSHED_REQUEST_STATUSES
+    ):
+        return False
+    connection = request['asset']['connection']
+    hub = db.query(HubInstances).filter_by(hub_id=connection.get('hub', {}).get('id')).first()
+    if not hub or not hub.controller_uri:
+        return False
+    try:
+        return _update_tenant(client, config, logger, request, hub.controller_uri)
+    except Exception as e:
+        logger.warning(
+            f'Tenant {request["asset"]["external_uid"]} not updated with request '
+            f'{request["id"]}: {e}',
+        )
+        return False
+
+
+def _update_tenant(client, config, logger, request, controller_uri):
+    credentials = _get_connection_credentials(
+        client,
+        request['asset']['product']['id'],
+        request['asset']['connection']['id'],
+    )
+    with request_cycle_context({}):
+        g.source_request = Request(
+            json={},
+            headers={'aps-controller-uri': controller_uri},
+            query_params={},
+            query_string='',
+        )
+        g.auth = OAuth1(client_key=credentials[0], client_secret=credentials[1])
+        g.client = client
+        g.extension_config = config
+        g.logger = logger
+        g.identity_map = IdentityMap()
+        tenant = update_tenant_with_request(
+            request['asset']['external_uid'],
+            request,
+            timeout=TENANT_PUSH_TIMEOUT,
+        )
+        return bool(tenant)
+
+
+def _get_connection_credentials(client, product_id, connection_id):
+    def load():
+        connection = client.products[product_id].connections[connection_id].get()
+        return connection['oauth_key'], connection['oauth_secret']
+
+    return _connection_credentials.get_or_set(connection_id, load)
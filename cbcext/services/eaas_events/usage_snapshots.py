@@ -0,0 +1,124 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from cbcext.services.client.apsconnectclient import request_statuses
+from cbcext.services.db_services import (
+    fetch_reported_usage_files,
+    fetch_usage_snapshots_to_close,
+    mark_usage_snapshot_closed,
+    save_usage_snapshot,
+)
+from cbcext.services.usage.usagecollector import (
+    AGGREGATE_FIELDS,
+    CLOSE_BATCH_SIZE,
+    FETCH_DEFAULT_LIMIT,
+    RECORD_FIELDS,
+    USAGE_SCHEMA,
+)
+
+# Snapshots whose records are closed on each scheduled execution
+CLOSE_SNAPSHOTS_LIMIT = 500
+
+
+def _get_usage_aggregates(client, tenant_id):
+    return list(
+        client.ns('usage').collection('aggregates').filter(
+            f'asset.external_uid={tenant_id}',
+        ).select(*AGGREGATE_FIELDS).limit(FETCH_DEFAULT_LIMIT),
+    )
+
+
+def snapshot_usage_file(db: Session, client, usage_file, installation_id=None):
+    """
+    Stores usage aggregates of assets with records on accepted usage file, that way usage
+    reported to CBC for them is answered from the snapshot.
+    :return: number of snapshots stored
+    """
+    if usage_file.get('schema') != USAGE_SCHEMA:
+        return 0
+    records = client.ns('usage').collection('records').filter(
+        f'usagefile.id={usage_file["id"]}',
+    ).select('asset.id', 'asset.external_uid').limit(FETCH_DEFAULT_LIMIT)
+    assets = {}
+    for record in records:
+        if record['asset'].get('external_uid'):
+            assets[record['asset']['external_uid']] = record['asset']['id']
+    for tenant_id, asset_id in assets.items():
+        save_usage_snapshot(
+            db,
+            tenant_id,
+            asset_id,
+            _get_usage_aggregates(client, tenant_id),
+            installation_id,
+            usage_file['id'],
+        )
+    return len(assets)
+
+
+def close_reported_usage(db: Session, get_client):
+    """
+    Closes usage records of items reported to CBC from snapshots, up to CLOSE_SNAPSHOTS_LIMIT
+    snapshots per call. Only records of usage files counted by reported snapshots are closed,
+    aggregates of the snapshot are computed again afterwards.
+    :param get_client: callable returning client to use given an installation id
+    :return: number of snapshots closed
+    """
+    clients = {}
+    snapshots = fetch_usage_snapshots_to_close(db, CLOSE_SNAPSHOTS_LIMIT)
+    for snapshot in snapshots:
+        if snapshot.installation_id not in clients:
+            clients[snapshot.installation_id] = get_client(snapshot.installation_id)
+        client = clients[snapshot.installation_id]
+        # Files reported while closing are closed on next execution
+        tenant_id, reported, computed = snapshot.tenant_id, snapshot.reported, snapshot.computed
+        usage_file_ids = fetch_reported_usage_files(db, tenant_id)
+        aggregates = None
+        if usage_file_ids:
+            _close_usage_records(
+                client,
+                tenant_id,
+                usage_file_ids,
+                set(snapshot.reported_items or []),
+            )
+            aggregates = _get_usage_aggregates(client, tenant_id)
+        mark_usage_snapshot_closed(db, tenant_id, reported, computed, usage_file_ids, aggregates)
+    return len(snapshots)
+
+
+def _get_usage_records_page(client, tenant_id, usage_file_ids, after=None):
+    """ Page of approved usage records of given files ordered by id, after given id if any """
+    rql = (
+        f'status={request_statuses.approved}'
+        f'&asset.external_uid={tenant_id}'
+        f'&usagefile.schema={USAGE_SCHEMA}'
+        f'&in(usagefile.id,({",".join(usage_file_ids)}))'
+    )
+    if after:
+        rql += f'&gt(id,{after})'
+    return list(
+        client.ns('usage').collection('records').filter(rql).select(
+            *RECORD_FIELDS,
+        ).order_by('id')[0:FETCH_DEFAULT_LIMIT],
+    )
+
+
+def _close_usage_records(client, tenant_id, usage_file_ids, reported_items):
+    """
+    Closes records of reported items on given usage files. Pages are fetched by id cursor,
+    records being closed leave the approved listing without shifting pages still to come.
+    """
+    close_records = client.ns('usage').ns('records').collection('close-records')
+    note = "Closed at {time}".format(time=datetime.now())
+    page = _get_usage_records_page(client, tenant_id, usage_file_ids)
+    while page:
+        rec_ids = [
+            {"id": usage_rec['id'], "external_billing_note": note}
+            for usage_rec in page
+            if usage_rec['item'].get('local_id') in reported_items
+        ]
+        for start in range(0, len(rec_ids), CLOSE_BATCH_SIZE):
+            close_records.bulk_create(rec_ids[start:start + CLOSE_BATCH_SIZE])
+        if len(page) < FETCH_DEFAULT_LIMIT:
+            break
+        page = _get_usage_records_page(client, tenant_id, usage_file_ids, page[-1]['id'])
@@ -2,6 +2,11 @@ from connect.client.rql import R
 
 from cbcext.models.db_models import Configuration
 from cbcext.db import get_engine
+from cbcext.services.db_services import (
+    invalidate_cached_configuration,
+    remove_product_connections,
+    save_product_connection,
+)
 
 from sqlalchemy.orm import Session
 
@@ -41,6 +46,7 @@ def add_product_connections(db: Session, client, installation_id):
     for product in products:
         connections = get_oa_connections(client, product['id'])
         for connection in connections:
+            save_product_connection(db, product['id'], connection, installation_id)
             exists = db.query(Configuration).filter_by(
                 oauth_key=connection['oauth_key'],
             ).first()
@@ -53,6 +59,13 @@ def add_product_connections(db: Session, client, installation_id):
                 )
                 db.add(conn)
                 db.commit()
+                invalidate_cached_configuration(connection['oauth_key'])
+        remove_product_connections(
+            db,
+            product['id'],
+            installation_id,
+            keep=[connection['id'] for connection in connections],
+        )
 
 
 def add_installation_hubs(db: Session, client, installation_id):
@@ -70,3 +83,4 @@ def add_installation_hubs(db: Session, client, installation_id):
             )
             db.add(conn)
             db.commit()
+            invalidate_cached_configuration(hub['creds']['key'])
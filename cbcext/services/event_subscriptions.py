@@ -0,0 +1,156 @@
+import threading
+from itertools import groupby
+
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+
+from cbcext.db import SessionLocal
+from cbcext.services.client.oaclient import AsyncOA, OA, OACommunicationException
+from cbcext.services.db_services import (
+    fetch_tenant_event_subscriptions,
+    fetch_unverified_event_subscriptions,
+    postpone_event_subscriptions_verification,
+    remove_tenant_event_subscriptions,
+    save_tenant_event_subscriptions,
+)
+from cbcext.utils.concurrency import run_in_background
+from cbcext.utils.context import g
+
+# Subscriptions may be removed on OA side, f.e. when tenant is restored from a backup, recorded
+# ones are verified against OA by hub healthchecks once per interval
+SUBSCRIPTION_VERIFY_INTERVAL = 7 * 24 * 3600
+SUBSCRIPTION_VERIFY_BATCH = 100
+# Subscriptions of tenants that could not be checked are verified again after this delay
+SUBSCRIPTION_VERIFY_RETRY = 24 * 3600
+
+# APS controllers which subscriptions are being verified by this process
+_verifying = set()
+_verifying_lock = threading.Lock()
+
+
+def event_subscription(event_type, handler, source_type):
+    return {
+        'event_type': event_type,
+        'handler': handler,
+        'source_type': source_type,
+    }
+
+
+async def async_ensure_subscribed(tenant_id, subscriptions):
+    """
+    Subscribes tenant to given APS events, OA is only queried for events that tenant is not
+    known to be subscribed to, that way once subscribed no further call is done.
+    :param tenant_id: str, APS ID of the tenant
+    :param subscriptions: list of dicts, as provided by event_subscription
+    """
+    recorded = await run_in_threadpool(fetch_tenant_event_subscriptions, g.db, tenant_id)
+    missing = [item for item in subscriptions if item['event_type'] not in recorded]
+    if not missing:
+        return
+    subscribed = {item.get('event') for item in await AsyncOA.get_event_subscriptions(tenant_id)}
+    for item in missing:
+        if item['event_type'] not in subscribed:
+            await AsyncOA.subscribe_on(
+                tenant_id,
+                item['event_type'],
+                item['handler'],
+                "",
+                item['source_type'],
+            )
+    await run_in_threadpool(_record_subscriptions, tenant_id, missing, OA.controller_uri())
+
+
+def _record_subscriptions(tenant_id, subscriptions, controller_uri):
+    try:
+        save_tenant_event_subscriptions(g.db, tenant_id, subscriptions, controller_uri)
+    except DBAPIError:
+        # Subscriptions are done, they will be checked again on next tracking
+        g.db.rollback()
+
+
+def start_event_subscriptions_verification():
+    """
+    Runs verify_event_subscriptions in background, unless subscriptions of current hub are
+    already being verified. Errors are logged once it's done.
+
+    :return: Future or None if not started
+    """
+    controller_uri = OA.controller_uri()
+    with _verifying_lock:
+        if controller_uri in _verifying:
+            return None
+        _verifying.add(controller_uri)
+    logger = g.logger
+    try:
+        future = run_in_background(verify_event_subscriptions)
+    except Exception:
+        _verification_done(controller_uri)
+        raise
+    future.add_done_callback(
+        lambda done: _verification_done(controller_uri, done, logger),
+    )
+    return future
+
+
+def _verification_done(controller_uri, future=None, logger=None):
+    with _verifying_lock:
+        _verifying.discard(controller_uri)
+    if future is not None and not future.cancelled() and future.exception() is not None:
+        logger.error(
+            f'Verification of event subscriptions of {controller_uri} failed: '
+            f'{future.exception()!r}',
+        )
+
+
+def verify_event_subscriptions():
+    """
+    Verifies against OA a batch of subscriptions done on tenants of current hub, that were not
+    verified during SUBSCRIPTION_VERIFY_INTERVAL. Missing subscriptions are done again.
+    """
+    controller_uri = OA.controller_uri()
+    db = SessionLocal(bind=g.db.get_bind())
+    try:
+        records = fetch_unverified_event_subscriptions(
+            db,
+            controller_uri,
+            SUBSCRIPTION_VERIFY_INTERVAL,
+            SUBSCRIPTION_VERIFY_BATCH,
+        )
+        records.sort(key=lambda record: record.tenant_id)
+        for tenant_id, tenant_records in groupby(records, key=lambda record: record.tenant_id):
+            subscriptions = [
+                event_subscription(record.event_type, record.handler, record.source_type)
+                for record in tenant_records
+            ]
+            try:
+                _resubscribe_missing(tenant_id, subscriptions)
+            except OACommunicationException as e:
+                if 'OA responded with code 404' in str(e):
+                    # Tenant is gone, nothing left to verify
+                    remove_tenant_event_subscriptions(db, tenant_id)
+                    continue
+                # Retried later on, meanwhile rest of subscriptions of the hub get verified
+                g.logger.warning(f'Event subscriptions of tenant {tenant_id} could not be verified')
+                postpone_event_subscriptions_verification(
+                    db,
+                    tenant_id,
+                    SUBSCRIPTION_VERIFY_INTERVAL,
+                    SUBSCRIPTION_VERIFY_RETRY,
+                )
+                continue
+            save_tenant_event_subscriptions(db, tenant_id, subscriptions, controller_uri)
+    finally:
+        db.close()
+
+
+def _resubscribe_missing(tenant_id, subscriptions):
+    subscribed = {item.get('event') for item in OA.get_event_subscriptions(tenant_id)}
+    for item in subscriptions:
+        if item['event_type'] not in subscribed:
+            OA.subscribe_on(
+                tenant_id,
+                item['event_type'],
+                item['handler'],
+                "",
+                item['source_type'],
+            )
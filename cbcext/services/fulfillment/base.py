@@ -1,15 +1,32 @@
 from typing import List
 
-from starlette_context import context as g
+import attr
 
 from cbcext.models.fulfillment_models import Account
 from cbcext.services.client.apsconnectclient import request_statuses, request_types
 from cbcext.services.client.apsconnectclient.response import RequestResponse
+from cbcext.services.client.oaclient import AsyncOA, OA, REDIS_PREFIX
+from cbcext.services.connections import get_connection_id
 from cbcext.services.fulfillment.request_tracker_utils import randomize_aps_retry_timeout
+from cbcext.services.utils import find_submission, record_request, record_submission
+from cbcext.utils.cache import SharedCache
+from cbcext.utils.context import g
 
 from connect.client import ClientError
 
 MAX_RESELLER_LEVEL = 3
+# Reseller accounts seldom change, and changes are notified by accountDataChange. Local tier is
+# kept short since such notification only reaches one process
+RESELLER_ACCOUNT_TTL = 3600
+RESELLER_ACCOUNT_LOCAL_TTL = 60
+
+_reseller_accounts = SharedCache(
+    'reseller_accounts',
+    prefix=f'{REDIS_PREFIX}:reseller-account:v1',
+    ttl=RESELLER_ACCOUNT_TTL,
+    local_ttl=RESELLER_ACCOUNT_LOCAL_TTL,
+    maxsize=4096,
+)
 
 NOT_IMPLEMENTED_MESSAGE = "No implement method"
 
@@ -18,18 +35,16 @@ class BaseRequest(object):
     resource = "requests"
     statuses = request_statuses
     types = request_types
+    # Whether retries of same request are answered from request submissions
+    idempotent = False
+    placed_request_id = None
 
     @property
     def request_body(self) -> dict:
         raise NotImplementedError(NOT_IMPLEMENTED_MESSAGE)
 
     def get_connection_id(self):
-        product = g.product_id
-        hub_uuid = self.provider.aps_id
-        resp = g.client.products[product].connections.filter(
-            f'eq(hub.instance.id,{hub_uuid})',
-        ).first()
-        return resp['id'] if resp else None
+        return get_connection_id(g.product_id, self.provider.aps_id)
 
     def sanitize_local_items(self):
         return [
@@ -106,6 +121,7 @@ class BaseRequest(object):
             resp = g.client.requests.create(payload=self.request_body)
         except ClientError as public_error:
             return self._handle_public_error(public_error)
+        self._request_placed(resp)
 
         return RequestResponse(
             status_code=202,
@@ -113,9 +129,21 @@ class BaseRequest(object):
             template=resp.get("template"),
         )
 
+    def _request_placed(self, request):
+        self.placed_request_id = request['id']
+        record_request(request)
+
     @property
     def create(self):
+        if not self.idempotent:
+            return self._create_response_for_oa(self._place_request())
+        request_body = self.request_body
+        submitted = find_submission(request_body)
+        if submitted is not None:
+            return self._create_response_for_oa(RequestResponse(**submitted))
         portal_response = self._place_request()
+        if self.placed_request_id and portal_response.status_code == 202:
+            record_submission(request_body, self.placed_request_id, attr.asdict(portal_response))
         return self._create_response_for_oa(portal_response)
 
     def get_marketplace_from_request(self, request_id: str) -> str:
@@ -132,7 +160,17 @@ class BaseRequest(object):
         return ""
 
 
+def _reseller_account_key(account_id):
+    # Account ids are unique per hub
+    return f'{OA.controller_uri()}:{account_id}'
+
+
 def reseller_chain(account_id: str, app_id: str, first: bool = False) -> List[Account]:
+    """
+    Provides up to MAX_RESELLER_LEVEL accounts, starting on given one and following parents.
+    APS has no way to query ancestors of an account, hence every hop is cached, that way
+    chains of customers sharing resellers are resolved from cache.
+    """
     if not first:
         return [Account.dummy()]
 
@@ -141,8 +179,42 @@ def reseller_chain(account_id: str, app_id: str, first: bool = False) -> List[Ac
     for _ in range(MAX_RESELLER_LEVEL):
         if account_id is None:
             break
-        reseller = Account.from_external_scope(account_id, app_id)
+        reseller = Account(
+            _reseller_accounts.get_or_set(
+                OA.redis_location(),
+                _reseller_account_key(account_id),
+                lambda account_id=account_id: OA.get_resource(account_id, impersonate_as=app_id),
+            ),
+        )
         chain.append(reseller)
         account_id = reseller.parent
 
     return chain
+
+
+async def async_reseller_chain(account_id: str, app_id: str, first: bool = False) -> List[Account]:
+    if not first:
+        return [Account.dummy()]
+
+    chain = []
+
+    for _ in range(MAX_RESELLER_LEVEL):
+        if account_id is None:
+            break
+        reseller = Account(
+            await _reseller_accounts.async_get_or_set(
+                OA.redis_location(),
+                _reseller_account_key(account_id),
+                lambda account_id=account_id: AsyncOA.get_resource(
+                    account_id, impersonate_as=app_id,
+                ),
+            ),
+        )
+        chain.append(reseller)
+        account_id = reseller.parent
+
+    return chain
+
+
+def invalidate_reseller_account(account_id: str):
+    _reseller_accounts.invalidate(OA.redis_location(), _reseller_account_key(account_id))
@@ -6,9 +6,9 @@ from fastapi.responses import JSONResponse
 
 from cbcext.models.fulfillment_models import Event, Tenant
 from cbcext.services.fulfillment.base import BaseRequest
+from cbcext.utils.context import g
 
 from connect.client import ClientError
-from starlette_context import context as g
 
 DAILY = 'daily'
 HOURLY = 'hourly'
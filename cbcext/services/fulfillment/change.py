@@ -1,15 +1,20 @@
 from copy import deepcopy
 
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
 
 from cbcext.models.fulfillment_models import Provider, Subscription, Tenant
 from cbcext.services.client.apsconnectclient.response import PublicApiError, RequestResponse
-from cbcext.services.utils import get_asset_by_uuid, product_capability_parameters_change
+from cbcext.services.utils import (
+    get_asset_by_uuid,
+    product_capability_parameters_change,
+)
+from cbcext.utils.context import g
 from .base import BaseRequest
 
 
 class ChangeRequest(BaseRequest):
+    idempotent = True
+
     def __init__(self, tenant_data: dict, planned_date=None):
         self.tenant = Tenant(tenant_data)
         self.subscription = Subscription.dummy()
@@ -155,6 +160,7 @@ class ChangeRequest(BaseRequest):
                 # In the use case that for whatever reason draft conversion don't works
                 # Let's place a regular change request
                 return super()._place_request()
+            self._request_placed(resp)
 
             return RequestResponse(
                 status_code=202,
@@ -1,3 +1,4 @@
+import os
 from copy import deepcopy
 
 from fastapi.responses import JSONResponse
@@ -10,13 +11,18 @@ from cbcext.models.fulfillment_models import (
 )
 from cbcext.services.client.apsconnectclient.response import RequestResponse
 from cbcext.services.vat import Vat
+from cbcext.utils.concurrency import run_concurrently
+from cbcext.utils.context import g
 from .base import BaseRequest, reseller_chain
 
-from starlette_context import context as g
 from connect.client import ClientError
 
+# Max seconds to gather from OA and Connect all data needed to place a purchase
+PURCHASE_CONTEXT_TIMEOUT = 120
+
 
 class PurchaseRequest(BaseRequest):
+    idempotent = True
 
     def __init__(self, tenant_data: dict):
         """
@@ -26,14 +32,41 @@ class PurchaseRequest(BaseRequest):
         On tenant pobject
         """
         self.tenant = Tenant(tenant_data)
-        self.account = Account.from_aps_id(self.tenant.account_id)
-        vat = Vat(self.tenant.app_id)
-        self.account.tax_id = vat.get_vat_code(aps_account_id=self.account.aps_id)
-        self.resellers = reseller_chain(self.account.parent, self.tenant.app_id, True)
-        self.provider = Provider.from_app_id(self.tenant.app_id)
-        self.subscription = Subscription.from_aps_id(self.tenant.sub_id)
+        # Lookups are independent between them, hence done concurrently
+        context = run_concurrently(
+            {
+                'account': self._get_account_and_resellers,
+                'vat': lambda: Vat(self.tenant.app_id).get_vat_code(
+                    aps_account_id=self.tenant.account_id,
+                ),
+                'provider': self._get_provider_and_connection,
+                'subscription': lambda: Subscription.from_aps_id(self.tenant.sub_id),
+            },
+            timeout=self._context_timeout(),
+        )
+        self.account, self.resellers = context['account']
+        self.account.tax_id = context['vat']
+        self.provider, self.connection_id = context['provider']
+        self.subscription = context['subscription']
         self.draft_request_id = self.tenant.draft_request_id
 
+    def _get_account_and_resellers(self):
+        account = Account.from_aps_id(self.tenant.account_id)
+        return account, reseller_chain(account.parent, self.tenant.app_id, True)
+
+    def _get_provider_and_connection(self):
+        self.provider = Provider.from_app_id(self.tenant.app_id)
+        return self.provider, self.get_connection_id()
+
+    @staticmethod
+    def _context_timeout():
+        return float(
+            g.extension_config.get(
+                'PURCHASE_CONTEXT_TIMEOUT',
+                os.getenv('PURCHASE_CONTEXT_TIMEOUT', PURCHASE_CONTEXT_TIMEOUT),
+            ),
+        )
+
     @staticmethod
     def _fill_account_info(account: dict) -> dict:
         contact_info = account["contact_info"]
@@ -75,7 +108,7 @@ class PurchaseRequest(BaseRequest):
                     "tier2": self.resellers[1].dict if len(self.resellers) > 1 else {},
                 },
                 "connection": {
-                    "id": self.get_connection_id(),
+                    "id": self.connection_id,
                 },
             },
             "type": "purchase",
@@ -145,6 +178,7 @@ class PurchaseRequest(BaseRequest):
                 resp = g.client.requests[self.draft_request_id].action('purchase').post(payload={})
             except ClientError as public_error:
                 return self._handle_public_error(public_error)
+            self._request_placed(resp)
 
             return RequestResponse(
                 status_code=202,
@@ -1,6 +1,6 @@
+import httpx
 from fastapi.responses import JSONResponse
-from requests.exceptions import Timeout
-from starlette_context import context as g
+from starlette.concurrency import run_in_threadpool
 
 from cbcext.models.fulfillment_models import Tenant
 from cbcext.services.client.apsconnectclient.response import PublicApiError
@@ -9,6 +9,7 @@ from cbcext.services.fulfillment import ChangeRequest
 from cbcext.services.fulfillment.request_tracker_utils import (
     aps_inquire_header,
     aps_retry_header_obtain_request_error,
+    async_get_product_parameters,
     get_request_tech_contact,
     handle_approved,
     handle_failed,
@@ -18,25 +19,34 @@ from cbcext.services.fulfillment.request_tracker_utils import (
     populate_tenant_common_properties,
     populate_tenant_parameters,
 )
-from cbcext.services.utils import get_last_request_by_tenant_id
+from cbcext.services.utils import async_get_last_request_by_tenant_id
+from cbcext.utils.context import g
 
 
 class RequestTracker:
+    """
+    Tracks asynchronous phase of purchase and change operations, coroutine based since CBC polls
+    it periodically for every pending order. Build it using from_tenant_data.
+    """
 
     operation = None
 
-    def __init__(self, tenant_data: dict, planned_date=None):
-        self.tenant = Tenant(tenant_data)
+    def __init__(self, tenant: Tenant, planned_date=None):
+        self.tenant = tenant
         self.planned_date = planned_date
 
-    def track(self, operation):
+    @classmethod
+    async def from_tenant_data(cls, tenant_data: dict, planned_date=None):
+        return cls(await Tenant.async_from_data(tenant_data), planned_date=planned_date)
+
+    async def track(self, operation):
         self.operation = operation
         try:
-            last_request = get_last_request_by_tenant_id(
+            last_request = await async_get_last_request_by_tenant_id(
                 tenant_id=self.tenant.aps_id,
                 operation=operation,
             )
-        except (PublicApiError, Timeout):
+        except (PublicApiError, httpx.TimeoutException):
             # In case that something wrong with public api, let's reschedule at OA
             return JSONResponse(
                 content={},
@@ -56,6 +66,9 @@ class RequestTracker:
         answer_data = populate_tenant_parameters(
             tenant=self.tenant,
             request=last_request,
+            product_parameters=await async_get_product_parameters(
+                last_request['asset']['product']['id'],
+            ),
         )
         answer_data = populate_tenant_common_properties(
             tenant=self.tenant,
@@ -67,7 +80,7 @@ class RequestTracker:
             if self.operation == "purchase":
                 # Let's try to subscribe to renewal events to get provider billing requests
                 try:
-                    self.tenant.subscribe_for_renew()
+                    await self.tenant.subscribe_for_renew()
                 except OACommunicationException:
                     pass
             answer_data = populate_tenant_activation_date(
@@ -76,7 +89,7 @@ class RequestTracker:
                 answer_data=answer_data,
             )
             if self.operation == "change":
-                return self.verify_change_request(last_request, answer_data)
+                return await self.verify_change_request(last_request, answer_data)
             return handle_approved(last_request, answer_data, self.tenant.draft_request_id)
 
         if request_status == "inquiring":
@@ -86,7 +99,7 @@ class RequestTracker:
         # in case is not requested by provider, CBC will wait till vendor acts.
         # validation that APS supports it happened on sync phase
         if request_status == "scheduled" and self.planned_date:
-            return self.handle_scheduled(
+            return await self.handle_scheduled(
                 request=last_request,
                 answer_data=answer_data,
             )
@@ -98,9 +111,9 @@ class RequestTracker:
             operation=self.operation,
         )
 
-    def handle_scheduled(self, request, answer_data):
+    async def handle_scheduled(self, request, answer_data):
         try:
-            self.tenant.subscribe_for_delayed_actions()
+            await self.tenant.subscribe_for_delayed_actions()
         except OACommunicationException:
             # Ups something went wrong on subscription, we may expect that is OA communication
             # issue, hence better to return a 202 and retry later
@@ -132,10 +145,11 @@ class RequestTracker:
                 form_url=request['params_form_url'],
                 vendor_id=request['asset']['connection']['vendor']['id'] or None,
                 vendor_name=request['asset']['connection']['vendor']['name'] or None,
+                created=request.get('created'),
             ),
         )
 
-    def verify_change_request(self, request, answer_data):
+    async def verify_change_request(self, request, answer_data):
         # This method handles a weird behaivour of OA, where due failed tasks there is inconsistency
         # between APS resource values when using app counted service references and what was
         # ordered
@@ -179,9 +193,9 @@ class RequestTracker:
                 x for x in aps_items + request_items if x not in aps_items or x not in request_items
             ]
             if items_difference:
-                return ChangeRequest(
-                    tenant_data=g.source_request.json,
-                ).create
+                return await run_in_threadpool(
+                    lambda: ChangeRequest(tenant_data=g.source_request.json).create,
+                )
 
         except Exception:
             g.logger.exception("Exception while firing change request on asset sync")
@@ -1,23 +1,92 @@
+from collections import namedtuple
+from datetime import datetime, timezone
 from random import randrange
 
+from dateutil.parser import isoparse
 from fastapi.responses import JSONResponse
 
 from cbcext.models.fulfillment_models import Tenant
-from cbcext.services.client.oaclient import OA, OACommunicationException
+from cbcext.services.client.oaclient import AsyncOA, OA, OACommunicationException
+from cbcext.services.products import async_get_product_metadata, get_product_metadata
+from cbcext.services.utils import record_request
+from cbcext.utils.cache import TTLCache
+from cbcext.utils.context import g
 
-from starlette_context import context as g
 from connect.client import ClientError
 
 
 APS_RETRY_TIMEOUT = 60
+# Requests waiting for vendor or for a human are polled less often as they get older
+APS_RETRY_TIMEOUT_AGE_FACTOR = 0.1
+APS_RETRY_TIMEOUT_MAX = 3600
+APS_RETRY_TIMEOUT_SCHEDULED_MAX = 24 * 3600
+APS_RETRY_JITTER_MAX = 600
+VENDOR_PROCESSING_TIME_TTL = 24 * 3600
 UTC_OFFSET = '+00:00'
 
+# Moving average of seconds taken by each vendor to approve requests
+_vendor_processing_times = TTLCache(
+    'vendor_processing_times',
+    ttl=VENDOR_PROCESSING_TIME_TTL,
+    maxsize=4096,
+)
 
-def randomize_aps_retry_timeout():
+
+def randomize_aps_retry_timeout(timeout=APS_RETRY_TIMEOUT):
     # This simple function is used to randomize the retries on CBC side
     # goal is to ensure that task manager don't ends up with a lot of tasks to be executed at same
     # second
-    return str(APS_RETRY_TIMEOUT + randrange(APS_RETRY_TIMEOUT))
+    return str(timeout + randrange(min(timeout, APS_RETRY_JITTER_MAX)))
+
+
+def aps_retry_timeout(request_status=None, created=None, scheduled_date=None, vendor_id=None):
+    """
+    Provides aps-retry-timeout for a request that is not completed yet.
+
+    Scheduled requests are retried close to their planned date. Otherwise, while a request
+    is younger than usual processing time of its vendor, retries wait for half of the remaining
+    time, older requests are retried after a fraction of their age. Timeouts are capped and
+    never shorter than APS_RETRY_TIMEOUT.
+
+    :param request_status: str
+    :param created: str, ISO date of request creation
+    :param scheduled_date: str, ISO planned date of scheduled requests
+    :param vendor_id: str
+    :return: str
+    """
+    now = datetime.now(timezone.utc)
+    if request_status == 'scheduled' and scheduled_date:
+        timeout = (isoparse(scheduled_date) - now).total_seconds()
+        cap = APS_RETRY_TIMEOUT_SCHEDULED_MAX
+    elif created:
+        age = (now - isoparse(created)).total_seconds()
+        expected = _vendor_processing_times.get(vendor_id, None) if vendor_id else None
+        if request_status == 'pending' and expected and age < expected:
+            timeout = (expected - age) / 2
+        else:
+            timeout = age * APS_RETRY_TIMEOUT_AGE_FACTOR
+        cap = APS_RETRY_TIMEOUT_MAX
+    else:
+        timeout = cap = APS_RETRY_TIMEOUT
+    return randomize_aps_retry_timeout(int(min(max(timeout, APS_RETRY_TIMEOUT), cap)))
+
+
+def record_vendor_processing_time(request):
+    """
+    Accounts time taken by vendor to approve given request on its moving average, requests
+    in any other status, like failed ones handled as approved, are not accounted
+    :param request: dict
+    """
+    if request.get('status') != 'approved':
+        return
+    vendor_id = request.get('asset', {}).get('connection', {}).get('vendor', {}).get('id')
+    if not vendor_id or not request.get('created') or not request.get('updated'):
+        return
+    elapsed = (isoparse(request['updated']) - isoparse(request['created'])).total_seconds()
+    average = _vendor_processing_times.get(vendor_id, None)
+    if average is not None:
+        elapsed = 0.8 * average + 0.2 * elapsed
+    _vendor_processing_times.set(vendor_id, elapsed)
 
 
 def aps_retry_header_obtain_request_error(message=None):
@@ -42,6 +111,7 @@ def aps_retry_header(
         vendor_id=None,
         request_status=None,
         scheduled_date=None,
+        created=None,
 ):
     if vendor_id and vendor_name:
         vendor_string = f"{vendor_name} ({vendor_id}) "
@@ -63,7 +133,7 @@ def aps_retry_header(
         message += ('. Request has been requested to be revoked by provider '
                     'but vendor did not process it yet.')
     return {
-        "aps-retry-timeout": randomize_aps_retry_timeout(),
+        "aps-retry-timeout": aps_retry_timeout(request_status, created, scheduled_date, vendor_id),
         "aps-info": message,
     }
 
@@ -76,6 +146,7 @@ def aps_inquire_header(
         form_url,
         vendor_name=None,
         vendor_id=None,
+        created=None,
 ):
     if vendor_id and vendor_name:
         vendor_string = f"{vendor_name} ({vendor_id}) "
@@ -85,7 +156,7 @@ def aps_inquire_header(
                f"inquire. Technical Contact {tech_contact} has been notified at email {email} "
                f"to populate form {form_url}")
     return {
-        "aps-retry-timeout": randomize_aps_retry_timeout(),
+        "aps-retry-timeout": aps_retry_timeout('inquiring', created),
         "aps-info": message,
     }
 
@@ -124,12 +195,20 @@ def populate_tenant_common_properties(tenant: Tenant, request: dict, answer_data
     return answer_data
 
 
-def populate_tenant_parameters(tenant: Tenant, request: dict, answer_data=None):
+def populate_tenant_parameters(
+        tenant: Tenant,
+        request: dict,
+        answer_data=None,
+        product_parameters=None,
+):
 
     if not answer_data:
         answer_data = {}
 
-    vendor_sub_id, activation_params, fulfillment_params = extract_parameters(request)
+    vendor_sub_id, activation_params, fulfillment_params = extract_parameters(
+        request,
+        product_parameters=product_parameters,
+    )
 
     if not tenant.legacy_vendor_subscription_id and vendor_sub_id is not None:
         answer_data["vendorSubscriptionId"] = vendor_sub_id[:4000]
@@ -151,72 +230,94 @@ def populate_tenant_activation_date(tenant: Tenant, request: dict, answer_data=N
 
 
 def is_not_shared(param):
-    if 'shared' in param['constraints'] and param['constraints']['shared'] == 'none':
-        return True
-    return False
-
-
-def is_valid(param_def, phase):
-    skip_param = ['object', 'password']
-    if param_def and param_def[0]['phase'] == phase and param_def[0]['type'] not in skip_param:
-        return True
-    return False
+    return param.get('constraints', {}).get('shared') == 'none'
 
 
-def extract_parameters(request):
+def extract_parameters(request, product_parameters=None):
+    """
+    Returns vendor subscription id, activation and fulfillment parameters of request's asset
+    :param request: dict
+    :param product_parameters: ProductParameters as returned by get_product_parameters, fetched
+        if not passed
+    """
     vendor_subscription_id = ""
     activation_parameters = []
     fulfillment_parameters = []
-    activation, fulfillment, tier = get_product_parameters(
-        request['asset']['product']['id'],
-    )
+    if product_parameters is None:
+        product_parameters = get_product_parameters(request['asset']['product']['id'])
     for parameter in request["asset"]["params"]:
-        ordering_definition = get_parameter_definition(parameter['id'], activation)
-        param_definition = get_parameter_definition(
-            parameter['id'],
-            fulfillment,
-        )
         if parameter.get("reconciliation"):
             vendor_subscription_id = parameter["value"]
-        # LITE-14888: in case of vendor marking parameter as not shared with provider
-        if is_valid(param_definition, "fulfillment"):
-            if is_not_shared(param_definition[0]):
-                continue
-            fulfilled_parameter = get_parameter_object_for_oa(parameter)
-            fulfillment_parameters.append(fulfilled_parameter)
-        if is_valid(ordering_definition, "ordering"):
-            ordered_parameter = get_parameter_object_for_oa(parameter)
-            activation_parameters.append(ordered_parameter)
+        definition = product_parameters.definitions.get(parameter['id'])
+        if definition is None or definition.type in PARAMETER_TYPES_NOT_SENT:
+            continue
+        if definition.phase == 'fulfillment':
+            # LITE-14888: in case of vendor marking parameter as not shared with provider
+            if definition.shared:
+                fulfillment_parameters.append(get_parameter_object_for_oa(parameter))
+        elif definition.phase == 'ordering':
+            activation_parameters.append(get_parameter_object_for_oa(parameter))
 
     return vendor_subscription_id, activation_parameters, fulfillment_parameters
 
 
+PARAMETER_TYPES_NOT_SENT = ('object', 'password')
+
+ParameterDefinition = namedtuple('ParameterDefinition', 'phase type shared')
+ProductParameters = namedtuple('ProductParameters', 'activation fulfillment tier definitions')
+
+PRODUCT_PARAMETERS_FILTER = (
+    'in(phase,(ordering,fulfillment))'
+    '&in(scope,(asset,tier1))'
+)
+
+
 def get_product_parameters(product_id):
     """
-    Returns tuple of activation, fulfillment and tier parameters
+    Returns ProductParameters with activation, fulfillment and tier parameters, cached per
+    product version
     """
     try:
-        rql_filter = (
-            'in(phase,(ordering,fulfillment))'
-            '&in(scope,(asset,tier1))'
+        return get_product_metadata(
+            product_id,
+            'parameters',
+            lambda: serialize_params(
+                g.client.products[product_id].collection('parameters').filter(
+                    PRODUCT_PARAMETERS_FILTER,
+                ).order_by('position'),
+            ),
         )
-        product_parameters = g.client.products[product_id].collection('parameters').filter(
-            rql_filter,
+    except ClientError:
+        return serialize_params([])
+
+
+async def async_get_product_parameters(product_id):
+    """
+    Same as get_product_parameters but using async Connect client
+    """
+    async def load():
+        product_parameters = g.async_client.products[product_id].collection('parameters').filter(
+            PRODUCT_PARAMETERS_FILTER,
         ).order_by('position')
-        return serialize_params(product_parameters)
+        return serialize_params([param async for param in product_parameters])
+
+    try:
+        return await async_get_product_metadata(product_id, 'parameters', load)
     except ClientError:
-        return [], [], []
+        return serialize_params([])
 
 
 def serialize_params(params):
     """
-    Serializes the parameters based on External Identifiers format
+    Serializes the parameters based on External Identifiers format, definitions of asset
+    parameters are indexed by id in the same pass
     :param params:
-    :return:
+    :return: ProductParameters
     """
     activation_parameters = []
     fulfillment_parameters = []
     tier_activation_parameters = []
+    definitions = {}
     for param in params:
         param['id'] = param['name']
         param.pop('name', None)
@@ -227,12 +328,19 @@ def serialize_params(params):
             fulfillment_parameters.append(param)
         elif param['scope'] == 'tier1' and param['phase'] == 'ordering':
             tier_activation_parameters.append(param)
+        if param['scope'] == 'asset':
+            definitions[param['id']] = ParameterDefinition(
+                phase=param['phase'],
+                type=param['type'],
+                shared=not is_not_shared(param),
+            )
 
-    return activation_parameters, fulfillment_parameters, tier_activation_parameters
-
-
-def get_parameter_definition(parameter_id, parameter_list):
-    return list(filter(lambda x: x['id'] == parameter_id, parameter_list))
+    return ProductParameters(
+        activation_parameters,
+        fulfillment_parameters,
+        tier_activation_parameters,
+        definitions,
+    )
 
 
 def get_parameter_object_for_oa(parameter):
@@ -295,6 +403,7 @@ def handle_failed(request):
 
 
 def handle_approved(request, answer_data=None, tenant_draft_request_id=None):
+    record_vendor_processing_time(request)
     answer_data = clear_inquire_properties(answer_data)
     if 'activation_key' in request:
         answer_data['activationKey'] = request['activation_key']
@@ -334,43 +443,33 @@ def handle_pending(request, operation, answer_data=None):
             vendor_name=request['asset']['connection']['vendor']['name'] or None,
             request_status=request['status'] or None,
             scheduled_date=request.get('planned_date', None),
+            created=request.get('created'),
         ),
     )
 
 
 def revoke_scheduled_request(request_id, message):
-    return g.client.requests[request_id].action('revoke').post(
+    request = g.client.requests[request_id].action('revoke').post(
         payload={
             "reason": message,
         },
     )
+    record_request(request)
+    return request
 
 
-def update_tenant_with_request(tenant_id, request):
+def update_tenant_with_request(tenant_id, request, timeout=None):
     try:
-        tenant = OA.get_resource(
-            resource_id=tenant_id,
+        tenant = OA.send_request(
+            'get',
+            f'aps/2/resources/{tenant_id}',
             impersonate_as=None,
             transaction=False,
             retry_num=1,
+            timeout=timeout,
         )
         if tenant:  # pragma no branch
-            tenant['activationKey'] = request.get('activation_key', '')
-            vendor_sub_id, activation_params, fulfillment_params = extract_parameters(
-                request,
-            )
-            tenant["vendorSubscriptionId"] = vendor_sub_id[:4000]
-            tenant["fulfillmentParameters"] = fulfillment_params
-            tenant["activationParameters"] = activation_params
-            # Activation date is optional, and to speed up we check if property is there
-            # instead of loading schema, since in case of presence, means is supported
-            # We will NOT update in case that request is adjustment, yes for rest just in case
-            # If we don't update such date, CBC RDE will calculate effective dates based on
-            # previous requests (f.e we are processing a suspend operation here and last one was
-            # a change done
-            # a year ago...that will cause a disaster)
-            if request['type'] != 'adjustment' and 'activationDate' in tenant:
-                tenant['activationDate'] = get_effective_date(request)
+            _apply_request_to_tenant(tenant, request)
             OA.send_request(
                 method='PUT',
                 transaction=False,
@@ -378,6 +477,7 @@ def update_tenant_with_request(tenant_id, request):
                 retry_num=1,
                 path=f'aps/2/application/tenants/{tenant_id}',
                 body=tenant,
+                timeout=timeout,
             )
             # let's return tenant for answer response of operations like suspend,
             # this is good for logging purposes even that will not be used by cbc
@@ -393,6 +493,55 @@ def update_tenant_with_request(tenant_id, request):
     return {}
 
 
+async def async_update_tenant_with_request(tenant_id, request):
+    try:
+        tenant = await AsyncOA.get_resource(
+            resource_id=tenant_id,
+            impersonate_as=None,
+            transaction=False,
+            retry_num=1,
+        )
+        if tenant:  # pragma no branch
+            product_parameters = await async_get_product_parameters(
+                request['asset']['product']['id'],
+            )
+            _apply_request_to_tenant(tenant, request, product_parameters)
+            await AsyncOA.send_request(
+                method='PUT',
+                transaction=False,
+                impersonate_as=None,
+                retry_num=1,
+                path=f'aps/2/application/tenants/{tenant_id}',
+                body=tenant,
+            )
+            return tenant
+
+    except OACommunicationException:
+        pass
+
+    return {}
+
+
+def _apply_request_to_tenant(tenant, request, product_parameters=None):
+    tenant['activationKey'] = request.get('activation_key', '')
+    vendor_sub_id, activation_params, fulfillment_params = extract_parameters(
+        request,
+        product_parameters=product_parameters,
+    )
+    tenant["vendorSubscriptionId"] = vendor_sub_id[:4000]
+    tenant["fulfillmentParameters"] = fulfillment_params
+    tenant["activationParameters"] = activation_params
+    # Activation date is optional, and to speed up we check if property is there
+    # instead of loading schema, since in case of presence, means is supported
+    # We will NOT update in case that request is adjustment, yes for rest just in case
+    # If we don't update such date, CBC RDE will calculate effective dates based on
+    # previous requests (f.e we are processing a suspend operation here and last one was
+    # a change done
+    # a year ago...that will cause a disaster)
+    if request['type'] != 'adjustment' and 'activationDate' in tenant:
+        tenant['activationDate'] = get_effective_date(request)
+
+
 def get_effective_date(request):
     if 'effective_date' in request:
         return request['effective_date'].replace(
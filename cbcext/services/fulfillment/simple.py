@@ -9,10 +9,9 @@ from cbcext.services.client.apsconnectclient.response import (
     RequestResponse,
 )
 from cbcext.services.utils import get_asset_by_uuid
+from cbcext.utils.context import g
 from .base import BaseRequest
 
-from starlette_context import context as g
-
 
 class SimpleRequest(BaseRequest):
 
@@ -69,6 +68,7 @@ class SimpleRequest(BaseRequest):
             resp = g.client.requests.create(payload=self.request_body)
         except PublicApiError as public_error:
             return self._handle_public_error(public_error)
+        self._request_placed(resp)
 
         # In the use case of suspend and resume, on sync phase we may get request failed due
         # product does not support administrative hold capability
@@ -1,18 +1,29 @@
 from typing import Optional
 
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
+from starlette.concurrency import run_in_threadpool
 
 from cbcext.models.fulfillment_models import Account, DraftRequest
 from cbcext.services.client.apsconnectclient import request_statuses, request_types
-from cbcext.services.client.oaclient import OA
+from cbcext.services.connections import async_get_connection_id
+from cbcext.services.hub.services import fetch_hub_uuid_from_oa
+from cbcext.utils.context import g
 from cbcext.utils.generic import property_parser
-from .base import BaseRequest, reseller_chain
+from .base import async_reseller_chain, BaseRequest
 
 from connect.client import ClientError
 
 
 class ValidateDraftRequest(BaseRequest):
+    """
+    Validates draft requests, all calls to OA and Connect are done with async clients
+    once validate is awaited.
+    """
+    draft_customer = None
+    draft_tiers = []
+    draft_items = []
+    connection_id = None
+
     def __init__(
             self,
             data: dict,
@@ -20,11 +31,10 @@ class ValidateDraftRequest(BaseRequest):
             app_id: Optional[str] = None,
             tenant_id: Optional[str] = None,
     ):
+        self.data = data
+        self.customer = customer
         self.draft = DraftRequest(data, app_id)
         self.draft_request_id = self.draft.draft_request_id
-        if not tenant_id:
-            self.draft_customer, self.draft_tiers = self._get_tiers(customer, app_id)
-        self.draft_items = self._extract_items(data)
         self.tenant = tenant_id
 
     @property
@@ -43,7 +53,7 @@ class ValidateDraftRequest(BaseRequest):
                 "id": g.product_id,
             }
             body['asset']['connection'] = {
-                "id": self.get_connection_id(),
+                "id": self.connection_id,
             }
             if self.draft_customer:
                 body['asset']['tiers'] = {}
@@ -58,22 +68,16 @@ class ValidateDraftRequest(BaseRequest):
             body['asset']['id'] = self.draft.assetId
         return body
 
-    def get_connection_id(self):
+    async def fetch_connection_id(self):
         # Only used when validating purchase requests, not on change
 
-        product = g.product_id
-        hub_uuid = OA.get_resource(
-            resource_id=self.draft.app_id,
-            impersonate_as=self.draft.app_id,
-        )['hubId']
-        resp = g.client.products[product].connections.filter(
-            f'eq(hub.instance.id,{hub_uuid})',
-        ).first()
-        if not resp:
+        hub_uuid = await run_in_threadpool(fetch_hub_uuid_from_oa, self.draft.app_id)
+        connection_id = await async_get_connection_id(g.product_id, hub_uuid)
+        if not connection_id:
             raise Exception("Connection not found")
-        return resp['id']
+        return connection_id
 
-    def _extract_items(self, data):
+    async def _extract_items(self, data):
         """
         Function used only by CCPv2 right now, it converts items from OA to Connect world
         Items is object like:
@@ -108,7 +112,7 @@ class ValidateDraftRequest(BaseRequest):
             limits = {v['property']: v['value'] for k, v in oa_items.items()}
             local_ids = [v['property'] for k, v in oa_items.items()]
 
-            product_items = self._get_product_items(product[0], local_ids)
+            product_items = await self._get_product_items(product[0], local_ids)
             for product_item in product_items:
                 items.append({
                     "global_id": product_item['id'],
@@ -117,7 +121,7 @@ class ValidateDraftRequest(BaseRequest):
 
         return items
 
-    def _get_product_items(self, connect_product, aps_local_ids):
+    async def _get_product_items(self, connect_product, aps_local_ids):
         offset = 0
         connect_items = []
         while True:
@@ -125,17 +129,19 @@ class ValidateDraftRequest(BaseRequest):
             if not ids_to_send:
                 return connect_items
             ids = ','.join(ids_to_send)
-            pd_items = list(
-                g.client.products[connect_product].items.filter(f'in(local_id,({ids}))'),
-            )
+            pd_items = [
+                item async for item in g.async_client.products[connect_product].items.filter(
+                    f'in(local_id,({ids}))',
+                )
+            ]
             connect_items.extend(pd_items)
             offset += 100
 
-    def _get_tiers(self, customer, app_id):
+    async def _get_tiers(self, customer, app_id):
         if customer is None:
             return None, []
-        account = Account.from_external_scope(customer, app_id)
-        oa_tiers = reseller_chain(account.parent, app_id=app_id, first=True)
+        account = await Account.async_from_external_scope(customer, app_id)
+        oa_tiers = await async_reseller_chain(account.parent, app_id=app_id, first=True)
         return account, oa_tiers
 
     def _create_response_for_oa(self, validation_result):
@@ -161,35 +167,42 @@ class ValidateDraftRequest(BaseRequest):
 
         return JSONResponse(content=response_data, status_code=200)
 
-    def _create_draft_request(self):
+    async def _create_draft_request(self):
 
-        response = g.client.requests.create(
+        response = await g.async_client.requests.create(
             payload=self.request_body,
         )
         self.draft_request_id = response['id']
 
-    def _validate_draft_request(self):
-        response = g.client.requests[self.draft_request_id].action('validate').post(
+    async def _validate_draft_request(self):
+        response = await g.async_client.requests[self.draft_request_id].action('validate').post(
             payload=self.request_body,
         )
         return response
 
-    def validate(self):
+    async def validate(self):
         """
         Validates draft purchase request. Creates draft request if needed.
         """
-        if not self.draft_request_id:
-            try:
-                self._create_draft_request()
-            except Exception:
-                # This covers 3 use cases that at the end shall end equally
-                # OA Failing
-                # Connect API failing
-                # No connection
-                # reason is that we want not to block any order placement due failure
-                return self.validation_not_possible()
+        if not self.tenant:
+            self.draft_customer, self.draft_tiers = await self._get_tiers(
+                self.customer, self.draft.app_id,
+            )
+        self.draft_items = await self._extract_items(self.data)
+        try:
+            if not self.tenant:
+                self.connection_id = await self.fetch_connection_id()
+            if not self.draft_request_id:
+                await self._create_draft_request()
+        except Exception:
+            # This covers 3 use cases that at the end shall end equally
+            # OA Failing
+            # Connect API failing
+            # No connection
+            # reason is that we want not to block any order placement due failure
+            return self.validation_not_possible()
         try:
-            validation_result = self._validate_draft_request()
+            validation_result = await self._validate_draft_request()
         except ClientError:
             # This happens in case that for example endpoint of vendor is down
             # To avoid bad logging on controlled case, let's capture exception and return
@@ -1,13 +1,15 @@
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
 
 from cbcext.services.client.oaclient import OA, OACommunicationException
 from cbcext.services.exceptions import InvalidPhoneException
+from cbcext.services.fulfillment.base import invalidate_reseller_account
 from cbcext.services.hub.services import (
     fetch_account_data_from_oa,
     fetch_tier_account_from_connect,
     send_tier_account_request_to_connect,
 )
+from cbcext.services.vat import invalidate_vat_code
+from cbcext.utils.context import g
 
 from connect.client import ClientError
 
@@ -71,6 +73,8 @@ class AccountDataChange:
 
     def _handle_account_change(self, event_body, app_id):
         account_uuid = event_body['source']['id']
+        invalidate_reseller_account(account_uuid)
+        invalidate_vat_code(account_uuid)
         try:
             # Due amount of spam generated in the use case that Proxy is down
             # we silently return 200
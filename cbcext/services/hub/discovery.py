@@ -0,0 +1,33 @@
+from cbcext.services.client.oaclient import OA
+from cbcext.utils.cache import TTLCache
+
+# APS resources found by discovery only change when something gets installed or upgraded on hub
+DISCOVERY_TTL = 3600
+
+# One entry per APS controller, app and lookup
+_discoveries = TTLCache('hub_discovery', ttl=DISCOVERY_TTL, maxsize=4096)
+
+
+def discover(app_id, name, lookup):
+    """
+    Returns result of a discovery lookup done on behalf of an application, like the id of the
+    APS resource implementing a given type. Results are kept per APS controller and app during
+    DISCOVERY_TTL. Exceptions raised by lookup are not cached.
+    :param app_id: str uuid
+    :param name: str, name of the lookup
+    :param lookup: callable without arguments
+    """
+    return _discoveries.get_or_set((OA.controller_uri(), app_id, name), lookup)
+
+
+def refresh_discoveries(app_id=None):
+    """
+    Forgets discoveries done for given app in APS controller of current request, or for all
+    apps of it in case that no app is passed, f.e. when hub extension is upgraded
+    :param app_id: str uuid
+    """
+    controller_uri = OA.controller_uri()
+    if app_id is not None:
+        _discoveries.invalidate_where(lambda key: key[:2] == (controller_uri, app_id))
+    else:
+        _discoveries.invalidate_where(lambda key: key[0] == controller_uri)
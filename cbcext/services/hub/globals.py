@@ -1,7 +1,6 @@
 import re
 
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
 
 from cbcext.services.client.oaclient import OA
 from cbcext.services.db_services import save_aps_global_config
@@ -24,6 +23,7 @@ from cbcext.services.hub.services import (
     schedule_usage_chunks_retrival_in_oa,
 )
 from cbcext.services.hub.utils import from_aps_rql_to_client_rql
+from cbcext.utils.context import g
 
 from connect.client import ClientError
 
@@ -124,7 +124,10 @@ def get_available_operations(app_id, request):
     )
     if 'aps' not in aps_app:
         return JSONResponse(content={"operation": "install"}, status_code=200)
-    connect_product = fetch_product_from_connect(product_id=request.query_params['product_id'])
+    connect_product = fetch_product_from_connect(
+        product_id=request.query_params['product_id'],
+        fresh=True,
+    )
     latest = int(connect_product['version'])
     match = re.match(
         r'http://aps.odin.com/app/{product}/app/(?P<major>\d+)\.0'.format(
@@ -1,9 +1,9 @@
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
 
 from cbcext.models.fulfillment_models import Reseller
 from cbcext.services.hub.utils import from_aps_rql_to_client_rql, serialize_for_get_tier_configs
 from cbcext.services.locales import LOCALES
+from cbcext.utils.context import g
 
 from connect.client import ClientError
 
@@ -1,74 +1,137 @@
+import os
+
 from fastapi.responses import JSONResponse
 
+from cbcext.services.db_services import (
+    fetch_usage_chunk_checkpoints,
+    reset_usage_chunk_checkpoints,
+    save_usage_chunk_checkpoints,
+)
+from cbcext.services.client.oaclient import OACommunicationException
 from cbcext.services.hub.services import (
     close_chunk_file,
     fetch_chunk_files_by_hub_id,
+    fetch_usage_reports_index,
+    filter_usage_reports,
     get_oa_usage_adapter_manager,
-    get_usage_chunk_file_content,
     get_usage_files_from_oa,
+    open_usage_chunk_file,
     update_chunk_file_external_id,
     upload_to_oa,
 )
+from cbcext.utils.concurrency import run_bounded
+from cbcext.utils.context import g
+
+CHUNK_FILES_WORKERS = 4
+# Seconds during which chunk files are started, must be lower than CBC periodic task timeout
+CHUNK_FILES_TIME_BUDGET = 180
 
 
 class ProcessUsageChunkFiles:
     """
     Class in charge to cover the usage upload workflow for usage files of type
-    TR, CR and PR
+    TR, CR and PR.
+
+    Chunk files are handled concurrently by CHUNK_FILES_WORKERS, new ones are not started once
+    time budget is spent, that way periodic task answers before CBC gives up on it. Handled
+    chunk files are checkpointed, next run resumes with the ones not handled yet.
     """
-    def handle(self, app_id):  # noqa: CCR001
+    def handle(self, app_id):
         oa_usage_adapter = get_oa_usage_adapter_manager(app_id)
         if oa_usage_adapter is None:
             return {"message": "Hub does not support automatic usage reporting"}, 200
-        chunk_files = fetch_chunk_files_by_hub_id(app_id)
-        for chunk_file in chunk_files:
-            if str(chunk_file['usagefile']['schema']).lower() == 'qt':
-                '''OSA Handles QT Schemas using old pulling way per tenant'''
-                continue
+        chunk_files = [
+            chunk_file for chunk_file in fetch_chunk_files_by_hub_id(app_id)
+            # OSA Handles QT Schemas using old pulling way per tenant
+            if str(chunk_file['usagefile']['schema']).lower() != 'qt'
+        ]
+        handled = fetch_usage_chunk_checkpoints(g.db, app_id)
+        pending = [chunk_file for chunk_file in chunk_files if chunk_file['id'] not in handled]
+        if not pending:
+            # Previous pass is completed, files not closed yet must be checked again
+            reset_usage_chunk_checkpoints(g.db, app_id)
+            pending = chunk_files
 
-            chunk_files_in_oa = get_usage_files_from_oa(
+        try:
+            # One listing per run, files are matched against it by their usage file id
+            reports = fetch_usage_reports_index(
                 app_id,
                 oa_usage_adapter,
-                chunk_file['usagefile']['id'],
-                None,
+                {chunk_file['usagefile']['id'] for chunk_file in pending},
             )
-            if len(chunk_files_in_oa) == 0:
-                self._upload_and_handle_chunk(chunk_file, oa_usage_adapter, app_id)
-            else:
-                self._handle_existing_usage_file(chunk_file, oa_usage_adapter, app_id)
+        except OACommunicationException:
+            return JSONResponse(
+                content={"message": "Usage reports could not be listed from Commerce"},
+                status_code=409,
+            )
+
+        started = run_bounded(
+            (
+                (
+                    chunk_file['id'],
+                    lambda chunk_file=chunk_file: self._handle_chunk(
+                        chunk_file,
+                        reports,
+                        oa_usage_adapter,
+                        app_id,
+                    ),
+                )
+                for chunk_file in pending
+            ),
+            max_workers=CHUNK_FILES_WORKERS,
+            timeout=self._time_budget(),
+        )
+        for chunk_id, future in started.items():
+            if future.exception():
+                # Failed files are checked again on next pass
+                g.logger.error(f'Usage chunk file {chunk_id} failed: {future.exception()}')
+        save_usage_chunk_checkpoints(g.db, app_id, started)
 
         return JSONResponse(content={"message": "OK"}, status_code=200)
 
+    @staticmethod
+    def _time_budget():
+        return float(
+            g.extension_config.get(
+                'CHUNK_FILES_TIME_BUDGET',
+                os.getenv('CHUNK_FILES_TIME_BUDGET', CHUNK_FILES_TIME_BUDGET),
+            ),
+        )
+
+    def _handle_chunk(self, chunk_file, reports, oa_usage_adapter, app_id):
+        chunk_files_in_oa = reports.get(chunk_file['usagefile']['id'], [])
+        if len(chunk_files_in_oa) == 0:
+            self._upload_and_handle_chunk(chunk_file, oa_usage_adapter, app_id)
+        else:
+            self._handle_existing_usage_file(chunk_file, chunk_files_in_oa)
+
     @staticmethod
     def _upload_and_handle_chunk(chunk_file, oa_usage_adapter, app_id):
         """Usage file is not known to OSA, proceeding to download and upload"""
-        usage_file_content = get_usage_chunk_file_content(chunk_file['id'])
-        """upload to OA """
-        uploaded = upload_to_oa(
-            app_id,
-            oa_usage_adapter,
-            chunk_file['id'],
-            usage_file_content,
-        )
+        with open_usage_chunk_file(chunk_file['id']) as usage_file_content:
+            """stream it to OA while it's downloaded"""
+            uploaded = upload_to_oa(
+                app_id,
+                oa_usage_adapter,
+                chunk_file['id'],
+                usage_file_content,
+            )
         if not uploaded:
             return
+        g.logger.debug(
+            f"Usage chunk file {chunk_file['id']} uploaded to OA, "
+            f"{usage_file_content.tell()} bytes, sha256 {usage_file_content.hexdigest()}",
+        )
         """Lets search what we uploaded in order to get batch and set it as chunk"""
-        processed_reports_in_oa = get_usage_files_from_oa(
+        reports_in_oa = get_usage_files_from_oa(
             app_id,
             oa_usage_adapter,
             chunk_file['usagefile']['id'],
-            'IN_PROGRESS',
+            None,
         )
+        processed_reports_in_oa = filter_usage_reports(reports_in_oa, 'IN_PROGRESS')
         if len(processed_reports_in_oa) == 0:
-            """
-            Trick in order to solve problem that CB don't supports in operator
-            """
-            processed_reports_in_oa = get_usage_files_from_oa(
-                app_id,
-                oa_usage_adapter,
-                chunk_file['usagefile']['id'],
-                'PROCESSED',
-            )
+            processed_reports_in_oa = filter_usage_reports(reports_in_oa, 'PROCESSED')
         if len(processed_reports_in_oa) == 1:
             update_chunk_file_external_id(
                 chunk_file['id'],
@@ -76,15 +139,10 @@ class ProcessUsageChunkFiles:
             )
 
     @staticmethod
-    def _handle_existing_usage_file(chunk_file, oa_usage_adapter, app_id):
+    def _handle_existing_usage_file(chunk_file, reports_in_oa):
         """We shall check if by any chance OSA processed file, for any other status we
                         will expect operator to fix using manual procedure"""
-        processed_reports_in_oa = get_usage_files_from_oa(
-            app_id,
-            oa_usage_adapter,
-            chunk_file['usagefile']['id'],
-            'PROCESSED',
-        )
+        processed_reports_in_oa = filter_usage_reports(reports_in_oa, 'PROCESSED')
         if len(processed_reports_in_oa) == 1:
             """Let's update the external id"""
             update_chunk_file_external_id(
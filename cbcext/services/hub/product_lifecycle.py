@@ -1,11 +1,12 @@
 import concurrent.futures
+import contextvars
 import datetime
 
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
 
 from cbcext.services.client.oaclient import OA, OACommunicationException
 from cbcext.services.exceptions import TokenException
+from cbcext.utils.context import g
 from .services import (
     aps_openapi_adapter_create_instance,
     aps_openapi_adapter_get_application_id,
@@ -268,7 +269,7 @@ class InitTask:
             openapi_adapter=self.oa_aps_openapi_adapter,
             oa_app_id=oa_app_id['app_id'],
         )
-        product = fetch_product_from_connect(product_id=self.product_id)
+        product = fetch_product_from_connect(product_id=self.product_id, fresh=True)
         if app_instances is None or len(app_instances) == 0:
             self.data['step'] = "create_instance"
             return JSONResponse(
@@ -507,8 +508,10 @@ class InitTask:
 
         with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
             for item in chunk:
+                # Request globals are needed by OA client, each task runs on its own copy
                 futures.append(
                     executor.submit(
+                        contextvars.copy_context().run,
                         _create_product_item,
                         item,
                         use_item_profile,
@@ -569,7 +572,7 @@ class InitTask:
         # When there are a lot of resources
         # somehow OA Get's unstable after 500 secs of execution time if we have a OA timeout of 600
         execution_timeout = 500
-        product = fetch_product_from_connect(product_id=self.product_id)
+        product = fetch_product_from_connect(product_id=self.product_id, fresh=True)
         oa_app_id = aps_openapi_adapter_get_application_id(
             app_id=self.app_id,
             openapi_adapter=self.oa_aps_openapi_adapter,
@@ -656,7 +659,7 @@ class InitTask:
         Creates the ST using REST interface instead of openapi
         :return:
         """
-        product = fetch_product_from_connect(product_id=self.product_id)
+        product = fetch_product_from_connect(product_id=self.product_id, fresh=True)
         try:
             token = self._get_user_token(1)
         except TokenException:
@@ -900,7 +903,7 @@ class InitTask:
         """
         if self.retries < 10:
             try:
-                product = fetch_product_from_connect(product_id=self.product_id)
+                product = fetch_product_from_connect(product_id=self.product_id, fresh=True)
                 payload = {
                     'name': product['name'],
                     'rts': [rt_id['id'] for rt_id in self.data['rts']],
@@ -1058,7 +1061,7 @@ class InitTask:
         )
 
     def _wait_upgrade_complete(self):
-        product = fetch_product_from_connect(product_id=self.product_id)
+        product = fetch_product_from_connect(product_id=self.product_id, fresh=True)
         oa_app_id = aps_openapi_adapter_get_application_id(
             app_id=self.app_id,
             openapi_adapter=self.oa_aps_openapi_adapter,
@@ -1,19 +1,31 @@
+import io
 import os
+from contextlib import contextmanager
 from datetime import datetime
 from json.decoder import JSONDecodeError
 from xml.etree import ElementTree as XML_et
 
 from requests_toolbelt.multipart.encoder import MultipartEncoder
-from starlette_context import context as g
 
 from cbcext.models.fulfillment_models import Account, Provider
 from cbcext.services.client.oaclient import OA, OACommunicationException
+from cbcext.services.connections import index_connection
 from cbcext.services.db_services import (
     fetch_hub_uuid_by_app_id,
     update_or_create_hub_instance,
 )
+from cbcext.services.hub.discovery import discover
+from cbcext.services.products import get_product, refresh_product
+from cbcext.utils.context import g
+from cbcext.utils.streams import ChecksumReader
 
 from connect.client import ClientError
+from connect.client.utils import get_headers
+
+USAGE_REPORTS_PAGE_SIZE = 1000
+USAGE_REPORTS_MAX_PAGES = 1000
+# Fields of usage reports used while handling chunk files
+USAGE_REPORT_FIELDS = ('reportId', 'status', 'batchId')
 
 
 def fetch_hub_data_from_connect(hub_uuid):
@@ -121,11 +133,13 @@ def close_chunk_file(chunk_file_id, billing_id, note):
     )
 
 
-def fetch_product_from_connect(product_id):
+def fetch_product_from_connect(product_id, fresh=False):
     """
     Fetches product from Connect Public API
+    :param product_id: str
+    :param fresh: bool, skip cached product, required when latest version must be used
     """
-    resp = g.client.products[product_id].get()
+    resp = refresh_product(product_id) if fresh else get_product(product_id)
 
     if resp and (
             resp['visibility']['listing'] is True or resp['visibility']['syndication'] is True
@@ -152,6 +166,8 @@ def fetch_product_connections(product_id, hub_id):
 
     for connection in resp:
         if 'hub' in connection and connection['hub']['id'] == hub_id:
+            if 'instance' in connection['hub']:
+                index_connection(product_id, connection)
             return connection
     return {}
 
@@ -276,17 +292,25 @@ def get_oa_usage_adapter_manager(app_id):
     :return:
     """
     try:
-        usage_adapter_type = "http://com.odin.rating/usage-adapter-manager/1.0"
-        instance_manager = OA.get_resources(
-            rql_request="/aps/2/resources?implementing({type})".format(type=usage_adapter_type),
-            impersonate_as=app_id)
-        if len(instance_manager) == 1:
-            return instance_manager[0]['aps']['id']
-        return None
+        return discover(
+            app_id,
+            'usage_adapter_manager',
+            lambda: _find_oa_usage_adapter_manager(app_id),
+        )
     except OACommunicationException:
         return None
 
 
+def _find_oa_usage_adapter_manager(app_id):
+    usage_adapter_type = "http://com.odin.rating/usage-adapter-manager/1.0"
+    instance_manager = OA.get_resources(
+        rql_request="/aps/2/resources?implementing({type})".format(type=usage_adapter_type),
+        impersonate_as=app_id)
+    if len(instance_manager) == 1:
+        return instance_manager[0]['aps']['id']
+    return None
+
+
 def get_usage_files_from_oa(
         app_id,
         usage_adapter_manager_uuid,
@@ -324,16 +348,89 @@ def get_usage_files_from_oa(
         return []
 
 
-def get_usage_chunk_file_content(chunk_file_id):
-    return g.client.ns(
-        'usage',
-    ).collection(
-        'chunks',
-    ).resource(
-        chunk_file_id,
-    ).action(
-        'download',
-    ).get()
+def fetch_usage_reports_index(app_id, usage_adapter_manager_uuid, report_ids):
+    """
+    Lists usage reports known by OA usage adapter page by page, sorted so that pages do not
+    shift, indexed by reportId. Only USAGE_REPORT_FIELDS of reports of given ids are kept,
+    pages are not memoized. Listing stops once a page repeats previous one, as returned by
+    adapters ignoring limit, or after USAGE_REPORTS_MAX_PAGES.
+    :param app_id: str uuid
+    :param usage_adapter_manager_uuid: str uuid
+    :param report_ids: set of Connect Usage file IDs
+    :return: dict of reportId and list of reports
+    :raises OACommunicationException
+    """
+    index = {}
+    first = None
+    for page_number in range(USAGE_REPORTS_MAX_PAGES):
+        page = OA.get_resources(
+            rql_request=(
+                '/aps/2/resources/{adapter}/usageReportsList'
+                '?sort(+reportId,+batchId),limit({offset},{size})'
+            ).format(
+                adapter=usage_adapter_manager_uuid,
+                offset=page_number * USAGE_REPORTS_PAGE_SIZE,
+                size=USAGE_REPORTS_PAGE_SIZE,
+            ),
+            impersonate_as=app_id,
+        ) or []
+        if page and (page[0].get('reportId'), page[0].get('batchId')) == first:
+            return index
+        for report in page:
+            if report.get('reportId') in report_ids:
+                index.setdefault(report['reportId'], []).append(
+                    {field: report.get(field) for field in USAGE_REPORT_FIELDS},
+                )
+        # Adapters ignoring limit return all reports at once
+        if len(page) != USAGE_REPORTS_PAGE_SIZE:
+            return index
+        first = page[0].get('reportId'), page[0].get('batchId')
+    return index
+
+
+def filter_usage_reports(reports, status):
+    """
+    Provides usage reports in given status
+    :param reports: list of usage reports
+    :param status: str
+    :return: list
+    """
+    return [report for report in reports if report.get('status') == status]
+
+
+@contextmanager
+def open_usage_chunk_file(chunk_file_id):
+    """
+    Opens download of a chunk file, content is downloaded while it's read, that way it can be
+    piped to an upload without holding it in memory.
+    :param chunk_file_id: str
+    :return: ChecksumReader
+    :raises ClientError
+    """
+    headers = get_headers(g.client.api_key)
+    headers.update(g.client.default_headers)
+    # Content length is required to stream it as a multipart part
+    headers['Accept-Encoding'] = 'identity'
+    response = g.client.session.get(
+        f'{g.client.endpoint}/usage/chunks/{chunk_file_id}/download',
+        headers=headers,
+        timeout=g.client.timeout,
+        stream=True,
+    )
+    try:
+        if response.status_code >= 400:
+            raise ClientError(
+                message=f'Download of chunk file {chunk_file_id} failed',
+                status_code=response.status_code,
+            )
+        length = response.headers.get('Content-Length')
+        if length is None or response.headers.get('Content-Encoding', 'identity') != 'identity':
+            # Content must be read to know its length
+            yield ChecksumReader(io.BytesIO(response.content), len(response.content))
+        else:
+            yield ChecksumReader(response.raw, int(length))
+    finally:
+        response.close()
 
 
 def update_chunk_file_external_id(chunk_file_id, external_id):
@@ -360,9 +457,8 @@ def upload_to_oa(
     :param app_id: str uuid
     :param usage_adapter: str uuid
     :param chunk_file_id: str
-    :param stream: usage file stream
-    :return: None
-    :raises OACommunicationException
+    :param stream: usage file content, bytes or file like object with known length
+    :return: bool
     """
     try:
         location = 'aps/2/resources/{adapter_uid}/usageReports'.format(adapter_uid=usage_adapter)
@@ -383,6 +479,8 @@ def upload_to_oa(
             headers=headers,
             body=body,
             binary=True,
+            # Streamed content can't be sent twice
+            retry_num=1,
         )
         uploaded = True
     except OACommunicationException:
@@ -397,26 +495,33 @@ def upload_to_oa(
     return uploaded
 
 
-def get_oa_aps_openapi_adapter(app_id):
+def get_oa_aps_openapi_adapter(app_id, raise_errors=False):
     """
     Provides open api adapter UUID to interact with it
     :param app_id: str uuid
+    :param raise_errors: bool, raise OACommunicationException instead of returning None
     :return: str uuid
     """
     try:
-        usage_adapter_type = "http://connect.cloudblue.com/aps-openapi-adapter/app/1.0"
-        instance_manager = OA.get_resources(
-            rql_request="/aps/2/resources?implementing({adapter_type})".format(
-                adapter_type=usage_adapter_type,
-            ),
-            impersonate_as=app_id)
-        if len(instance_manager) == 1:
-            return instance_manager[0]['aps']['id']
-        return None
+        return discover(app_id, 'openapi_adapter', lambda: _find_oa_aps_openapi_adapter(app_id))
     except OACommunicationException:
+        if raise_errors:
+            raise
         return None
 
 
+def _find_oa_aps_openapi_adapter(app_id):
+    usage_adapter_type = "http://connect.cloudblue.com/aps-openapi-adapter/app/1.0"
+    instance_manager = OA.get_resources(
+        rql_request="/aps/2/resources?implementing({adapter_type})".format(
+            adapter_type=usage_adapter_type,
+        ),
+        impersonate_as=app_id)
+    if len(instance_manager) == 1:
+        return instance_manager[0]['aps']['id']
+    return None
+
+
 def aps_openapi_adapter_get_application_id(
         app_id,
         openapi_adapter,
@@ -846,24 +951,27 @@ def get_init_wizard_editor(app_id):
     Gets instance of platform component called edit-wizard-management
     :return: string
     """
-
-    editor_type = 'http://odin.com/edit-wizard/edit-wizard-management/1'
     try:
-        editor_request = OA.send_request(
-            method='GET',
-            path='aps/2/resources?implementing({type})'.format(
-                type=editor_type,
-            ),
-            impersonate_as=app_id,
-            transaction=False,
-        )
-        if len(editor_request) >= 1:
-            return editor_request[0]['aps']['id']
-        return None
+        return discover(app_id, 'init_wizard_editor', lambda: _find_init_wizard_editor(app_id))
     except OACommunicationException:
         return None
 
 
+def _find_init_wizard_editor(app_id):
+    editor_type = 'http://odin.com/edit-wizard/edit-wizard-management/1'
+    editor_request = OA.send_request(
+        method='GET',
+        path='aps/2/resources?implementing({type})'.format(
+            type=editor_type,
+        ),
+        impersonate_as=app_id,
+        transaction=False,
+    )
+    if len(editor_request) >= 1:
+        return editor_request[0]['aps']['id']
+    return None
+
+
 def get_platform_resources_over_editor(
         app_id,
         editor_id,
@@ -1,6 +1,6 @@
 import re
 
-from starlette_context import context as g
+from cbcext.utils.context import g
 
 
 def from_aps_rql_to_client_rql(rql_params):
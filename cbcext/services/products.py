@@ -0,0 +1,71 @@
+from cbcext.utils.cache import StaleWhileRevalidateCache
+from cbcext.utils.context import g
+
+# Product metadata only changes when vendor publishes a new version, once expired it's served
+# during PRODUCT_STALE_TTL while it's reloaded in background
+PRODUCT_TTL = 300
+PRODUCT_STALE_TTL = 3600
+
+_products = StaleWhileRevalidateCache(
+    'products',
+    ttl=PRODUCT_TTL,
+    stale_ttl=PRODUCT_STALE_TTL,
+    maxsize=256,
+)
+_product_metadata = StaleWhileRevalidateCache(
+    'product_metadata',
+    ttl=PRODUCT_TTL,
+    stale_ttl=PRODUCT_STALE_TTL,
+    maxsize=1024,
+)
+
+
+def get_product(product_id):
+    """
+    Returns product from Connect Public API, cached per product
+    :param product_id: str
+    :return: dict
+    """
+    return _products.get_or_set(product_id, lambda: g.client.products[product_id].get())
+
+
+async def async_get_product(product_id):
+    """
+    asyncio flavour of get_product
+    """
+    return await _products.async_get_or_set(
+        product_id,
+        lambda: g.async_client.products[product_id].get(),
+    )
+
+
+def refresh_product(product_id):
+    """
+    Fetches product from Connect Public API skipping the cache, fetched product is cached.
+    To be used where latest version is required, f.e. on installations and upgrades.
+    :param product_id: str
+    :return: dict
+    """
+    product = g.client.products[product_id].get()
+    _products.set(product_id, product)
+    return product
+
+
+def get_product_metadata(product_id, name, loader):
+    """
+    Returns product related data, like parameters or actions, cached per product version.
+    Results must not be modified by callers.
+    :param product_id: str
+    :param name: str, name of the data, must include any argument passed to loader
+    :param loader: callable without arguments
+    """
+    version = get_product(product_id)['version']
+    return _product_metadata.get_or_set((product_id, version, name), loader)
+
+
+async def async_get_product_metadata(product_id, name, loader):
+    """
+    asyncio flavour of get_product_metadata, loader must be a coroutine function
+    """
+    version = (await async_get_product(product_id))['version']
+    return await _product_metadata.async_get_or_set((product_id, version, name), loader)
@@ -1,10 +1,11 @@
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
 
 from cbcext.models.fulfillment_models import Account
 from cbcext.models.fulfillment_models import Reseller
 from cbcext.services.client.oaclient import OA, OACommunicationException
-from cbcext.services.hub.services import fetch_hub_data_from_connect, fetch_hub_uuid_from_oa
+from cbcext.services.connections import get_connection_id
+from cbcext.services.hub.services import fetch_hub_uuid_from_oa
+from cbcext.utils.context import g
 
 from connect.client import ClientError
 
@@ -191,16 +192,8 @@ class TierConfigurationRequest:
 
     @staticmethod
     def _get_connection(app_id, product_id):
-        # @TODO: we have similar function in connector/hub/services.py
-        # need to merge both functions and leave only one in code
         try:
-            hub_uuid = fetch_hub_uuid_from_oa(app_id)
-            hub_data = fetch_hub_data_from_connect(hub_uuid)
-            connections = g.client.products[product_id].connections.filter('ne(hub.id,null())')
-            for connection in connections:
-                if connection['hub']['id'] == hub_data['id']:
-                    return connection['id']
-            return None
+            return get_connection_id(product_id, fetch_hub_uuid_from_oa(app_id))
         except ClientError:
             # Errors must be generic due tier actor
             return None
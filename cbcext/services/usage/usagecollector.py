@@ -1,11 +1,15 @@
+import asyncio
 from datetime import datetime
 from typing import Tuple
 
 from fastapi.responses import JSONResponse
-from starlette_context import context as g
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
 
 from cbcext.services.client.apsconnectclient import request_statuses
-from cbcext.services.client.oaclient import OA, OACommunicationException
+from cbcext.services.client.oaclient import AsyncOA, OACommunicationException
+from cbcext.services.db_services import fetch_usage_snapshot, mark_usage_snapshot_reported
+from cbcext.utils.context import g
 
 from connect.client import ClientError
 
@@ -15,6 +19,10 @@ import math
 PPU = 'ppu'
 RESERVATION = 'reservation'
 FETCH_DEFAULT_LIMIT = 1000
+# Records of each listed page are closed in batches of this size
+CLOSE_BATCH_SIZE = 500
+AGGREGATE_FIELDS = ('item.local_id', 'item.type', 'item.precision', 'accepted', 'consumed')
+RECORD_FIELDS = ('id', 'item.local_id')
 USAGE_SCHEMA = 'qt'
 RESOURCE_MULTIPLIERS = {
     'integer': 1,
@@ -30,23 +38,32 @@ def _get_multiplier_by_precision(data_type):
     return RESOURCE_MULTIPLIERS.get(data_type, RESOURCE_MULTIPLIERS['integer'])
 
 
-def _bulk_close_usage_records(rec_ids: list) -> Tuple[dict, dict]:
-    return g.client.ns('usage').ns('records').collection('close-records').bulk_create(rec_ids)
+async def _bulk_close_usage_records(rec_ids: list) -> Tuple[dict, dict]:
+    return await g.async_client.ns('usage').ns('records').collection(
+        'close-records',
+    ).bulk_create(rec_ids)
 
 
 def _get_usage_aggregate_by_asset_external_uid(asset_external_uid: str) -> dict:
     """ GET Usage Aggregate API call with required parameter - asset external uid"""
     rql = f'asset.external_uid={asset_external_uid}'
-    return g.client.ns('usage').collection('aggregates').filter(rql)
+    return g.async_client.ns('usage').collection('aggregates').filter(rql).select(
+        *AGGREGATE_FIELDS,
+    ).limit(FETCH_DEFAULT_LIMIT)
 
 
-def _get_all_usage_records(asset_external_id: str) -> dict:
+def _get_usage_records_page(asset_external_id: str, after: str = None):
+    """ Page of approved usage records ordered by id, records after given id if any """
     rql = (
         f'status={request_statuses.approved}'
         f'&asset.external_uid={asset_external_id}'
         f'&usagefile.schema={USAGE_SCHEMA}'
     )
-    return g.client.ns('usage').collection('records').filter(rql)
+    if after:
+        rql += f'&gt(id,{after})'
+    return g.async_client.ns('usage').collection('records').filter(rql).select(
+        *RECORD_FIELDS,
+    ).order_by('id')[0:FETCH_DEFAULT_LIMIT]
 
 
 def _get_item_usage(item_type: str, usage_rec: dict) -> float:
@@ -57,62 +74,120 @@ def _get_item_usage(item_type: str, usage_rec: dict) -> float:
     return float(usage_rec.get('consumed', 0))
 
 
-def _setup_item_with_usage_data(tenant_id: str, tenant_data: dict) -> dict:
+def _add_item_usage(item_usage: dict, usage_rec: dict, tenant_data: dict):
+    """ Set item usage data of an usage aggregate for reporting to OA """
+    local_id = usage_rec['item'].get('local_id')
+    item_type = usage_rec['item'].get('type', '').lower()
+
+    if local_id in tenant_data and item_type in [PPU, RESERVATION]:
+        usage = _get_item_usage(item_type, usage_rec)
+
+        multiplier = float(_get_multiplier_by_precision(usage_rec['item'].get('precision')))
+        current_reported = math.floor(usage * multiplier)
+        previous_usage = tenant_data[local_id].get('usage', 0)
+
+        # Special case to handle for OA - We shouldn't be reporting less usage value than
+        # what has been reported earlier for PPU item
+        if previous_usage >= current_reported and item_type == PPU:
+            item_usage[local_id] = previous_usage
+        else:
+            item_usage[local_id] = current_reported
+
+
+async def _setup_item_with_usage_data(tenant_id: str, tenant_data: dict) -> dict:
     """ Set item usage data from aggregate API for reporting to OA """
     item_usage = {}
 
     try:
-        for usage_rec in _get_usage_aggregate_by_asset_external_uid(tenant_id):
-            local_id = usage_rec['item'].get('local_id')
-            item_type = usage_rec['item'].get('type', '').lower()
-
-            if local_id in tenant_data and item_type in [PPU, RESERVATION]:
-                usage = _get_item_usage(item_type, usage_rec)
-
-                multiplier = float(_get_multiplier_by_precision(usage_rec['item'].get('precision')))
-                current_reported = math.floor(usage * multiplier)
-                previous_usage = tenant_data[local_id].get('usage', 0)
-
-                # Special case to handle for OA - We shouldn't be reporting less usage value than
-                # what has been reported earlier for PPU item
-                if previous_usage >= current_reported and item_type == PPU:
-                    item_usage[local_id] = previous_usage
-                else:
-                    item_usage[local_id] = current_reported
+        async for usage_rec in _get_usage_aggregate_by_asset_external_uid(tenant_id):
+            _add_item_usage(item_usage, usage_rec, tenant_data)
     except ClientError:
         return {}
 
     return item_usage
 
 
-def _setup_usage_record_to_close(external_uid: str, item_usage: dict) -> list:
-    """ List of dict of usage record to be closed """
-    records_ids = []
+async def _fetch_usage_records_page(asset_external_id: str, after: str = None) -> list:
+    """ Fetches page of usage records following given record id, empty once listing ends """
     try:
-        for usage_rec in _get_all_usage_records(external_uid):
-            local_id = usage_rec['item'].get('local_id')
-            if local_id in item_usage:
-                records_ids.append({
-                    "id": usage_rec['id'],
-                    "external_billing_note": "Closed at {time}".format(time=datetime.now()),
-                })
+        return [
+            usage_rec async for usage_rec in _get_usage_records_page(asset_external_id, after)
+        ]
     except ClientError:
         return []
 
-    return records_ids
-
 
-def _setup_tenant_usage_to_report(props: dict, item_usage: dict) -> dict:
+async def _close_usage_records(tenant_id: str, page: list, item_usage: dict) -> int:
+    """
+    Closes usage records of reported items page by page. Pages are fetched by id cursor,
+    records being closed leave the approved listing without shifting pages still to come.
+    Next page is fetched while records of current one are closed, in batches of
+    CLOSE_BATCH_SIZE, that way memory does not grow with number of records.
+    :param page: first page of records, already fetched
+    :return: number of closed records
+    """
+    note = "Closed at {time}".format(time=datetime.now())
+    closed = 0
+    while page:
+        next_page = None
+        if len(page) == FETCH_DEFAULT_LIMIT:
+            next_page = asyncio.ensure_future(
+                _fetch_usage_records_page(tenant_id, page[-1]['id']),
+            )
+        rec_ids = [
+            {"id": usage_rec['id'], "external_billing_note": note}
+            for usage_rec in page
+            if usage_rec['item'].get('local_id') in item_usage
+        ]
+        try:
+            for start in range(0, len(rec_ids), CLOSE_BATCH_SIZE):
+                await _bulk_close_usage_records(rec_ids[start:start + CLOSE_BATCH_SIZE])
+        except BaseException:
+            if next_page:
+                next_page.cancel()
+            raise
+        closed += len(rec_ids)
+        page = await next_page if next_page else []
+    return closed
+
+
+def _setup_tenant_usage_to_report(counters: list, item_usage: dict) -> dict:
     """ Prepare dict of usage to report OA"""
     tenant = {}
-    for name, item in props.items():
-        if 'Counter' in item.get('type', '') and name in item_usage:
+    for name in counters:
+        if name in item_usage:
             tenant[name] = {'usage': item_usage.get(name)}
 
     return tenant
 
 
-def build_usage(tenant_id: str) -> JSONResponse:
+def _mark_snapshot_reported(tenant_id: str, item_usage: dict):
+    try:
+        mark_usage_snapshot_reported(g.db, tenant_id, list(item_usage))
+    except DBAPIError:
+        # Records are closed once usage is reported again
+        g.db.rollback()
+
+
+async def _report_usage_snapshot(snapshot, tenant_data: dict, capabilities) -> JSONResponse:
+    """
+    Reports usage of snapshot computed when usage files were accepted, records of reported
+    items are closed later on by events application
+    """
+    item_usage = {}
+    for usage_rec in snapshot.aggregates:
+        _add_item_usage(item_usage, usage_rec, tenant_data)
+
+    if not item_usage:
+        return JSONResponse(content=tenant_data)
+
+    await run_in_threadpool(_mark_snapshot_reported, snapshot.tenant_id, item_usage)
+    return JSONResponse(
+        content=_setup_tenant_usage_to_report(capabilities.counters, item_usage),
+    )
+
+
+async def build_usage(tenant_id: str) -> JSONResponse:
     """
     Report usage to OA on teh basis on asset_external_uid
     :param str tenant_id: asset_external_uid
@@ -121,8 +196,8 @@ def build_usage(tenant_id: str) -> JSONResponse:
     tenant = {}
     if tenant_id:
         try:
-            tenant_data = OA.get_resource(tenant_id)
-            props = OA.get_tenant_schema(tenant_data['aps']['type']).get('properties', {})
+            tenant_data = await AsyncOA.get_resource(tenant_id)
+            capabilities = await AsyncOA.get_tenant_capabilities(tenant_data['aps']['type'])
         except OACommunicationException:
             return JSONResponse(
                 content={
@@ -135,17 +210,22 @@ def build_usage(tenant_id: str) -> JSONResponse:
                 status_code=409,
             )
 
-        item_usage = _setup_item_with_usage_data(tenant_id, tenant_data)
+        snapshot = await run_in_threadpool(fetch_usage_snapshot, g.db, tenant_id)
+        if snapshot is not None:
+            return await _report_usage_snapshot(snapshot, tenant_data, capabilities)
+
+        # First page of records is fetched while aggregates are processed
+        item_usage, first_page = await asyncio.gather(
+            _setup_item_with_usage_data(tenant_id, tenant_data),
+            _fetch_usage_records_page(tenant_id),
+        )
 
         if not item_usage:
             return JSONResponse(content=tenant_data)
 
-        records_ids = _setup_usage_record_to_close(tenant_id, item_usage)
-
-        tenant = _setup_tenant_usage_to_report(props, item_usage)
+        tenant = _setup_tenant_usage_to_report(capabilities.counters, item_usage)
 
-        if records_ids:
-            _bulk_close_usage_records(records_ids)
+        await _close_usage_records(tenant_id, first_page, item_usage)
 
     return JSONResponse(
         content=tenant,
@@ -1,6 +1,23 @@
+import hashlib
+import json
+
 from fastapi.responses import JSONResponse
 from connect.client import ClientError
-from starlette_context import context as g
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+
+from cbcext.services.db_services import (
+    fetch_last_asset_request,
+    fetch_request_submission,
+    fetch_tenant_asset,
+    remove_request_submission,
+    save_asset_request,
+    save_request_submission,
+    save_tenant_asset,
+)
+from cbcext.services.products import get_product, get_product_metadata
+from cbcext.utils.context import g
+from cbcext.utils.identity_map import memoize
 
 statuses_to_track = [
     'failed',
@@ -13,6 +30,15 @@ statuses_to_track = [
     'revoked',
 ]
 
+# Requests in these statuses don't change anymore, stored ones are always trusted
+final_statuses = ('failed', 'approved', 'revoked')
+
+# CBC retries sync phase of tenant operations within hours, older submissions are not reused
+SUBMISSION_TTL = 24 * 3600
+# Stored requests not in a final status are refreshed from Connect once synced before, in case
+# that their events were lost
+LAST_REQUEST_MAX_AGE = 900
+
 
 def get_actions(product_id, scope):
     """
@@ -20,10 +46,11 @@ def get_actions(product_id, scope):
     :param scope: enum ('asset', 'tier1', 'tier2')
     :return: list of dict
     """
-    actions = list(
-        g.client.products[product_id].actions.filter(f'scope={scope}'),
+    return get_product_metadata(
+        product_id,
+        f'actions:{scope}',
+        lambda: list(g.client.products[product_id].actions.filter(f'scope={scope}')),
     )
-    return actions
 
 
 def get_action_id_by_action_local_id(product_id, scope, action_local_id):
@@ -55,12 +82,35 @@ def _filter_actions_by_local_id(action_id, action_list):
 
 def get_asset_by_uuid(asset_external_uid):
     """
-    Returns asset id (AS-XXX-XXX-XXX) given it's uuid.
-    uuid matches APS resource and stored in connect as external_uid
+    Returns asset given it's uuid, at least with its id, external_uid, product and marketplace.
+    uuid matches APS resource and stored in connect as external_uid.
+    Asset is resolved from tenant assets table, Connect is only searched when it's not there.
     :param asset_external_uid:
-    :return:
+    :return: dict or None
     """
-    return g.client.assets.filter(f'external_uid={asset_external_uid}').first()
+    return memoize(
+        ('connect', 'asset', asset_external_uid),
+        lambda: _find_asset_by_uuid(asset_external_uid),
+    )
+
+
+def _find_asset_by_uuid(asset_external_uid):
+    mapped = fetch_tenant_asset(g.db, asset_external_uid)
+    if mapped:
+        return {
+            'id': mapped.asset_id,
+            'external_uid': mapped.tenant_id,
+            'product': {'id': mapped.product_id},
+            'marketplace': {'id': mapped.marketplace_id} if mapped.marketplace_id else None,
+        }
+    asset = g.client.assets.filter(f'external_uid={asset_external_uid}').first()
+    if asset is None:
+        return None
+    try:
+        save_tenant_asset(g.db, asset)
+    except DBAPIError:
+        g.db.rollback()
+    return asset
 
 
 def get_action_link(product_id, action, scope, identifier):
@@ -90,34 +140,154 @@ def get_tier_config_by_id(tier_config_id):
     return g.client.ns('tier').collection('configs').resource(tier_config_id).get()
 
 
+def _last_request_filter(tenant_id, operation=None):
+    if operation:
+        return (
+            f'and('
+            f'eq(asset.external_uid,{tenant_id}),'
+            f'eq(type,{operation}),'
+            f'in(status,({",".join(statuses_to_track)})))'
+        )
+    return (
+        f'and('
+        f'eq(asset.external_uid,{tenant_id}),'
+        f'in(status,({",".join(statuses_to_track)})))'
+    )
+
+
 def get_last_request_by_tenant_id(tenant_id, operation=None):
     """
     Returns last request for a given asset, identified by external_id and optional a given operation
+    Requests are taken from the ones stored from Connect events, Connect is queried on misses and
+    when stored request was not synced recently, in such case it's stored again.
     :param tenant_id: str
     :param operation: str
     :return:
     """
+    request = _fetch_last_request(g.db, tenant_id, operation)
+    if request:
+        return request
+    request = g.client.requests.filter(
+        _last_request_filter(tenant_id, operation),
+    ).select(
+        '-asset.configuration',
+    ).order_by(
+        '-created',
+    ).first()
+    if request:
+        _store_request(g.db, request)
+    return request
 
-    if operation:
-        url_filter = (
-            f'and('
-            f'eq(asset.external_uid,{tenant_id}),'
-            f'eq(type,{operation}),'
-            f'in(status,({",".join(statuses_to_track)})))'
-        )
-    else:
-        url_filter = (
-            f'and('
-            f'eq(asset.external_uid,{tenant_id}),'
-            f'in(status,({",".join(statuses_to_track)})))'
-        )
-    return g.client.requests.filter(
-        url_filter,
+
+async def async_get_last_request_by_tenant_id(tenant_id, operation=None):
+    """
+    Same as get_last_request_by_tenant_id but using async Connect client
+    :param tenant_id: str
+    :param operation: str
+    :return:
+    """
+    db = g.db
+    request = await run_in_threadpool(_fetch_last_request, db, tenant_id, operation)
+    if request:
+        return request
+    request = await g.async_client.requests.filter(
+        _last_request_filter(tenant_id, operation),
     ).select(
         '-asset.configuration',
     ).order_by(
         '-created',
     ).first()
+    if request:
+        await run_in_threadpool(_store_request, db, request)
+    return request
+
+
+def _fetch_last_request(db, tenant_id, operation):
+    try:
+        return fetch_last_asset_request(
+            db,
+            tenant_id,
+            operation,
+            final_statuses=final_statuses,
+            max_age=LAST_REQUEST_MAX_AGE,
+        )
+    except DBAPIError:
+        db.rollback()
+        return None
+
+
+def record_request(request):
+    """
+    Stores request placed by the extension as the last one of the asset, that way polls done
+    before its event is received don't see the previous request
+    :param request: dict
+    """
+    # Request is already placed, in case of failure it will be stored once its event is received
+    _store_request(g.db, request)
+
+
+def _store_request(db, request):
+    if request.get('status') not in statuses_to_track:
+        return
+    try:
+        save_asset_request(db, request)
+    except DBAPIError:
+        db.rollback()
+
+
+def _submission_key(request_body):
+    payload_hash = hashlib.sha256(
+        json.dumps(request_body, sort_keys=True, default=str).encode(),
+    ).hexdigest()
+    return request_body['asset']['external_uid'], request_body['type'], payload_hash
+
+
+def find_submission(request_body):
+    """
+    Returns response stored for a request already placed with same payload for the tenant, as
+    long as such request is still in progress. Otherwise submission is removed, since placing
+    it again is what retries of a failed or approved request expect.
+    :param request_body: dict, payload sent to Connect to create the request
+    :return: dict or None
+    """
+    key = _submission_key(request_body)
+    try:
+        submission = fetch_request_submission(g.db, *key, SUBMISSION_TTL)
+    except DBAPIError:
+        # Retries will be resolved by Connect as they were before
+        g.db.rollback()
+        return None
+    if submission is None:
+        return None
+    if _request_in_progress(submission.tenant_id, submission.operation, submission.request_id):
+        return submission.response
+    try:
+        remove_request_submission(g.db, *key)
+    except DBAPIError:
+        g.db.rollback()
+    return None
+
+
+def _request_in_progress(tenant_id, operation, request_id):
+    request = _fetch_last_request(g.db, tenant_id, operation)
+    if request is None or request['id'] != request_id:
+        request = get_request_by_id(request_id)
+    return request is not None and request['status'] not in final_statuses
+
+
+def record_submission(request_body, request_id, response):
+    """
+    Stores response given to placed request, that way retries of same operation are answered
+    without placing it again
+    :param request_body: dict, payload sent to Connect to create the request
+    :param request_id: str
+    :param response: dict
+    """
+    try:
+        save_request_submission(g.db, *_submission_key(request_body), request_id, response)
+    except DBAPIError:
+        # Retries will be resolved by Connect as they were before
+        g.db.rollback()
 
 
 def get_request_by_id(request_id):
@@ -161,29 +331,48 @@ def approve_due_max_retries(tenant_id, operation, limit=None):
     ) == limit if requests.count() == limit else False
 
 
-def get_tcr_link_by_external_id_and_product(external_id, product_id):
-    url_filter = (
+def _tcr_filter(external_id, product_id):
+    return (
         f'and('
         f'eq(configuration.product.id,{product_id}),'
         f'eq(configuration.account.external_uid,{external_id}),'
         f'in(status,(pending,inquiring,approved)))'
     )
 
+
+def _tcr_link(request):
+    if request and request['status'] == 'inquiring' and 'activation' in request:
+        return request['activation']['link']
+
+
+def get_tcr_link_by_external_id_and_product(external_id, product_id):
     request = g.client.ns(
         'tier',
     ).collection(
         'config-requests',
     ).filter(
-        url_filter,
-    ).ordering(
+        _tcr_filter(external_id, product_id),
+    ).order_by(
         '-created',
     ).first()
-    if request and request['status'] == 'inquiring' and 'activation' in request:
-        return request['activation']['link']
+    return _tcr_link(request)
+
+
+async def async_get_tcr_link_by_external_id_and_product(external_id, product_id):
+    request = await g.async_client.ns(
+        'tier',
+    ).collection(
+        'config-requests',
+    ).filter(
+        _tcr_filter(external_id, product_id),
+    ).order_by(
+        '-created',
+    ).first()
+    return _tcr_link(request)
 
 
 def product_capability_parameters_change(product_id):
-    connect_product = g.client.products[product_id].get()
+    connect_product = get_product(product_id)
     if 'subscription' in connect_product['capabilities']:
         capabilities = connect_product['capabilities']['subscription']
         if 'change' in capabilities and 'editable_ordering_parameters' in capabilities['change']:
@@ -1,9 +1,24 @@
 from requests_oauthlib import OAuth1
-from starlette_context import context as g
 
-from cbcext.services.client.oaclient import OA, OACommunicationException
+from cbcext.services.client.oaclient import OA, OACommunicationException, REDIS_PREFIX
 from cbcext.services.db_services import fetch_configuration, fetch_hub_uuid_by_app_id
+from cbcext.services.hub.discovery import discover
 from cbcext.services.hub.services import get_oa_aps_openapi_adapter
+from cbcext.utils.cache import SharedCache
+from cbcext.utils.context import g
+
+# VAT codes are refreshed on accountDataChange, local tier is short since such notification
+# only reaches one process
+VAT_CODE_TTL = 3600
+VAT_CODE_LOCAL_TTL = 60
+
+_vat_codes = SharedCache(
+    'vat_codes',
+    prefix=f'{REDIS_PREFIX}:vat-code:v1',
+    ttl=VAT_CODE_TTL,
+    local_ttl=VAT_CODE_LOCAL_TTL,
+    maxsize=4096,
+)
 
 
 class VatGatheringException(Exception):
@@ -18,15 +33,30 @@ class Vat:
 
     def get_vat_code(self, aps_account_id):
         """
-        provides VAT Code given app (aka APS Product) and aps account id
+        provides VAT Code given app (aka APS Product) and aps account id, results are cached
+        per account
         :param aps_account_id: str
         :return: str or None
         """
+        try:
+            return _vat_codes.get_or_set(
+                OA.redis_location(),
+                _vat_code_key(aps_account_id),
+                lambda: self._fetch_vat_code(aps_account_id),
+            )
+        except OACommunicationException:
+            """
+            In case of any OACommunication exception since VAT is not really possible to be
+            extracted, we return None. Such result is not cached.
+            """
+            return None
+
+    def _fetch_vat_code(self, aps_account_id):
         try:
             """
             First we check if adapter is present just due if not we can save a lot of cycles
             """
-            openapi_adapter = get_oa_aps_openapi_adapter(self.app)
+            openapi_adapter = get_oa_aps_openapi_adapter(self.app, raise_errors=True)
             if openapi_adapter is None:
                 return None
             impersonate_user_id = self._get_account_admin(aps_account_id)
@@ -38,12 +68,6 @@ class Vat:
 
             return vat_identification_number
 
-        except OACommunicationException:
-            """
-            In case of any OACommunication exception since VAT is not really possible to be
-            extracted, we return None
-            """
-            return None
         except VatGatheringException:
             """
             If any of the conditions in order to get VAT code is not met, since we consider that
@@ -57,6 +81,9 @@ class Vat:
         Only we support that if HUB extension is from Connect v20 or newer, that means
         type id is 2.4 or bigger
         """
+        return discover(self.app, 'vat_extension_resource', self._find_extension_resource)
+
+    def _find_extension_resource(self):
         extension_aps_resource = OA.get_resources(
             "aps/2/resources/?implementing({type})".format(
                 type="http://odin.com/servicesSelector/globals/2",
@@ -159,7 +186,11 @@ class Vat:
         :return:
         """
         extension = self._get_extension_resource()
-        extension_creds = self._get_extension_credentials(extension)
+        extension_creds = discover(
+            self.app,
+            'vat_extension_credentials',
+            lambda: self._get_extension_credentials(extension),
+        )
         token = OA.send_request(
             method='GET',
             transaction=False,
@@ -173,3 +204,11 @@ class Vat:
         if 'aps_token' not in token:
             raise VatGatheringException("No token obtained")
         return token
+
+
+def _vat_code_key(aps_account_id):
+    return f'{OA.controller_uri()}:{aps_account_id}'
+
+
+def invalidate_vat_code(aps_account_id):
+    _vat_codes.invalidate(OA.redis_location(), _vat_code_key(aps_account_id))
@@ -0,0 +1,390 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from redis.exceptions import LockError, RedisError
+
+from cbcext.utils.concurrency import run_in_background
+from cbcext.utils.redis_pool import get_async_redis, get_redis
+
+MISSING = object()
+
+# Max time a process may keep redis lock while loading a value, and max time others wait for it
+SHARED_LOCK_TIMEOUT = 30
+SHARED_LOCK_WAIT = 10
+
+_CACHES = {}
+
+
+class TTLCache:
+    """
+    Thread safe in-process cache where every entry has a time to live.
+
+    Once ``maxsize`` entries are stored, least recently used ones are evicted first.
+    Hits and misses are counted per cache, check :func:`get_cache_stats`.
+    Please note that cache is per process, invalidations done in one process (f.e. events
+    application) are not propagated to other ones, due it TTL must be kept short enough.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}
+        _CACHES[name] = self
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            return MISSING
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key, default=MISSING):
+        """
+        Returns cached value or default in case that is not present or expired
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def get_or_set(self, key, factory, ttl: float = None):
+        """
+        Returns cached value, in case of miss factory is called and result gets cached.
+        Concurrent callers missing same key wait for the first one instead of calling
+        factory again, this way a cold cache produces a single call to backend.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                with self._lock:
+                    value = self._lookup(key)
+                if value is MISSING:
+                    value = factory()
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                with self._lock:
+                    if self._loading.get(key) is key_lock:
+                        del self._loading[key]
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Removes entries which key matches given predicate
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': _ratio(self.hits, self.misses),
+                'size': len(self._entries),
+            }
+
+
+class SharedCache:
+    """
+    Two tier cache, in-process TTLCache in front of redis. Values must be JSON serializable.
+
+    Redis keys are built as ``{prefix}:{key}``, prefix shall contain a version to be bumped in
+    case that stored format changes. On a cold cache, concurrent callers of same process share
+    a single load, while processes coordinate using a redis lock, that way only one call to
+    source is done. In case that redis is not available, values are loaded from source.
+    """
+
+    def __init__(self, name: str, prefix: str, ttl: float, local_ttl: float, maxsize: int = 256):
+        self.prefix = prefix
+        self.ttl = ttl
+        self._local = TTLCache(name, ttl=local_ttl, maxsize=maxsize)
+        self._inflight = {}
+
+    def _redis_key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get_or_set(self, location: str, key, loader):
+        """
+        :param location: redis location url
+        :param key: str
+        :param loader: callable returning value in case of miss on both tiers
+        """
+        return self._local.get_or_set(key, lambda: self._load(location, key, loader))
+
+    def _load(self, location, key, loader):
+        redis_key = self._redis_key(key)
+        client = get_redis(location)
+        value = self._redis_get(client, redis_key)
+        if value is not MISSING:
+            return value
+        lock = self._redis_lock(client, redis_key)
+        try:
+            if lock is not None:
+                # Another process may have loaded it while we were waiting for the lock
+                value = self._redis_get(client, redis_key)
+                if value is not MISSING:
+                    return value
+            value = loader()
+            try:
+                client.set(redis_key, json.dumps(value), ex=self.ttl)
+            except RedisError:
+                pass
+            return value
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except (LockError, RedisError):
+                    pass
+
+    @staticmethod
+    def _redis_get(client, redis_key):
+        try:
+            value = client.get(redis_key)
+        except RedisError:
+            return MISSING
+        return MISSING if value is None else json.loads(value)
+
+    @staticmethod
+    def _redis_lock(client, redis_key):
+        lock = client.lock(
+            f'{redis_key}:lock',
+            timeout=SHARED_LOCK_TIMEOUT,
+            blocking_timeout=SHARED_LOCK_WAIT,
+        )
+        try:
+            return lock if lock.acquire() else None
+        except RedisError:
+            return None
+
+    async def async_get_or_set(self, location: str, key, loader):
+        """
+        asyncio flavour of get_or_set, loader must be a coroutine function
+        """
+        value = self._local.get(key)
+        if value is not MISSING:
+            return value
+        pending = self._inflight.get(key)
+        if pending is not None:
+            value = await asyncio.shield(pending)
+            if value is not MISSING:
+                return value
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._async_load(location, key, loader)
+            self._local.set(key, value)
+            return value
+        finally:
+            # Waiters retry by themselves in case that loading failed
+            future.set_result(value)
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _async_load(self, location, key, loader):
+        redis_key = self._redis_key(key)
+        client = get_async_redis(location)
+        value = await self._async_redis_get(client, redis_key)
+        if value is not MISSING:
+            return value
+        lock = await self._async_redis_lock(client, redis_key)
+        try:
+            if lock is not None:
+                value = await self._async_redis_get(client, redis_key)
+                if value is not MISSING:
+                    return value
+            value = await loader()
+            try:
+                await client.set(redis_key, json.dumps(value), ex=self.ttl)
+            except RedisError:
+                pass
+            return value
+        finally:
+            if lock is not None:
+                try:
+                    await lock.release()
+                except (LockError, RedisError):
+                    pass
+
+    @staticmethod
+    async def _async_redis_get(client, redis_key):
+        try:
+            value = await client.get(redis_key)
+        except RedisError:
+            return MISSING
+        return MISSING if value is None else json.loads(value)
+
+    @staticmethod
+    async def _async_redis_lock(client, redis_key):
+        lock = client.lock(
+            f'{redis_key}:lock',
+            timeout=SHARED_LOCK_TIMEOUT,
+            blocking_timeout=SHARED_LOCK_WAIT,
+        )
+        try:
+            return lock if await lock.acquire() else None
+        except RedisError:
+            return None
+
+    def invalidate(self, location: str, key):
+        self._local.invalidate(key)
+        try:
+            get_redis(location).delete(self._redis_key(key))
+        except RedisError:
+            pass
+
+
+class StaleWhileRevalidateCache:
+    """
+    In-process cache that keeps serving expired entries during ``stale_ttl`` while they are
+    reloaded in background, that way callers only wait for backend on first load of a key.
+
+    In case that background reload fails, stale value is kept until it's fully expired.
+    Stale hits are reported on top of TTLCache stats.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.stale_hits = 0
+        # Entries are stored as (value, fresh until)
+        self._entries = TTLCache(name, ttl=ttl + stale_ttl, maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._inflight = {}
+        self._tasks = set()
+        _CACHES[name] = self
+
+    def _fresh_until(self):
+        return time.monotonic() + self.ttl
+
+    def get_or_set(self, key, factory):
+        """
+        Returns cached value, in case of miss factory is called and result gets cached.
+        Expired values are returned as they are while factory is called in background.
+        """
+        value, fresh_until = self._entries.get_or_set(
+            key,
+            lambda: (factory(), self._fresh_until()),
+        )
+        if fresh_until < time.monotonic() and self._start_refresh(key):
+            run_in_background(lambda: self._refresh(key, factory))
+        return value
+
+    def _refresh(self, key, factory):
+        try:
+            self._entries.set(key, (factory(), self._fresh_until()))
+        except Exception:
+            pass
+        finally:
+            self._end_refresh(key)
+
+    async def async_get_or_set(self, key, factory):
+        """
+        asyncio flavour of get_or_set, factory must be a coroutine function
+        """
+        entry = self._entries.get(key)
+        if entry is MISSING:
+            return await self._async_load(key, factory)
+        value, fresh_until = entry
+        if fresh_until < time.monotonic() and self._start_refresh(key):
+            task = asyncio.get_running_loop().create_task(self._async_refresh(key, factory))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return value
+
+    async def _async_load(self, key, factory):
+        pending = self._inflight.get(key)
+        if pending is not None:
+            entry = await asyncio.shield(pending)
+            if entry is not MISSING:
+                return entry[0]
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        entry = MISSING
+        try:
+            entry = (await factory(), self._fresh_until())
+            self._entries.set(key, entry)
+            return entry[0]
+        finally:
+            future.set_result(entry)
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _async_refresh(self, key, factory):
+        try:
+            self._entries.set(key, (await factory(), self._fresh_until()))
+        except Exception:
+            pass
+        finally:
+            self._end_refresh(key)
+
+    def _start_refresh(self, key):
+        with self._lock:
+            self.stale_hits += 1
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def set(self, key, value):
+        self._entries.set(key, (value, self._fresh_until()))
+
+    def invalidate(self, key):
+        self._entries.invalidate(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {**self._entries.stats, 'stale_hits': self.stale_hits}
+
+
+def _ratio(hits, misses):
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+def get_cache_stats() -> dict:
+    """
+    Provides hits, misses and size of every in-process cache
+    """
+    return {name: cache.stats for name, cache in _CACHES.items()}
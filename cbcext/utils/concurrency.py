@@ -0,0 +1,83 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+FANOUT_MAX_WORKERS = 32
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix='cbc-fanout')
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, pending, timeout):
+        super().__init__(
+            f"Tasks {', '.join(sorted(pending))} not completed within {timeout} seconds",
+        )
+
+
+def run_concurrently(tasks: dict, timeout: float) -> dict:
+    """
+    Runs independent blocking calls on a process wide bounded pool and waits for all of them.
+
+    Every task runs with a copy of the caller context, that way request globals are available.
+    In case that a task fails, or that the deadline is reached, tasks not started yet are
+    cancelled and the error is raised. Please note that already running calls can't be
+    interrupted, their result is discarded.
+
+    :param tasks: dict of name and callable without arguments
+    :param timeout: seconds to wait for all tasks
+    :return: dict of name and returned value
+    """
+    futures = {
+        _executor.submit(contextvars.copy_context().run, task): name
+        for name, task in tasks.items()
+    }
+    done, pending = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+    for future in pending:
+        future.cancel()
+    for future in done:
+        if future.exception():
+            raise future.exception()
+    if pending:
+        raise DeadlineExceeded([futures[future] for future in pending], timeout)
+    return {name: future.result() for future, name in futures.items()}
+
+
+def run_in_background(task):
+    """
+    Runs a blocking call on the same bounded pool without waiting for it, with a copy of the
+    caller context.
+
+    :param task: callable without arguments
+    :return: Future
+    """
+    return _executor.submit(contextvars.copy_context().run, task)
+
+
+def run_bounded(tasks, max_workers: int, timeout: float) -> dict:
+    """
+    Runs blocking calls on the shared pool with at most max_workers of them running at a time.
+    Tasks are started while timeout is not reached, remaining ones are not started. Running
+    calls are waited for, hence timeout shall leave room for the longest task.
+
+    :param tasks: iterable of name and callable without arguments, consumed as tasks are started
+    :param max_workers: max number of tasks running at same time
+    :param timeout: seconds during which tasks are started
+    :return: dict of name and Future of started tasks, all of them done
+    """
+    deadline = time.monotonic() + timeout
+    started = {}
+    running = set()
+    for name, task in tasks:
+        if len(running) >= max_workers:
+            _, running = wait(
+                running,
+                timeout=max(deadline - time.monotonic(), 0),
+                return_when=FIRST_COMPLETED,
+            )
+        if len(running) >= max_workers or time.monotonic() >= deadline:
+            break
+        future = _executor.submit(contextvars.copy_context().run, task)
+        running.add(future)
+        started[name] = future
+    wait(running)
+    return started
@@ -0,0 +1,29 @@
+from starlette_context.ctx import _Context
+
+
+class RequestGlobals(_Context):
+    """
+    Attribute access to starlette-context request storage.
+
+    Setting attributes on ``starlette_context.context`` stores them on the module level object,
+    that way values set while serving one request are visible by every other one being served
+    concurrently. Attributes are kept here on the data of the current request context instead.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self.data[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self.data[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self.data[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+g = RequestGlobals()
@@ -5,7 +5,9 @@ from logging import LoggerAdapter
 from connect.eaas.core.inject.common import get_logger
 from fastapi import Depends, Request as FARequest
 from starlette.requests import Request as STRequest
-from starlette_context import context as g
+
+from cbcext.utils.context import g
+from cbcext.utils.identity_map import IdentityMap
 
 
 @dataclass
@@ -33,3 +35,7 @@ def set_globals(
 ):
     g.logger = logger
     g.source_request = request
+    g.identity_map = IdentityMap()
+    yield
+    if g.identity_map.hits:
+        g.logger.debug(g.identity_map.report)
@@ -0,0 +1,125 @@
+import asyncio
+import copy
+import threading
+
+from cbcext.utils.cache import MISSING
+from cbcext.utils.context import g
+
+
+class IdentityMap:
+    """
+    Unit of work cache for lookups done while serving a single request.
+
+    Same resource is often read more than once by different steps of a call, f.e. a tenant is
+    read to build the model and again before updating it. Only lookups opted in by callers are
+    kept, lists and resources polled for changes are always fetched. Values are kept by key,
+    usually method, path and impersonation, and a copy is returned on every hit, that way callers
+    may modify it. Any write done by the request clears the map, since it may change what was
+    read before.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._pending = {}
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+            return MISSING
+
+    def _store(self, key, value):
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = copy.deepcopy(value)
+
+    def get_or_load(self, key, loader):
+        value = self._lookup(key)
+        if value is not MISSING:
+            return value
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                value = self._lookup(key)
+                if value is MISSING:
+                    value = loader()
+                    self._store(key, value)
+                return value
+            finally:
+                with self._lock:
+                    if self._loading.get(key) is key_lock:
+                        del self._loading[key]
+
+    async def async_get_or_load(self, key, loader):
+        """
+        asyncio flavour of get_or_load, loader must be a coroutine function
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            await pending.wait()
+        value = self._lookup(key)
+        if value is not MISSING:
+            return value
+        pending = self._pending[key] = asyncio.Event()
+        try:
+            value = await loader()
+            self._store(key, value)
+            return value
+        finally:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+            pending.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def report(self) -> str:
+        return (
+            f'Lookups served by request identity map: {self.hits}, '
+            f'fetched from remote: {self.misses}'
+        )
+
+
+def get_identity_map() -> IdentityMap:
+    """
+    Returns identity map of current request, created on first use
+    """
+    try:
+        return g.identity_map
+    except AttributeError:
+        g.identity_map = IdentityMap()
+        return g.identity_map
+
+
+def memoize(key, loader):
+    """
+    Returns result of loader, called once per key during current request
+    :param key: hashable
+    :param loader: callable without arguments
+    """
+    return get_identity_map().get_or_load(key, loader)
+
+
+async def async_memoize(key, loader):
+    """
+    asyncio flavour of memoize, loader must be a coroutine function
+    """
+    return await get_identity_map().async_get_or_load(key, loader)
+
+
+def forget_lookups():
+    """
+    Clears identity map of current request, to be called after writes
+    """
+    try:
+        g.identity_map.clear()
+    except AttributeError:
+        pass
@@ -2,10 +2,10 @@ import json
 import logging
 from typing import Dict
 
+import httpx
 from requests import PreparedRequest, Response, Session
-from requests.adapters import HTTPAdapter
-from starlette_context import context as g
-from urllib3.util.retry import Retry
+
+from cbcext.utils.context import g
 
 
 def log_outgoing_request(request: PreparedRequest) -> Dict:
@@ -13,11 +13,15 @@ def log_outgoing_request(request: PreparedRequest) -> Dict:
     for k, v in headers.items():
         if isinstance(v, bytes):
             headers[k] = v.decode()
+    if isinstance(request, httpx.Request):
+        data = request.content.decode() if request.content else None
+    else:
+        data = request.body
     return {
         "method": request.method,
-        "url": request.url,
+        "url": str(request.url),
         "headers": headers,
-        "data": request.body,
+        "data": data,
     }
 
 
@@ -55,12 +59,23 @@ def log_message(req):
 
 
 def send_and_log(session: Session, request: PreparedRequest, binary=False, **kwargs) -> Response:
-    # In case that proxy is not working, let's retry up to 3 times and with a backoff
-    retries = Retry(total=3, connect=3, backoff_factor=1)
-    adapter = HTTPAdapter(max_retries=retries)
-    session.mount('https://', adapter)
     resp: Response = session.send(request, **kwargs)
+    log_exchange(request, resp, binary)
+    return resp
+
 
+async def async_send_and_log(
+        client: httpx.AsyncClient,
+        request: httpx.Request,
+        binary=False,
+        **kwargs,
+) -> httpx.Response:
+    resp: httpx.Response = await client.send(request, **kwargs)
+    log_exchange(request, resp, binary)
+    return resp
+
+
+def log_exchange(request, resp, binary=False):
     if g.logger.isEnabledFor(logging.DEBUG) or resp.status_code < 200 or resp.status_code > 299:
         request_dict = log_outgoing_request(request)
         if resp.status_code < 200 or resp.status_code > 299:
@@ -83,4 +98,3 @@ def send_and_log(session: Session, request: PreparedRequest, binary=False, **kwa
             g.logger.debug(message)
         else:
             g.logger.error(message)
-    return resp
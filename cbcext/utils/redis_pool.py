@@ -0,0 +1,46 @@
+import threading
+
+import redis
+import redis.asyncio as aioredis
+
+# Redis is used as cache, better to fail fast and go to source than waiting for it
+REDIS_SOCKET_TIMEOUT = 2
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis(location: str) -> redis.Redis:
+    """
+    Provides redis client for given location, clients share one connection pool per location
+    for the whole process instead of creating a new one on every call.
+    """
+    with _lock:
+        client = _clients.get(location)
+        if client is None:
+            client = _clients[location] = redis.Redis(
+                connection_pool=redis.ConnectionPool.from_url(
+                    location,
+                    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                ),
+            )
+        return client
+
+
+def get_async_redis(location: str) -> aioredis.Redis:
+    """
+    asyncio flavour of get_redis
+    """
+    with _lock:
+        client = _async_clients.get(location)
+        if client is None:
+            client = _async_clients[location] = aioredis.Redis(
+                connection_pool=aioredis.ConnectionPool.from_url(
+                    location,
+                    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                ),
+            )
+        return client
@@ -1,6 +1,7 @@
+from collections import namedtuple
 from urllib.parse import urlparse
 
-from connect.client import ConnectClient
+from connect.client import AsyncConnectClient, ClientError, ConnectClient
 from connect.eaas.core.inject.common import get_call_context, get_config
 from connect.eaas.core.inject.synchronous import get_extension_client
 from connect.eaas.core.models import Context
@@ -8,12 +9,20 @@ from fastapi import Depends, HTTPException, Request
 from oauthlib import oauth1 as oauth
 from requests_oauthlib import OAuth1
 from sqlalchemy.orm import Session
-from starlette_context import context as g
 
 from cbcext.db import get_db
-from cbcext.services.db_services import fetch_configuration
+from cbcext.services.db_services import fetch_cached_configuration
+from cbcext.utils.cache import TTLCache
+from cbcext.utils.context import g
 from cbcext.utils.generic import get_oauth_key, get_real_url
 
+# Impersonated installation keys are renewed well before they may expire
+INSTALLATION_CLIENT_TTL = 600
+
+_installation_clients = TTLCache('installation_clients', ttl=INSTALLATION_CLIENT_TTL)
+
+InstallationClients = namedtuple('InstallationClients', 'client async_client')
+
 
 class RequestValidator(oauth.RequestValidator):
     enforce_ssl = False
@@ -113,7 +122,7 @@ def authentication_required(
     context: Context = Depends(get_call_context),
 ):
     oauth_key = get_oauth_key(request)
-    configuration = fetch_configuration(db, oauth_key=oauth_key)
+    configuration = fetch_cached_configuration(db, oauth_key=oauth_key)
     if not configuration or not check_oauth_signature(
             oauth_key,
             configuration.oauth_secret,
@@ -125,20 +134,50 @@ def authentication_required(
             status_code=400,
             detail='Instance configuration in CloudBlue Commerce is not set to type proxy',
         )
-    g.client = get_installation_client(
+    installation_clients = get_installation_clients(
         extension_client=extension_client,
         extension_id=context.extension_id,
         installation_id=configuration.installation_id,
     )
+    g.client = installation_clients.client
+    g.async_client = installation_clients.async_client
     g.product_id = configuration.instance_id
+    g.installation_id = configuration.installation_id
     g.extension_config = config
     g.auth = OAuth1(
         client_key=oauth_key, client_secret=configuration.oauth_secret,
     )
     g.db = db
+    try:
+        yield
+    except ClientError as error:
+        # Installation key may be revoked before our cache expires, next request will
+        # impersonate again
+        if error.status_code == 401:
+            invalidate_installation_client(context.extension_id, configuration.installation_id)
+        raise
+
+
+def get_installation_clients(
+        extension_client,
+        extension_id,
+        installation_id,
+) -> InstallationClients:
+    """
+    Provides sync and async Connect clients impersonating given installation. Clients are cached
+    per installation, concurrent requests with a cold cache share a single impersonate call.
+    """
+    return _installation_clients.get_or_set(
+        (extension_id, installation_id),
+        lambda: _impersonate_installation(extension_client, extension_id, installation_id),
+    )
+
+
+def invalidate_installation_client(extension_id, installation_id):
+    _installation_clients.invalidate((extension_id, installation_id))
 
 
-def get_installation_client(
+def _impersonate_installation(
         extension_client,
         extension_id,
         installation_id,
@@ -151,10 +190,13 @@ def get_installation_client(
         .post()
     )
 
-    return ConnectClient(
-        data['installation_api_key'],
-        endpoint=extension_client.endpoint,
-        default_headers=extension_client.default_headers,
-        logger=extension_client.logger,
-        max_retries=3,
+    client_kwargs = {
+        'endpoint': extension_client.endpoint,
+        'default_headers': extension_client.default_headers,
+        'logger': extension_client.logger,
+        'max_retries': 3,
+    }
+    return InstallationClients(
+        client=ConnectClient(data['installation_api_key'], **client_kwargs),
+        async_client=AsyncConnectClient(data['installation_api_key'], **client_kwargs),
     )
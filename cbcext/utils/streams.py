@@ -0,0 +1,39 @@
+import hashlib
+
+
+class ChecksumReader:
+    """
+    File like reader over a stream of known length, that computes checksum of the content
+    while it's read. Exposes remaining bytes as len, the way multipart encoders expect from
+    streams, that way content is piped to uploads without being held in memory.
+    """
+
+    def __init__(self, raw, length: int, algorithm: str = 'sha256'):
+        self.length = length
+        self._raw = raw
+        self._read = 0
+        self._hash = hashlib.new(algorithm)
+
+    @property
+    def len(self) -> int:
+        return self.length - self._read
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.len:
+            size = self.len
+        data = self._raw.read(size) if size else b''
+        if size and not data:
+            raise IOError(f'Stream ended after {self._read} of {self.length} bytes')
+        self._read += len(data)
+        self._hash.update(data)
+        return data
+
+    def tell(self) -> int:
+        return self._read
+
+    @property
+    def complete(self) -> bool:
+        return self._read == self.length
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
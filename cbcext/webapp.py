@@ -22,6 +22,8 @@ from cbcext.api.app import app_auth_router
 from cbcext.api.hub import hub_auth_router, hub_noauth_router
 from cbcext.api.itemprofile import item_auth_router
 from cbcext.api.tenant import tenant_auth_router
+from cbcext.services.client.oaclient.sessions import oa_sessions
+from cbcext.utils.cache import get_cache_stats
 from cbcext.utils.dependencies import set_globals
 
 
@@ -59,6 +61,14 @@ class CbcWebApplication(WebApplicationBase):
     def healthcheck(self):
         return {"status": "ok", "version": "1.0"}
 
+    @guest()
+    @router.get('/stats')
+    def stats(self):
+        return {
+            "caches": get_cache_stats(),
+            "oa_sessions": oa_sessions.stats,
+        }
+
     @classmethod
     def get_middlewares(cls):
         return [RawContextMiddleware]
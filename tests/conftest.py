@@ -3,8 +3,22 @@
 # Copyright (c) 2023, CloudBlue an Ingram Micro Company
 # All rights reserved.
 #
+import os
+
 import pytest
 from connect.client import AsyncConnectClient, ConnectClient
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from cbcext.db import Model
+from cbcext.models import db_models  # noqa: F401
+
+
+@compiles(JSONB, 'sqlite')
+def _compile_jsonb_for_sqlite(type_, compiler, **kw):
+    return 'JSON'
 
 
 @pytest.fixture
@@ -26,3 +40,20 @@ def async_connect_client():
 @pytest.fixture
 def logger(mocker):
     return mocker.MagicMock()
+
+
+@pytest.fixture
+def db_session():
+    """
+    Session on a fresh schema, of database at TEST_DATABASE_URL or in memory SQLite otherwise.
+    Upserts are built with PostgreSQL dialect, SQLite understands the same ON CONFLICT clauses.
+    """
+    engine = create_engine(os.getenv('TEST_DATABASE_URL', 'sqlite://'))
+    Model.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        Model.metadata.drop_all(engine)
+        engine.dispose()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+import bisect
+import itertools
+import json
+import re
+from urllib.parse import unquote, urlsplit
+
+import httpx
+import requests
+
+USAGE_PATH = '/public/v1/usage'
+
+
+class FakeUsageAPI:
+    """
+    Usage records and aggregates API of Connect for a single asset, closed records leave the
+    approved listing. Aggregates count approved records of each item.
+    """
+
+    def __init__(self, count, reported_every=2, tenant_id='tenant-1', files=1):
+        self.tenant_id = tenant_id
+        self.ids = [f'UR-{i:08d}' for i in range(count)]
+        self.local_ids = ['A' if i % reported_every == 0 else 'B' for i in range(count)]
+        self.usage_files = [f'UF-{i % files:04d}' for i in range(count)]
+        self.approved = [True] * count
+        self.closes = 0
+        self.closed = None
+
+    def track_closed(self):
+        self.closed = []
+        return self
+
+    def approved_ids(self, local_id):
+        return [
+            record_id for record_id, record_local_id, approved in zip(
+                self.ids, self.local_ids, self.approved,
+            ) if approved and record_local_id == local_id
+        ]
+
+    def _matching(self, query):
+        after = re.search(r'gt\(id,([^)]+)\)', query)
+        start = bisect.bisect_right(self.ids, after.group(1)) if after else 0
+        usage_files = re.search(r'in\(usagefile\.id,\(([^)]*)\)\)', query)
+        usage_file = re.search(r'usagefile\.id=([^&]+)', query)
+        if usage_files:
+            usage_files = set(usage_files.group(1).split(','))
+        elif usage_file:
+            usage_files = {usage_file.group(1)}
+        approved_only = 'status=approved' in query
+        return (
+            i for i in range(start, len(self.ids))
+            if (self.approved[i] or not approved_only)
+            and (usage_files is None or self.usage_files[i] in usage_files)
+        )
+
+    def _record(self, i):
+        return {
+            'id': self.ids[i],
+            'item': {'local_id': self.local_ids[i]},
+            'usagefile': {'id': self.usage_files[i]},
+            'asset': {'id': 'AS-0001', 'external_uid': self.tenant_id},
+        }
+
+    def _list(self, query):
+        if 'status=approved' in query:
+            # Listing of records being closed must not be shifted by closing them
+            assert 'ordering(id)' in query
+        limit = int(re.search(r'limit=(\d+)', query).group(1))
+        offset = int(re.search(r'offset=(\d+)', query).group(1))
+        matching = self._matching(query)
+        page = list(itertools.islice(matching, offset, offset + limit))
+        headers = {}
+        if page:
+            count = offset + len(page) + sum(1 for _ in matching)
+            headers['Content-Range'] = f'items {offset}-{offset + len(page) - 1}/{count}'
+        return 200, [self._record(i) for i in page], headers
+
+    def _aggregates(self):
+        return 200, [
+            {
+                'item': {'local_id': local_id, 'type': 'PPU', 'precision': 'integer'},
+                'accepted': len(self.approved_ids(local_id)),
+            }
+            for local_id in sorted(set(self.local_ids))
+        ], {'Content-Range': 'items 0-1/2'}
+
+    def _close(self, body):
+        for record in json.loads(body):
+            index = bisect.bisect_left(self.ids, record['id'])
+            self.approved[index] = False
+            self.closes += 1
+            if self.closed is not None:
+                self.closed.append(record['id'])
+        return 201, [], {}
+
+    def respond(self, path, query, body):
+        query = unquote(query)
+        if path == f'{USAGE_PATH}/records/close-records':
+            return self._close(body)
+        if path == f'{USAGE_PATH}/records':
+            return self._list(query)
+        if path == f'{USAGE_PATH}/aggregates':
+            return self._aggregates()
+        return 404, {}, {}
+
+    def handler(self, request):
+        status, content, headers = self.respond(
+            request.url.path,
+            request.url.query.decode(),
+            request.content,
+        )
+        return httpx.Response(status, json=content, headers=headers)
+
+    def mount(self, client):
+        """ Serves requests of a synchronous Connect client """
+        client.session.mount(client.endpoint, _FakeUsageAdapter(self))
+        return client
+
+
+class _FakeUsageAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, api):
+        super().__init__()
+        self.api = api
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        status, content, headers = self.api.respond(url.path, url.query, request.body)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(content).encode()
+        response.headers.update(headers)
+        response.headers['Content-Type'] = 'application/json'
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+from datetime import datetime, timedelta
+
+from cbcext.models.db_models import AssetRequest, RequestSubmission, TenantEventSubscription
+from cbcext.services.db_services import (
+    fetch_last_asset_request,
+    fetch_reported_usage_files,
+    fetch_request_submission,
+    fetch_tenant_asset,
+    fetch_tenant_event_subscriptions,
+    fetch_unverified_event_subscriptions,
+    fetch_usage_chunk_checkpoints,
+    fetch_usage_snapshot,
+    fetch_usage_snapshots_to_close,
+    mark_usage_snapshot_closed,
+    mark_usage_snapshot_reported,
+    remove_request_submission,
+    reset_usage_chunk_checkpoints,
+    save_asset_request,
+    save_request_submission,
+    save_tenant_asset,
+    save_tenant_event_subscriptions,
+    save_usage_chunk_checkpoints,
+    save_usage_snapshot,
+)
+
+FINAL_STATUSES = ('failed', 'approved', 'revoked')
+
+
+def _asset(asset_id='AS-0001', tenant_id='tenant-1'):
+    return {
+        'id': asset_id,
+        'external_uid': tenant_id,
+        'product': {'id': 'PRD-000-000-000'},
+        'marketplace': {'id': 'MP-00000'},
+        'configuration': {'params': []},
+    }
+
+
+def _request(request_id='PR-0001', request_type='purchase', status='pending', created=1, updated=1,
+             asset=None):
+    return {
+        'id': request_id,
+        'type': request_type,
+        'status': status,
+        'created': f'2024-01-{created:02d}T00:00:00+00:00',
+        'updated': f'2024-01-{updated:02d}T00:00:00+00:00',
+        'asset': asset or _asset(),
+    }
+
+
+def _age_synced(db_session, seconds):
+    db_session.query(AssetRequest).update(
+        {'synced': datetime.utcnow() - timedelta(seconds=seconds)},
+        synchronize_session=False,
+    )
+    db_session.commit()
+
+
+def test_save_asset_request_keeps_latest_state(db_session):
+    save_asset_request(db_session, _request(status='pending', updated=2))
+    save_asset_request(db_session, _request(status='approved', updated=3))
+    save_asset_request(db_session, _request(status='pending', updated=2))
+
+    request = fetch_last_asset_request(db_session, 'tenant-1')
+
+    assert request['status'] == 'approved'
+    assert 'configuration' not in request['asset']
+
+
+def test_save_asset_request_ignores_older_request(db_session):
+    save_asset_request(db_session, _request('PR-0002', created=5, updated=5))
+    save_asset_request(db_session, _request('PR-0001', status='failed', created=1, updated=6))
+
+    assert fetch_last_asset_request(db_session, 'tenant-1', 'purchase')['id'] == 'PR-0002'
+
+
+def test_fetch_last_asset_request_by_type(db_session):
+    save_asset_request(db_session, _request('PR-0001', created=1))
+    save_asset_request(db_session, _request('PR-0002', request_type='change', created=2))
+
+    assert fetch_last_asset_request(db_session, 'tenant-1')['id'] == 'PR-0002'
+    assert fetch_last_asset_request(db_session, 'tenant-1', 'purchase')['id'] == 'PR-0001'
+    assert fetch_last_asset_request(db_session, 'tenant-2') is None
+
+
+def test_fetch_last_asset_request_not_synced_recently(db_session):
+    save_asset_request(db_session, _request(status='pending'))
+    _age_synced(db_session, 1000)
+
+    assert fetch_last_asset_request(
+        db_session, 'tenant-1', final_statuses=FINAL_STATUSES, max_age=900,
+    ) is None
+    assert fetch_last_asset_request(db_session, 'tenant-1')['status'] == 'pending'
+
+    # Refreshed from Connect, same state
+    save_asset_request(db_session, _request(status='pending'))
+
+    assert fetch_last_asset_request(
+        db_session, 'tenant-1', final_statuses=FINAL_STATUSES, max_age=900,
+    )['status'] == 'pending'
+
+
+def test_fetch_last_asset_request_final_status_always_trusted(db_session):
+    save_asset_request(db_session, _request(status='approved'))
+    _age_synced(db_session, 10 * 24 * 3600)
+
+    assert fetch_last_asset_request(
+        db_session, 'tenant-1', final_statuses=FINAL_STATUSES, max_age=900,
+    )['status'] == 'approved'
+
+
+def test_save_asset_request_maps_tenant_asset(db_session):
+    save_asset_request(db_session, _request())
+
+    tenant_asset = fetch_tenant_asset(db_session, 'tenant-1')
+
+    assert tenant_asset.asset_id == 'AS-0001'
+    assert tenant_asset.product_id == 'PRD-000-000-000'
+    assert tenant_asset.marketplace_id == 'MP-00000'
+
+
+def test_save_request_submission(db_session):
+    save_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a', 'PR-0001', {'a': 1})
+
+    submission = fetch_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a', 3600)
+
+    assert submission.request_id == 'PR-0001'
+    assert submission.response == {'a': 1}
+    assert fetch_request_submission(db_session, 'tenant-1', 'purchase', 'hash-b', 3600) is None
+    assert fetch_request_submission(db_session, 'tenant-1', 'change', 'hash-a', 3600) is None
+
+
+def test_save_request_submission_keeps_last_per_operation(db_session):
+    save_request_submission(db_session, 'tenant-1', 'change', 'hash-a', 'PR-0001', {'a': 1})
+    save_request_submission(db_session, 'tenant-1', 'purchase', 'hash-p', 'PR-0002', {'p': 1})
+    save_request_submission(db_session, 'tenant-1', 'change', 'hash-b', 'PR-0003', {'b': 1})
+    save_request_submission(db_session, 'tenant-2', 'change', 'hash-a', 'PR-0004', {'a': 2})
+
+    # Going back from B to A is a new change
+    assert fetch_request_submission(db_session, 'tenant-1', 'change', 'hash-a', 3600) is None
+    assert fetch_request_submission(
+        db_session, 'tenant-1', 'change', 'hash-b', 3600,
+    ).request_id == 'PR-0003'
+    assert fetch_request_submission(
+        db_session, 'tenant-1', 'purchase', 'hash-p', 3600,
+    ).request_id == 'PR-0002'
+    assert fetch_request_submission(
+        db_session, 'tenant-2', 'change', 'hash-a', 3600,
+    ).request_id == 'PR-0004'
+
+
+def test_save_request_submission_same_payload_replaced(db_session):
+    save_request_submission(db_session, 'tenant-1', 'change', 'hash-a', 'PR-0001', {'a': 1})
+    save_request_submission(db_session, 'tenant-1', 'change', 'hash-a', 'PR-0002', {'a': 2})
+
+    submission = fetch_request_submission(db_session, 'tenant-1', 'change', 'hash-a', 3600)
+
+    assert (submission.request_id, submission.response) == ('PR-0002', {'a': 2})
+    assert db_session.query(RequestSubmission).count() == 1
+
+
+def test_fetch_request_submission_expired(db_session):
+    save_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a', 'PR-0001', {'a': 1})
+    db_session.query(RequestSubmission).update(
+        {'created': datetime.utcnow() - timedelta(seconds=7200)},
+        synchronize_session=False,
+    )
+    db_session.commit()
+
+    assert fetch_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a', 3600) is None
+    assert fetch_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a', 10000)
+
+
+def test_remove_request_submission(db_session):
+    save_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a', 'PR-0001', {'a': 1})
+    save_request_submission(db_session, 'tenant-2', 'purchase', 'hash-a', 'PR-0002', {'a': 1})
+
+    remove_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a')
+
+    assert fetch_request_submission(db_session, 'tenant-1', 'purchase', 'hash-a', 3600) is None
+    assert fetch_request_submission(db_session, 'tenant-2', 'purchase', 'hash-a', 3600)
+
+
+def test_save_tenant_asset_keeps_existing_mapping(db_session):
+    save_tenant_asset(db_session, _asset('AS-0001'))
+    save_tenant_asset(db_session, _asset('AS-0002'))
+
+    assert fetch_tenant_asset(db_session, 'tenant-1').asset_id == 'AS-0001'
+    assert fetch_tenant_asset(db_session, 'tenant-2') is None
+
+
+def test_save_tenant_asset_replace(db_session):
+    save_tenant_asset(db_session, _asset('AS-0001'))
+    save_tenant_asset(db_session, dict(_asset('AS-0002'), marketplace=None), replace=True)
+
+    tenant_asset = fetch_tenant_asset(db_session, 'tenant-1')
+
+    assert tenant_asset.asset_id == 'AS-0002'
+    assert tenant_asset.marketplace_id is None
+
+
+def test_save_asset_request_purchase_replaces_mapping(db_session):
+    save_asset_request(db_session, _request('PR-0001', status='failed', asset=_asset('AS-0001')))
+    save_asset_request(db_session, _request('PR-0002', created=2, asset=_asset('AS-0002')))
+
+    assert fetch_tenant_asset(db_session, 'tenant-1').asset_id == 'AS-0002'
+
+
+def test_save_asset_request_other_types_keep_mapping(db_session):
+    save_asset_request(db_session, _request('PR-0001', asset=_asset('AS-0001')))
+    save_asset_request(
+        db_session,
+        _request('PR-0002', request_type='change', created=2, asset=_asset('AS-0002')),
+    )
+
+    assert fetch_tenant_asset(db_session, 'tenant-1').asset_id == 'AS-0001'
+
+
+def _subscriptions(*event_types):
+    return [
+        {'event_type': event_type, 'handler': 'onEvent', 'source_type': 'subscription'}
+        for event_type in event_types
+    ]
+
+
+def _age_verified(db_session, tenant_id, seconds):
+    db_session.query(TenantEventSubscription).filter_by(tenant_id=tenant_id).update(
+        {'verified': datetime.utcnow() - timedelta(seconds=seconds)},
+        synchronize_session=False,
+    )
+    db_session.commit()
+
+
+def test_save_tenant_event_subscriptions(db_session):
+    save_tenant_event_subscriptions(db_session, 'tenant-1', _subscriptions('renew'), 'https://a')
+    save_tenant_event_subscriptions(
+        db_session, 'tenant-1', _subscriptions('renew', 'cancel'), 'https://a',
+    )
+
+    assert fetch_tenant_event_subscriptions(db_session, 'tenant-1') == {'renew', 'cancel'}
+    assert fetch_tenant_event_subscriptions(db_session, 'tenant-2') == set()
+    assert db_session.query(TenantEventSubscription).count() == 2
+
+
+def test_fetch_unverified_event_subscriptions(db_session):
+    save_tenant_event_subscriptions(db_session, 'tenant-1', _subscriptions('renew'), 'https://a')
+    save_tenant_event_subscriptions(db_session, 'tenant-2', _subscriptions('renew'), 'https://a')
+    save_tenant_event_subscriptions(db_session, 'tenant-3', _subscriptions('renew'), 'https://a')
+    save_tenant_event_subscriptions(db_session, 'tenant-4', _subscriptions('renew'), 'https://b')
+    _age_verified(db_session, 'tenant-1', 2000)
+    _age_verified(db_session, 'tenant-2', 3000)
+    _age_verified(db_session, 'tenant-4', 3000)
+
+    records = fetch_unverified_event_subscriptions(db_session, 'https://a', 1000, 10)
+
+    assert [record.tenant_id for record in records] == ['tenant-2', 'tenant-1']
+    assert [
+        record.tenant_id
+        for record in fetch_unverified_event_subscriptions(db_session, 'https://a', 1000, 1)
+    ] == ['tenant-2']
+
+
+def test_save_tenant_event_subscriptions_marks_verified(db_session):
+    save_tenant_event_subscriptions(db_session, 'tenant-1', _subscriptions('renew'), 'https://a')
+    _age_verified(db_session, 'tenant-1', 2000)
+
+    save_tenant_event_subscriptions(db_session, 'tenant-1', _subscriptions('renew'), 'https://a')
+
+    assert fetch_unverified_event_subscriptions(db_session, 'https://a', 1000, 10) == []
+
+
+def _aggregates(accepted):
+    return [{'item': {'local_id': 'A', 'type': 'PPU'}, 'accepted': accepted}]
+
+
+def test_save_usage_snapshot_keeps_report_state(db_session):
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(1), 'EIN-1', 'UF-1')
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(2), 'EIN-1', 'UF-2')
+
+    snapshot = fetch_usage_snapshot(db_session, 'tenant-1')
+
+    assert snapshot.aggregates == _aggregates(2)
+    assert snapshot.reported_items == ['A']
+    assert snapshot.reported is not None
+    assert fetch_usage_snapshot(db_session, 'tenant-2') is None
+
+
+def test_fetch_usage_snapshots_to_close(db_session):
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(1), None, 'UF-1')
+    save_usage_snapshot(db_session, 'tenant-2', 'AS-0002', _aggregates(1), None, 'UF-1')
+
+    assert fetch_usage_snapshots_to_close(db_session, 10) == []
+
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+    snapshot = fetch_usage_snapshots_to_close(db_session, 10)[0]
+    mark_usage_snapshot_closed(
+        db_session, 'tenant-1', snapshot.reported, snapshot.computed, ['UF-1'],
+    )
+
+    assert fetch_usage_snapshots_to_close(db_session, 10) == []
+
+    # Reported again
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+
+    assert [
+        snapshot.tenant_id for snapshot in fetch_usage_snapshots_to_close(db_session, 10)
+    ] == ['tenant-1']
+
+
+def test_fetch_reported_usage_files(db_session):
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(1), None, 'UF-1')
+    save_usage_snapshot(db_session, 'tenant-2', 'AS-0002', _aggregates(1), None, 'UF-1')
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+    # Accepted after usage was reported
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(2), None, 'UF-2')
+
+    assert fetch_reported_usage_files(db_session, 'tenant-1') == ['UF-1']
+    assert fetch_reported_usage_files(db_session, 'tenant-2') == []
+
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+
+    assert fetch_reported_usage_files(db_session, 'tenant-1') == ['UF-1', 'UF-2']
+
+
+def test_mark_usage_snapshot_closed(db_session):
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(1), None, 'UF-1')
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(2), None, 'UF-2')
+    snapshot = fetch_usage_snapshot(db_session, 'tenant-1')
+
+    mark_usage_snapshot_closed(
+        db_session, 'tenant-1', snapshot.reported, snapshot.computed, ['UF-1'], _aggregates(0),
+    )
+
+    snapshot = fetch_usage_snapshot(db_session, 'tenant-1')
+    assert snapshot.closed == snapshot.reported
+    assert snapshot.aggregates == _aggregates(0)
+    assert fetch_reported_usage_files(db_session, 'tenant-1') == []
+
+    # UF-2 is still counted by the snapshot, it is closed once reported
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+
+    assert fetch_reported_usage_files(db_session, 'tenant-1') == ['UF-2']
+
+
+def test_mark_usage_snapshot_closed_snapshot_computed_meanwhile(db_session):
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(1), None, 'UF-1')
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+    snapshot = fetch_usage_snapshot(db_session, 'tenant-1')
+    reported, computed = snapshot.reported, snapshot.computed
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', _aggregates(5), None, 'UF-2')
+
+    mark_usage_snapshot_closed(db_session, 'tenant-1', reported, computed, ['UF-1'], _aggregates(0))
+
+    snapshot = fetch_usage_snapshot(db_session, 'tenant-1')
+    assert snapshot.closed == reported
+    assert snapshot.aggregates == _aggregates(5)
+
+
+def test_save_usage_chunk_checkpoints(db_session):
+    save_usage_chunk_checkpoints(db_session, 'APP-1', ['CF-1', 'CF-2'])
+    save_usage_chunk_checkpoints(db_session, 'APP-1', ['CF-2', 'CF-3'])
+    save_usage_chunk_checkpoints(db_session, 'APP-2', ['CF-1'])
+
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-1') == {'CF-1', 'CF-2', 'CF-3'}
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-2') == {'CF-1'}
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-3') == set()
+
+
+def test_reset_usage_chunk_checkpoints(db_session):
+    save_usage_chunk_checkpoints(db_session, 'APP-1', ['CF-1', 'CF-2'])
+    save_usage_chunk_checkpoints(db_session, 'APP-2', ['CF-1'])
+
+    reset_usage_chunk_checkpoints(db_session, 'APP-1')
+
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-1') == set()
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-2') == {'CF-1'}
+
+    save_usage_chunk_checkpoints(db_session, 'APP-1', ['CF-2'])
+
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-1') == {'CF-2'}
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+from datetime import datetime, timedelta
+
+import pytest
+from starlette_context import request_cycle_context
+
+from cbcext.models.db_models import TenantEventSubscription
+from cbcext.services import event_subscriptions
+from cbcext.services.client.oaclient import ErrorResponse, OA, OACommunicationException, RequestInfo
+from cbcext.services.db_services import (
+    fetch_tenant_event_subscriptions,
+    save_tenant_event_subscriptions,
+)
+from cbcext.services.event_subscriptions import verify_event_subscriptions
+
+CONTROLLER = 'https://controller-a'
+
+
+def _oa_error(status_code):
+    return OACommunicationException(
+        ErrorResponse(status_code, 'error', RequestInfo('https://oa/aps/2/resources', {}, None)),
+    )
+
+
+@pytest.fixture
+def oa(mocker):
+    mocker.patch.object(event_subscriptions, 'SUBSCRIPTION_VERIFY_BATCH', 3)
+    mocker.patch.object(OA, 'controller_uri', return_value=CONTROLLER)
+    mocker.patch.object(OA, 'subscribe_on')
+    failures = {}
+
+    def get_event_subscriptions(tenant_id):
+        if tenant_id in failures:
+            raise _oa_error(failures[tenant_id])
+        return [{'event': 'renew'}]
+
+    mocker.patch.object(OA, 'get_event_subscriptions', side_effect=get_event_subscriptions)
+    return failures
+
+
+def _age_verified(db_session, tenant_id, seconds):
+    db_session.query(TenantEventSubscription).filter_by(tenant_id=tenant_id).update(
+        {'verified': datetime.utcnow() - timedelta(seconds=seconds)},
+        synchronize_session=False,
+    )
+    db_session.commit()
+
+
+def _record(db_session, tenant_id, age):
+    save_tenant_event_subscriptions(
+        db_session,
+        tenant_id,
+        [event_subscriptions.event_subscription('renew', 'onRenew', 'subscription')],
+        CONTROLLER,
+    )
+    _age_verified(db_session, tenant_id, age)
+
+
+def _verify(db_session, logger):
+    """ Runs verification, returns tenants checked against OA by it """
+    OA.get_event_subscriptions.reset_mock()
+    with request_cycle_context({'db': db_session, 'logger': logger}):
+        verify_event_subscriptions()
+    return sorted(call.args[0] for call in OA.get_event_subscriptions.call_args_list)
+
+
+def test_verify_event_subscriptions_failing_tenants_do_not_block_others(db_session, logger, oa):
+    interval = event_subscriptions.SUBSCRIPTION_VERIFY_INTERVAL
+    oa.update({'gone-1': 404, 'gone-2': 404, 'down-1': 500, 'down-2': 500})
+    # Least recently verified first
+    for age, tenant_id in enumerate(['live-2', 'live-1', 'down-2', 'down-1', 'gone-2', 'gone-1']):
+        _record(db_session, tenant_id, interval + 100 + age)
+
+    assert _verify(db_session, logger) == ['down-1', 'gone-1', 'gone-2']
+    assert _verify(db_session, logger) == ['down-2', 'live-1', 'live-2']
+    assert _verify(db_session, logger) == []
+    assert fetch_tenant_event_subscriptions(db_session, 'gone-1') == set()
+    assert fetch_tenant_event_subscriptions(db_session, 'gone-2') == set()
+    assert fetch_tenant_event_subscriptions(db_session, 'down-1') == {'renew'}
+    assert fetch_tenant_event_subscriptions(db_session, 'live-1') == {'renew'}
+    assert logger.warning.call_count == 2
+
+
+def test_verify_event_subscriptions_failed_tenant_retried_later(db_session, logger, oa):
+    interval = event_subscriptions.SUBSCRIPTION_VERIFY_INTERVAL
+    oa.update({'down-1': 500})
+    _record(db_session, 'down-1', interval + 100)
+
+    assert _verify(db_session, logger) == ['down-1']
+    assert _verify(db_session, logger) == []
+
+    # Retry delay elapsed, OA is reachable again
+    _age_verified(db_session, 'down-1', interval + 100)
+    del oa['down-1']
+
+    assert _verify(db_session, logger) == ['down-1']
+    assert _verify(db_session, logger) == []
+    assert fetch_tenant_event_subscriptions(db_session, 'down-1') == {'renew'}
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+import hashlib
+import io
+import re
+
+import pytest
+import requests
+from connect.client import ClientError
+from starlette_context import request_cycle_context
+
+from cbcext.services.client.oaclient import OA
+from cbcext.services.hub import services
+from cbcext.services.hub.services import (
+    fetch_usage_reports_index,
+    open_usage_chunk_file,
+    USAGE_REPORTS_PAGE_SIZE,
+)
+from cbcext.utils.identity_map import get_identity_map
+
+
+def _usage_reports(count):
+    return [
+        {
+            'reportId': f'UF-{i % 10:04d}',
+            'status': 'PROCESSED' if i % 2 else 'IN_PROGRESS',
+            'batchId': i,
+            'content': 'x' * 100,
+        }
+        for i in range(count)
+    ]
+
+
+def test_fetch_usage_reports_index(mocker):
+    reports = _usage_reports(2 * USAGE_REPORTS_PAGE_SIZE + 500)
+
+    def send_request(method, path, *args):
+        assert 'sort(+reportId,+batchId)' in path
+        offset, size = map(int, re.search(r'limit\((\d+),(\d+)\)', path).groups())
+        return reports[offset:offset + size]
+
+    send = mocker.patch.object(OA, '_send_request', side_effect=send_request)
+
+    with request_cycle_context({}):
+        index = fetch_usage_reports_index('APP-1', 'ADAPTER-1', {'UF-0001', 'UF-0011'})
+        # Pages are listed once per run, they are not kept for the request
+        assert get_identity_map().misses == 0
+
+    assert send.call_count == 3
+    assert list(index) == ['UF-0001']
+    assert len(index['UF-0001']) == 250
+    assert index['UF-0001'][0] == {'reportId': 'UF-0001', 'status': 'PROCESSED', 'batchId': 1}
+
+
+def test_fetch_usage_reports_index_without_paging(mocker):
+    # Adapters ignoring limit return all reports at once
+    send = mocker.patch.object(OA, '_send_request', return_value=_usage_reports(20))
+
+    with request_cycle_context({}):
+        index = fetch_usage_reports_index('APP-1', 'ADAPTER-1', {'UF-0002'})
+
+    assert send.call_count == 1
+    assert [report['batchId'] for report in index['UF-0002']] == [2, 12]
+
+
+def test_fetch_usage_reports_index_limit_ignored_full_page(mocker):
+    # Same reports are returned whatever the offset is
+    send = mocker.patch.object(
+        OA, '_send_request', return_value=_usage_reports(USAGE_REPORTS_PAGE_SIZE),
+    )
+
+    with request_cycle_context({}):
+        index = fetch_usage_reports_index('APP-1', 'ADAPTER-1', {'UF-0003'})
+
+    assert send.call_count == 2
+    assert len(index['UF-0003']) == USAGE_REPORTS_PAGE_SIZE // 10
+
+
+def test_fetch_usage_reports_index_max_pages(mocker):
+    mocker.patch.object(services, 'USAGE_REPORTS_MAX_PAGES', 5)
+
+    def send_request(method, path, *args):
+        offset = int(re.search(r'limit\((\d+),', path).group(1))
+        return [
+            {'reportId': 'UF-0001', 'batchId': offset + i} for i in range(USAGE_REPORTS_PAGE_SIZE)
+        ]
+
+    send = mocker.patch.object(OA, '_send_request', side_effect=send_request)
+
+    with request_cycle_context({}):
+        index = fetch_usage_reports_index('APP-1', 'ADAPTER-1', {'UF-0001'})
+
+    assert send.call_count == 5
+    assert len(index['UF-0001']) == 5 * USAGE_REPORTS_PAGE_SIZE
+
+
+CHUNK_CONTENT = b'PK' + bytes(range(256)) * 512
+
+
+class ChunkDownloadAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, status_code=200, headers=None):
+        super().__init__()
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.raw = io.BufferedReader(io.BytesIO(CHUNK_CONTENT))
+        response.headers.update(self.headers)
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def _download(connect_client, adapter):
+    connect_client.session.mount(connect_client.endpoint, adapter)
+    with request_cycle_context({'client': connect_client}):
+        with open_usage_chunk_file('CF-0001') as reader:
+            buffered = isinstance(reader._raw, io.BytesIO)
+            content = reader.read()
+    return reader, buffered, content
+
+
+def test_open_usage_chunk_file_streamed(connect_client):
+    adapter = ChunkDownloadAdapter(headers={'Content-Length': str(len(CHUNK_CONTENT))})
+
+    reader, buffered, content = _download(connect_client, adapter)
+
+    assert not buffered
+    assert content == CHUNK_CONTENT
+    assert reader.hexdigest() == hashlib.sha256(CHUNK_CONTENT).hexdigest()
+    assert adapter.requests[0].url.endswith('/usage/chunks/CF-0001/download')
+    assert adapter.requests[0].headers['Accept-Encoding'] == 'identity'
+
+
+@pytest.mark.parametrize(
+    'headers',
+    [
+        {},
+        {'Content-Length': '100', 'Content-Encoding': 'gzip'},
+    ],
+)
+def test_open_usage_chunk_file_buffered(connect_client, headers):
+    reader, buffered, content = _download(connect_client, ChunkDownloadAdapter(headers=headers))
+
+    # Length is not known until content is read
+    assert buffered
+    assert reader.length == len(CHUNK_CONTENT)
+    assert content == CHUNK_CONTENT
+    assert reader.complete
+
+
+def test_open_usage_chunk_file_error(connect_client):
+    with pytest.raises(ClientError):
+        _download(connect_client, ChunkDownloadAdapter(status_code=404))
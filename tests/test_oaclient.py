@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+import asyncio
+import json
+
+import pytest
+
+from cbcext.services.client import oaclient
+from cbcext.services.client.oaclient import AsyncOA, OA
+
+INSTALLED_TYPE = 'http://cbc.example/tenant/2.0'
+OLDER_TYPE = 'http://cbc.example/tenant/1.0'
+INSTALLED_SCHEMA = {'id': INSTALLED_TYPE, 'properties': {'usersCounter': {'type': 'Counter'}}}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        return self
+
+    def acquire(self):
+        return True
+
+    def release(self):
+        pass
+
+    def stored(self):
+        return {
+            key[len(oaclient._tenant_schemas.prefix) + 1:]: json.loads(value)
+            for key, value in self.values.items()
+            if key.startswith(oaclient._tenant_schemas.prefix)
+        }
+
+
+class FakeAsyncRedis(FakeRedis):
+    async def get(self, key):
+        return super().get(key)
+
+    async def set(self, key, value, ex=None):
+        super().set(key, value, ex)
+
+    async def acquire(self):
+        return True
+
+    async def release(self):
+        pass
+
+
+@pytest.fixture
+def redis(mocker):
+    oaclient._tenant_schemas._local.clear()
+    fake = FakeRedis()
+    mocker.patch('cbcext.utils.cache.get_redis', return_value=fake)
+    mocker.patch.object(OA, 'redis_location', return_value='redis://fake')
+    mocker.patch.object(OA, 'controller_uri', return_value='https://controller-a')
+    yield fake
+    oaclient._tenant_schemas._local.clear()
+
+
+@pytest.fixture
+def async_redis(mocker):
+    oaclient._tenant_schemas._local.clear()
+    fake = FakeAsyncRedis()
+    mocker.patch('cbcext.utils.cache.get_async_redis', return_value=fake)
+    mocker.patch.object(OA, 'redis_location', return_value='redis://fake')
+    mocker.patch.object(OA, 'controller_uri', return_value='https://controller-a')
+    yield fake
+    oaclient._tenant_schemas._local.clear()
+
+
+def test_get_tenant_schema_of_installed_type(mocker, redis):
+    fetch = mocker.patch.object(OA, '_fetch_tenant_schema', return_value=INSTALLED_SCHEMA)
+
+    assert OA.get_tenant_schema(INSTALLED_TYPE) == INSTALLED_SCHEMA
+    assert OA.get_tenant_schema(INSTALLED_TYPE) == INSTALLED_SCHEMA
+    assert fetch.call_count == 1
+    assert redis.stored() == {INSTALLED_TYPE: INSTALLED_SCHEMA}
+
+
+def test_get_tenant_schema_of_other_type_not_cached_under_it(mocker, redis):
+    fetch = mocker.patch.object(OA, '_fetch_tenant_schema', return_value=INSTALLED_SCHEMA)
+
+    # Schema of installed application is used, as it was before caching
+    assert OA.get_tenant_schema(OLDER_TYPE) == INSTALLED_SCHEMA
+    # Stored under its own type only, hubs running older type are not affected
+    assert redis.stored() == {INSTALLED_TYPE: INSTALLED_SCHEMA}
+
+    OA.get_tenant_schema(OLDER_TYPE)
+
+    assert fetch.call_count == 2
+    assert OA.get_tenant_schema(INSTALLED_TYPE) == INSTALLED_SCHEMA
+    assert fetch.call_count == 2
+
+
+def test_async_get_tenant_schema_of_other_type_not_cached_under_it(mocker, async_redis):
+    async def fetch_tenant_schema():
+        return INSTALLED_SCHEMA
+
+    fetch = mocker.patch.object(AsyncOA, '_fetch_tenant_schema', side_effect=fetch_tenant_schema)
+
+    async def get_schemas():
+        return (
+            await AsyncOA.get_tenant_schema(OLDER_TYPE),
+            await AsyncOA.get_tenant_schema(INSTALLED_TYPE),
+        )
+
+    assert asyncio.run(get_schemas()) == (INSTALLED_SCHEMA, INSTALLED_SCHEMA)
+    assert fetch.call_count == 1
+    assert async_redis.stored() == {INSTALLED_TYPE: INSTALLED_SCHEMA}
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+import pytest
+from starlette_context import request_cycle_context
+
+from cbcext.services.db_services import (
+    fetch_usage_chunk_checkpoints,
+    save_usage_chunk_checkpoints,
+)
+from cbcext.services.hub.process_chunk_files import ProcessUsageChunkFiles
+
+MODULE = 'cbcext.services.hub.process_chunk_files'
+
+
+def _chunk_file(chunk_id, schema='tr'):
+    return {'id': chunk_id, 'usagefile': {'id': f'UF-{chunk_id}', 'schema': schema}}
+
+
+@pytest.fixture
+def chunk_files(mocker):
+    mocker.patch(f'{MODULE}.get_oa_usage_adapter_manager', return_value='adapter')
+    mocker.patch(f'{MODULE}.fetch_usage_reports_index', return_value={})
+    mocker.patch(
+        f'{MODULE}.fetch_chunk_files_by_hub_id',
+        return_value=[
+            _chunk_file('CF-1'),
+            _chunk_file('CF-2'),
+            _chunk_file('CF-3', schema='qt'),
+            _chunk_file('CF-4'),
+        ],
+    )
+    return mocker.patch.object(ProcessUsageChunkFiles, '_handle_chunk')
+
+
+def _handle(db_session, logger, extension_config=None):
+    with request_cycle_context(
+        {'db': db_session, 'logger': logger, 'extension_config': extension_config or {}},
+    ):
+        return ProcessUsageChunkFiles().handle('APP-1')
+
+
+def _handled(handle_chunk):
+    return sorted(call.args[0]['id'] for call in handle_chunk.call_args_list)
+
+
+def test_process_chunk_files_resumes_from_checkpoints(db_session, logger, chunk_files):
+    save_usage_chunk_checkpoints(db_session, 'APP-1', ['CF-1'])
+
+    response = _handle(db_session, logger)
+
+    assert response.status_code == 200
+    # QT files are pulled by tenant
+    assert _handled(chunk_files) == ['CF-2', 'CF-4']
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-1') == {'CF-1', 'CF-2', 'CF-4'}
+
+
+def test_process_chunk_files_new_pass_once_all_handled(db_session, logger, chunk_files):
+    save_usage_chunk_checkpoints(db_session, 'APP-1', ['CF-1', 'CF-2', 'CF-4'])
+
+    _handle(db_session, logger)
+
+    assert _handled(chunk_files) == ['CF-1', 'CF-2', 'CF-4']
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-1') == {'CF-1', 'CF-2', 'CF-4'}
+
+
+def test_process_chunk_files_failed_file_checkpointed(db_session, logger, chunk_files):
+    def handle_chunk(chunk_file, *args):
+        if chunk_file['id'] == 'CF-2':
+            raise RuntimeError('Upload failed')
+
+    chunk_files.side_effect = handle_chunk
+
+    _handle(db_session, logger)
+
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-1') == {'CF-1', 'CF-2', 'CF-4'}
+    logger.error.assert_called_once()
+    assert 'CF-2' in logger.error.call_args.args[0]
+
+
+def test_process_chunk_files_time_budget_spent(db_session, logger, chunk_files):
+    save_usage_chunk_checkpoints(db_session, 'APP-1', ['CF-1'])
+
+    _handle(db_session, logger, {'CHUNK_FILES_TIME_BUDGET': '0'})
+
+    assert _handled(chunk_files) == []
+    # Not started files are still pending, pass is not restarted
+    assert fetch_usage_chunk_checkpoints(db_session, 'APP-1') == {'CF-1'}
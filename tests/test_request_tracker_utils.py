@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from cbcext.services.fulfillment import request_tracker_utils
+from cbcext.services.fulfillment.request_tracker_utils import (
+    aps_retry_timeout,
+    extract_parameters,
+    get_parameter_object_for_oa,
+    record_vendor_processing_time,
+    serialize_params,
+)
+
+PARAMETER_TYPES = ('text', 'email', 'checkbox', 'object', 'password', 'dropdown')
+
+
+def _product_params(count):
+    params = []
+    for i in range(count):
+        params.append(
+            {
+                'name': f'param_{i}',
+                'scope': 'tier1' if i % 10 == 9 else 'asset',
+                'phase': 'ordering' if i % 2 else 'fulfillment',
+                'type': PARAMETER_TYPES[i % len(PARAMETER_TYPES)],
+                'constraints': {'shared': 'none'} if i % 7 == 0 else {'required': False},
+                'events': {},
+            },
+        )
+    return params
+
+
+def _request(count):
+    params = [
+        {'id': f'param_{i}', 'value': f'value_{i}'} for i in range(count)
+    ]
+    params.append({'id': 'subscription_id', 'value': 'VENDOR-1', 'reconciliation': True})
+    params.append({'id': 'unknown', 'value': 'x'})
+    return {'asset': {'product': {'id': 'PRD-000-000-000'}, 'params': params}}
+
+
+def _extract_parameters_by_scan(request, product_parameters):
+    """
+    Previous implementation, parameter definitions were found by scanning parameter lists
+    """
+    def find(parameter_id, parameter_list):
+        return list(filter(lambda x: x['id'] == parameter_id, parameter_list))
+
+    def is_valid(param_def, phase):
+        return (
+            param_def
+            and param_def[0]['phase'] == phase
+            and param_def[0]['type'] not in ('object', 'password')
+        )
+
+    vendor_subscription_id = ""
+    activation_parameters = []
+    fulfillment_parameters = []
+    for parameter in request["asset"]["params"]:
+        ordering_definition = find(parameter['id'], product_parameters.activation)
+        param_definition = find(parameter['id'], product_parameters.fulfillment)
+        if parameter.get("reconciliation"):
+            vendor_subscription_id = parameter["value"]
+        if is_valid(param_definition, "fulfillment"):
+            if param_definition[0]['constraints'].get('shared') == 'none':
+                continue
+            fulfillment_parameters.append(get_parameter_object_for_oa(parameter))
+        if is_valid(ordering_definition, "ordering"):
+            activation_parameters.append(get_parameter_object_for_oa(parameter))
+    return vendor_subscription_id, activation_parameters, fulfillment_parameters
+
+
+def _best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@pytest.mark.parametrize('count', [10, 200, 600])
+def test_extract_parameters_matches_scan(count):
+    product_parameters = serialize_params(_product_params(count))
+    request = _request(count)
+
+    assert extract_parameters(request, product_parameters) == _extract_parameters_by_scan(
+        request,
+        product_parameters,
+    )
+
+
+def test_extract_parameters():
+    product_parameters = serialize_params(_product_params(20))
+
+    vendor_sub_id, activation, fulfillment = extract_parameters(_request(20), product_parameters)
+
+    assert vendor_sub_id == 'VENDOR-1'
+    assert activation == [
+        {'key': 'param_1', 'value': 'value_1'},
+        {'key': 'param_5', 'value': 'value_5'},
+        {'key': 'param_7', 'value': 'value_7'},
+        {'key': 'param_11', 'value': 'value_11'},
+        {'key': 'param_13', 'value': 'value_13'},
+        {'key': 'param_17', 'value': 'value_17'},
+    ]
+    # param_0 and param_14 are not shared with provider, object and password ones are skipped
+    assert fulfillment == [
+        {'key': 'param_2', 'value': 'value_2'},
+        {'key': 'param_6', 'value': 'value_6'},
+        {'key': 'param_8', 'value': 'value_8'},
+        {'key': 'param_12', 'value': 'value_12'},
+        {'key': 'param_18', 'value': 'value_18'},
+    ]
+
+
+def test_extract_parameters_benchmark():
+    """
+    Products with hundreds of parameters, lookups by id must not grow with number of
+    definitions, while scanning does.
+    """
+    product_parameters = serialize_params(_product_params(600))
+    request = _request(600)
+
+    indexed = _best_of(lambda: extract_parameters(request, product_parameters))
+    scanned = _best_of(lambda: _extract_parameters_by_scan(request, product_parameters))
+
+    assert indexed * 10 < scanned
+
+
+@pytest.fixture
+def processing_times(mocker):
+    mocker.patch.object(request_tracker_utils, 'randrange', return_value=0)
+    request_tracker_utils._vendor_processing_times.clear()
+    yield request_tracker_utils._vendor_processing_times
+    request_tracker_utils._vendor_processing_times.clear()
+
+
+def _date(seconds_from_now):
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds_from_now)).isoformat()
+
+
+def _timeout(*args, **kwargs):
+    return int(aps_retry_timeout(*args, **kwargs))
+
+
+def _approved(created, updated, vendor_id='VA-000-000', status='approved'):
+    return {
+        'status': status,
+        'created': f'2024-01-01T00:{created // 60:02d}:{created % 60:02d}+00:00',
+        'updated': f'2024-01-01T00:{updated // 60:02d}:{updated % 60:02d}+00:00',
+        'asset': {'connection': {'vendor': {'id': vendor_id}}},
+    }
+
+
+@pytest.mark.parametrize(
+    ('scheduled_in', 'expected'),
+    [
+        (3 * 24 * 3600, request_tracker_utils.APS_RETRY_TIMEOUT_SCHEDULED_MAX),
+        (7200, 7200),
+        (-600, request_tracker_utils.APS_RETRY_TIMEOUT),
+    ],
+)
+def test_aps_retry_timeout_scheduled(processing_times, scheduled_in, expected):
+    timeout = _timeout('scheduled', _date(-3600), _date(scheduled_in))
+
+    assert timeout == pytest.approx(expected, abs=2)
+
+
+def test_aps_retry_timeout_pending_below_expected_time(processing_times):
+    processing_times.set('VA-000-000', 4000)
+
+    # Half of remaining expected time
+    assert _timeout('pending', _date(-1000), vendor_id='VA-000-000') == pytest.approx(1500, abs=2)
+    # Other vendors and statuses are retried by age
+    assert _timeout('pending', _date(-1000), vendor_id='VA-111-111') == pytest.approx(100, abs=2)
+    assert _timeout('inquiring', _date(-1000), vendor_id='VA-000-000') == pytest.approx(
+        100, abs=2,
+    )
+
+
+def test_aps_retry_timeout_age_factor(processing_times):
+    processing_times.set('VA-000-000', 4000)
+
+    assert _timeout('pending', _date(-5000), vendor_id='VA-000-000') == pytest.approx(500, abs=2)
+    assert _timeout('pending', _date(-10 * 24 * 3600)) == (
+        request_tracker_utils.APS_RETRY_TIMEOUT_MAX
+    )
+
+
+def test_aps_retry_timeout_floor(processing_times):
+    processing_times.set('VA-000-000', 4000)
+
+    assert _timeout('pending', _date(-100)) == request_tracker_utils.APS_RETRY_TIMEOUT
+    assert _timeout('pending', _date(-3990), vendor_id='VA-000-000') == (
+        request_tracker_utils.APS_RETRY_TIMEOUT
+    )
+    assert _timeout('pending') == request_tracker_utils.APS_RETRY_TIMEOUT
+
+
+def test_aps_retry_timeout_jitter():
+    timeouts = {int(request_tracker_utils.randomize_aps_retry_timeout(3600)) for _ in range(50)}
+
+    assert all(
+        3600 <= timeout < 3600 + request_tracker_utils.APS_RETRY_JITTER_MAX for timeout in timeouts
+    )
+
+
+def test_record_vendor_processing_time_moving_average(processing_times):
+    record_vendor_processing_time(_approved(0, 100))
+
+    assert processing_times.get('VA-000-000') == 100
+
+    record_vendor_processing_time(_approved(0, 200))
+
+    assert processing_times.get('VA-000-000') == pytest.approx(120)
+    assert processing_times.get('VA-111-111', None) is None
+
+
+def test_record_vendor_processing_time_only_approved(processing_times):
+    # Failed requests are handled as approved ones
+    record_vendor_processing_time(_approved(0, 3000, status='failed'))
+    record_vendor_processing_time({'status': 'approved', 'asset': {}})
+    record_vendor_processing_time(_approved(0, 100, vendor_id=None))
+
+    assert processing_times.get('VA-000-000', None) is None
+    assert processing_times.stats['size'] == 0
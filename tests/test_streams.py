@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+import hashlib
+import io
+
+import pytest
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+from cbcext.utils.streams import ChecksumReader
+
+CONTENT = bytes(range(256)) * 4096
+
+
+def _encoder(stream):
+    return MultipartEncoder(
+        fields={'files': ('CF-0001.xlsx', stream, 'application/octet-stream')},
+        boundary='usagefile',
+    )
+
+
+def _read_all(encoder, block_size=8192):
+    body = b''
+    while True:
+        data = encoder.read(block_size)
+        if not data:
+            return body
+        body += data
+
+
+def test_checksum_reader_remaining_length():
+    reader = ChecksumReader(io.BytesIO(CONTENT), len(CONTENT))
+
+    reader.read(1000)
+
+    assert reader.len == len(CONTENT) - 1000
+    assert reader.tell() == 1000
+    assert not reader.complete
+
+    reader.read()
+
+    assert reader.len == 0
+    assert reader.complete
+    assert reader.read() == b''
+
+
+def test_checksum_reader_multipart_body():
+    reader = ChecksumReader(io.BytesIO(CONTENT), len(CONTENT))
+    encoder = _encoder(reader)
+    expected_length = encoder.len
+
+    body = _read_all(encoder)
+
+    assert len(body) == expected_length
+    assert body == _read_all(_encoder(CONTENT))
+    assert CONTENT in body
+    assert reader.complete
+    assert reader.hexdigest() == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_checksum_reader_truncated_source():
+    reader = ChecksumReader(io.BytesIO(CONTENT[:1000]), len(CONTENT))
+
+    with pytest.raises(IOError):
+        _read_all(_encoder(reader))
+    assert reader.tell() == 1000
+    assert not reader.complete
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+from tests.fake_usage_api import FakeUsageAPI
+
+from cbcext.services.db_services import (
+    fetch_reported_usage_files,
+    fetch_usage_snapshot,
+    mark_usage_snapshot_reported,
+    save_usage_snapshot,
+)
+from cbcext.services.eaas_events.usage_snapshots import close_reported_usage, snapshot_usage_file
+
+
+def test_snapshot_usage_file(db_session, connect_client):
+    api = FakeUsageAPI(10)
+
+    stored = snapshot_usage_file(
+        db_session,
+        api.mount(connect_client),
+        {'id': 'UF-0000', 'schema': 'qt'},
+        'EIN-1',
+    )
+
+    snapshot = fetch_usage_snapshot(db_session, 'tenant-1')
+    assert stored == 1
+    assert snapshot.asset_id == 'AS-0001'
+    assert snapshot.installation_id == 'EIN-1'
+    assert [aggregate['accepted'] for aggregate in snapshot.aggregates] == [5, 5]
+    assert snapshot.reported is None
+
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+
+    assert fetch_reported_usage_files(db_session, 'tenant-1') == ['UF-0000']
+
+
+def test_snapshot_usage_file_other_schema(db_session, connect_client):
+    api = FakeUsageAPI(10)
+
+    assert snapshot_usage_file(
+        db_session,
+        api.mount(connect_client),
+        {'id': 'UF-0000', 'schema': 'tr'},
+    ) == 0
+    assert fetch_usage_snapshot(db_session, 'tenant-1') is None
+
+
+def test_close_reported_usage_closes_reported_files(db_session, connect_client):
+    api = FakeUsageAPI(4500, files=3).track_closed()
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', [], None, 'UF-0000')
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+    # Accepted after usage was reported, its records are not closed
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', [], None, 'UF-0001')
+    reported = fetch_usage_snapshot(db_session, 'tenant-1').reported
+
+    closed = close_reported_usage(db_session, lambda installation_id: api.mount(connect_client))
+
+    snapshot = fetch_usage_snapshot(db_session, 'tenant-1')
+    assert closed == 1
+    assert sorted(api.closed) == [
+        record_id
+        for record_id, local_id, usage_file in zip(api.ids, api.local_ids, api.usage_files)
+        if local_id == 'A' and usage_file == 'UF-0000'
+    ]
+    assert len(api.closed) == 750
+    assert snapshot.closed == reported
+    # Computed again once records are closed
+    assert [aggregate['accepted'] for aggregate in snapshot.aggregates] == [1500, 2250]
+    assert fetch_reported_usage_files(db_session, 'tenant-1') == []
+    assert close_reported_usage(db_session, lambda installation_id: connect_client) == 0
+
+
+def test_close_reported_usage_next_report(db_session, connect_client):
+    api = FakeUsageAPI(30, files=3).track_closed()
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', [], None, 'UF-0000')
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+    save_usage_snapshot(db_session, 'tenant-1', 'AS-0001', [], None, 'UF-0001')
+    close_reported_usage(db_session, lambda installation_id: api.mount(connect_client))
+
+    mark_usage_snapshot_reported(db_session, 'tenant-1', ['A'])
+
+    assert close_reported_usage(db_session, lambda installation_id: connect_client) == 1
+    # UF-0002 is not counted by the snapshot
+    assert api.approved_ids('A') == [
+        record_id
+        for record_id, local_id, usage_file in zip(api.ids, api.local_ids, api.usage_files)
+        if local_id == 'A' and usage_file == 'UF-0002'
+    ]
+    assert len(api.approved_ids('B')) == 15
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023, CloudBlue an Ingram Micro Company
+# All rights reserved.
+#
+import asyncio
+import tracemalloc
+
+import httpx
+from starlette_context import request_cycle_context
+from tests.fake_usage_api import FakeUsageAPI
+
+from cbcext.services.usage.usagecollector import (
+    _close_usage_records,
+    _fetch_usage_records_page,
+)
+
+
+def _close_all(async_connect_client, api, item_usage):
+    async def close():
+        async_connect_client._session.set(
+            httpx.AsyncClient(transport=httpx.MockTransport(api.handler)),
+        )
+        page = await _fetch_usage_records_page('tenant-1')
+        return await _close_usage_records('tenant-1', page, item_usage)
+
+    with request_cycle_context({'async_client': async_connect_client}):
+        return asyncio.run(close())
+
+
+def _close_all_peak_memory(async_connect_client, count):
+    api = FakeUsageAPI(count)
+    tracemalloc.start()
+    try:
+        closed = _close_all(async_connect_client, api, {'A': 1})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert closed == api.closes == count // 2
+    return peak
+
+
+def test_close_usage_records_closes_each_record_once(async_connect_client):
+    api = FakeUsageAPI(4500).track_closed()
+
+    closed = _close_all(async_connect_client, api, {'A': 1})
+
+    expected = [record_id for record_id, local_id in zip(api.ids, api.local_ids) if local_id == 'A']
+    assert closed == 2250
+    assert sorted(api.closed) == expected
+    assert not any(
+        approved and local_id == 'A' for approved, local_id in zip(api.approved, api.local_ids)
+    )
+
+
+def test_close_usage_records_not_reported_items_kept(async_connect_client):
+    api = FakeUsageAPI(1500, reported_every=3).track_closed()
+
+    closed = _close_all(async_connect_client, api, {'C': 1})
+
+    assert closed == 0
+    assert api.closed == []
+    assert all(api.approved)
+
+
+def test_close_usage_records_benchmark(async_connect_client):
+    """
+    Memory used while closing records of a tenant must not grow with number of records,
+    ten times more records would keep ten times more pages if listed ones were kept.
+    """
+    peak_small = _close_all_peak_memory(async_connect_client, 2000)
+    peak_large = _close_all_peak_memory(async_connect_client, 20000)
+
+    assert peak_large < peak_small * 2